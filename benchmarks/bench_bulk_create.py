@@ -0,0 +1,63 @@
+"""
+Benchmark of creating many messages from stored records.
+
+Compares a per-message loop, which counts each message's tokens with its own
+encode, against Message.bulk_create and MessageQueue.from_records, which count
+all of them in one batched encode. The token count cache is disabled so every
+run counts every message.
+
+Run with ``poetry run python benchmarks/bench_bulk_create.py``.
+"""
+import timeit
+
+from chatmancy.message import Message, MessageQueue, configure_token_cache
+
+N_RECORDS = 10_000
+TARGET_SPEEDUP = 5
+
+
+def _create_records(n):
+    return [
+        {
+            "sender": "user" if i % 2 == 0 else "assistant",
+            "content": f"Stored message number {i} about the weather in Paris.",
+        }
+        for i in range(n)
+    ]
+
+
+def _per_message(records):
+    """One validated message, and one encode, per record."""
+    queue = MessageQueue()
+    for record in records:
+        queue.append(Message(**record))
+    return queue
+
+
+def _report(name, func, number=3):
+    seconds = min(timeit.repeat(func, number=number, repeat=3)) / number
+    print(f"{name:<28}{seconds * 1000:10.3f} ms")
+    return seconds
+
+
+def main():
+    records = _create_records(N_RECORDS)
+    configure_token_cache(enabled=False)
+    try:
+        print(f"{N_RECORDS} records")
+        loop = _report("per-message loop", lambda: _per_message(records))
+        bulk = _report("Message.bulk_create", lambda: Message.bulk_create(records))
+        from_records = _report(
+            "MessageQueue.from_records", lambda: MessageQueue.from_records(records)
+        )
+    finally:
+        configure_token_cache(enabled=True)
+
+    for name, seconds in [("bulk_create", bulk), ("from_records", from_records)]:
+        speedup = loop / seconds
+        status = "ok" if speedup >= TARGET_SPEEDUP else "below target"
+        print(f"{name} speedup: {speedup:.1f}x ({status}, target {TARGET_SPEEDUP}x)")
+
+
+if __name__ == "__main__":
+    main()
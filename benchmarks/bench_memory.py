@@ -0,0 +1,61 @@
+"""
+Memory benchmark for conversation history storage.
+
+Compares the retained memory of one history held as a MessageQueue of pydantic
+messages, a PersistentMessageQueue and a CompactMessageQueue.
+
+Run with ``poetry run python benchmarks/bench_memory.py``.
+"""
+import gc
+import tracemalloc
+
+from chatmancy.message import (
+    AgentMessage,
+    CompactMessageQueue,
+    MessageQueue,
+    PersistentMessageQueue,
+    UserMessage,
+)
+
+N_MESSAGES = 10_000
+
+
+def _create_messages(n):
+    return [
+        UserMessage(f"User question number {i}?", token_count=6)
+        if i % 2 == 0
+        else AgentMessage(f"Agent answer number {i}.", token_count=5, agent_name="bot")
+        for i in range(n)
+    ]
+
+
+def _retained_bytes(build):
+    gc.collect()
+    tracemalloc.start()
+    queue = build(_create_messages(N_MESSAGES))
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del queue
+    return current
+
+
+def main():
+    print(f"Retained memory for {N_MESSAGES} messages")
+    baseline = None
+    for name, queue_type in [
+        ("MessageQueue", MessageQueue),
+        ("PersistentMessageQueue", PersistentMessageQueue),
+        ("CompactMessageQueue", CompactMessageQueue),
+    ]:
+        retained = _retained_bytes(queue_type)
+        baseline = baseline or retained
+        print(
+            f"{name:<24}{retained / 1024:10.1f} KiB"
+            f"{retained / N_MESSAGES:8.0f} B/message"
+            f"{baseline / retained:8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
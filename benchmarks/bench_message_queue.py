@@ -0,0 +1,56 @@
+"""
+Micro-benchmarks for MessageQueue operations on large queues.
+
+Messages are created with explicit token counts, so no tokenizer is needed.
+
+Run with ``poetry run python benchmarks/bench_message_queue.py``.
+"""
+import timeit
+
+from chatmancy.message import Message, MessageQueue
+
+N_MESSAGES = 10_000
+
+
+def _create_messages(n):
+    return [
+        Message(sender="user", content=f"Message {i}", token_count=i % 50 + 1)
+        for i in range(n)
+    ]
+
+
+def _validated_extend(queue):
+    """The per-message append path used before the trusted fast path."""
+    new_queue = MessageQueue()
+    for message in queue:
+        new_queue.append(message)
+    return new_queue
+
+
+def _trusted_extend(queue):
+    new_queue = MessageQueue()
+    new_queue._extend_trusted(queue)
+    return new_queue
+
+
+def _report(name, func, number=20):
+    seconds = min(timeit.repeat(func, number=number, repeat=5)) / number
+    print(f"{name:<28}{seconds * 1000:10.3f} ms")
+    return seconds
+
+
+def main():
+    queue = MessageQueue(_create_messages(N_MESSAGES))
+    queue.token_count  # Build the token index once
+
+    print(f"MessageQueue with {N_MESSAGES} messages")
+    validated = _report("validated extend", lambda: _validated_extend(queue))
+    trusted = _report("trusted extend", lambda: _trusted_extend(queue))
+    _report("copy()", queue.copy)
+    _report("queue + queue", lambda: queue + queue)
+    _report("get_last_n_tokens(5000)", lambda: queue.get_last_n_tokens(5000))
+    print(f"trusted extend speedup: {validated / trusted:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+End-to-end benchmark of the framework's own overhead.
+
+Runs each stage of a conversation turn against a FakeModelHandler with no
+latency, so no network or tokenizer is needed, and reports the time and peak
+allocations per call of each stage:
+
+* Conversation.send_message, a full turn including a function call
+* HistoryManager.create_history on a long history
+* MessageQueue trimming with get_last_n_tokens
+* KeywordSortedMixin sorting of many tagged functions
+* FunctionRequestMessage.create_responses for many requests
+
+Run with ``poetry run python benchmarks/bench_pipeline.py``.
+"""
+import gc
+import timeit
+import tracemalloc
+
+from chatmancy.agent import FakeAgent, FakeModelHandler
+from chatmancy.conversation import Conversation
+from chatmancy.function import FunctionItem, FunctionRequestMessage
+from chatmancy.function.generator import (
+    KeywordSortedMixin,
+    StaticFunctionItemGenerator,
+)
+from chatmancy.message import AgentMessage, MessageQueue, UserMessage
+
+N_HISTORY = 2_000
+N_FUNCTIONS = 200
+N_REQUESTS = 20
+MAX_TOKENS = 8192
+
+
+class KeywordSortedGenerator(KeywordSortedMixin, StaticFunctionItemGenerator):
+    pass
+
+
+def _create_history(n):
+    return MessageQueue(
+        [
+            UserMessage(f"User question number {i} about the weather?", token_count=9)
+            if i % 2 == 0
+            else AgentMessage(f"Agent answer number {i}.", token_count=5)
+            for i in range(n)
+        ]
+    )
+
+
+def _create_functions(n):
+    return [
+        FunctionItem(
+            method=lambda city="Paris", i=i: f"Result {i} for {city}",
+            name=f"function_{i}",
+            description=f"Function number {i}",
+            params={"city": {"type": "string", "description": "The city"}},
+            required=[],
+            tags={f"tag{i % 10}", "weather" if i % 3 == 0 else "news"},
+            token_count=20,
+        )
+        for i in range(n)
+    ]
+
+
+def _create_request_message(functions):
+    return FunctionRequestMessage(
+        requests=[
+            {
+                "name": f.name,
+                "args": {"city": "Paris"},
+                "id": f"call_{i}",
+                "func_item": f,
+            }
+            for i, f in enumerate(functions)
+        ],
+        token_count=10,
+    )
+
+
+def _create_conversation(functions):
+    handler = FakeModelHandler(
+        [
+            {"tool_calls": [{"name": functions[0].name, "args": {"city": "Paris"}}]},
+            "It is sunny in Paris.",
+        ],
+        max_tokens=MAX_TOKENS,
+    )
+    return Conversation(
+        FakeAgent(model_handler=handler),
+        function_generators=[KeywordSortedGenerator(functions=functions)],
+        history=_create_history(N_HISTORY),
+    )
+
+
+def _peak_allocations(func):
+    """Peak bytes allocated by one call."""
+    gc.collect()
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak - baseline
+
+
+def _report(name, func, number=20):
+    seconds = min(timeit.repeat(func, number=number, repeat=5)) / number
+    allocated = _peak_allocations(func)
+    print(f"{name:<36}{seconds * 1000:10.3f} ms{allocated / 1024:12.1f} KiB")
+    return seconds
+
+
+def main():
+    functions = _create_functions(N_FUNCTIONS)
+    history = _create_history(N_HISTORY)
+    message = UserMessage("Will it rain in Paris tomorrow? weather tag3", token_count=9)
+    agent = FakeAgent(model_handler=FakeModelHandler(max_tokens=MAX_TOKENS))
+    generator = KeywordSortedGenerator(functions=functions)
+    request_message = _create_request_message(functions[:N_REQUESTS])
+    conversation = _create_conversation(functions)
+
+    print(f"{N_HISTORY} history messages, {N_FUNCTIONS} functions")
+    print(f"{'stage':<36}{'time/call':>13}{'peak alloc':>16}")
+    _report(
+        "Conversation.send_message",
+        lambda: conversation.send_message(message),
+        number=5,
+    )
+    _report(
+        "HistoryManager.create_history",
+        lambda: agent.history_manager.create_history(
+            message, history, {"topic": "weather"}, MAX_TOKENS
+        ),
+    )
+    _report("MessageQueue.get_last_n_tokens", lambda: history.get_last_n_tokens(4000))
+    _report(
+        "KeywordSortedMixin sort",
+        lambda: generator.generate_functions(message, history, {}),
+    )
+    _report(
+        "create_responses",
+        lambda: request_message.create_responses(
+            token_counter=agent.count_tokens_batch
+        ),
+    )
+
+
+if __name__ == "__main__":
+    main()
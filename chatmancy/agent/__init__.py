@@ -1,4 +1,38 @@
 from .base import Agent, TokenSettings
+from .cache import (
+    CachingModelHandler,
+    MemoryResponseStore,
+    ResponseStore,
+    SqliteResponseStore,
+)
+from .coalesce import CoalescingModelHandler
+from .fake import FakeAgent, FakeModelHandler, FakeResponse
 from .gpt import GPTAgent
+from .hedging import HedgingModelHandler
+from .scheduler import (
+    Priority,
+    RateLimits,
+    RequestScheduler,
+    configure_rate_limits,
+    request_scheduler,
+)
 
-__all__ = [Agent, TokenSettings, GPTAgent]
+__all__ = [
+    Agent,
+    TokenSettings,
+    GPTAgent,
+    CachingModelHandler,
+    CoalescingModelHandler,
+    FakeAgent,
+    FakeModelHandler,
+    FakeResponse,
+    HedgingModelHandler,
+    ResponseStore,
+    MemoryResponseStore,
+    SqliteResponseStore,
+    Priority,
+    RateLimits,
+    RequestScheduler,
+    configure_rate_limits,
+    request_scheduler,
+]
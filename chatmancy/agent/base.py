@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
 import logging
 
 
@@ -70,6 +70,12 @@ class Agent(ABC):
     def _initialize_function_handler(self, **_) -> FunctionHandler:
         return FunctionHandler(max_tokens=self.token_settings.max_function_tokens)
 
+    def count_tokens_batch(self, texts: List[str]) -> List[int]:
+        """
+        Count the tokens in many strings as the agent's model would.
+        """
+        return self.model_handler.count_tokens_batch(texts)
+
     @trace(name="Agent.get_response_message")
     def get_response_message(
         self,
@@ -88,6 +94,105 @@ class Agent(ABC):
         Returns:
             A Message object representing the agent's response.
         """
+        full_history, functions = self._prepare_response(
+            input_message, history, context, functions
+        )
+
+        # Get response from model
+        response = self.model_handler.get_completion(
+            history=full_history, functions=functions
+        )
+        response.agent_name = self.name
+
+        return response
+
+    @trace(name="Agent.aget_response_message")
+    async def aget_response_message(
+        self,
+        input_message: Message,
+        history: MessageQueue,
+        context: Optional[Dict] = None,
+        functions: List[FunctionItem] = None,
+    ) -> Message:
+        """Async version of get_response_message.
+
+        Args:
+            input_message: The input message to respond to.
+            history: The history of the conversation.
+            context: Any additional context for the conversation.
+
+        Returns:
+            A Message object representing the agent's response.
+        """
+        full_history, functions = self._prepare_response(
+            input_message, history, context, functions
+        )
+
+        # Get response from model
+        response = await self.model_handler.aget_completion(
+            history=full_history, functions=functions
+        )
+        response.agent_name = self.name
+
+        return response
+
+    def get_response_message_stream(
+        self,
+        input_message: Message,
+        history: MessageQueue,
+        context: Optional[Dict] = None,
+        functions: List[FunctionItem] = None,
+    ) -> Iterator[(str | Message)]:
+        """Stream a response message.
+
+        Args:
+            input_message: The input message to respond to.
+            history: The history of the conversation.
+            context: Any additional context for the conversation.
+
+        Yields:
+            Content deltas as they arrive, then the agent's response Message.
+        """
+        full_history, functions = self._prepare_response(
+            input_message, history, context, functions
+        )
+
+        for item in self.model_handler.get_completion_stream(
+            history=full_history, functions=functions
+        ):
+            if isinstance(item, Message):
+                item.agent_name = self.name
+            yield item
+
+    async def aget_response_message_stream(
+        self,
+        input_message: Message,
+        history: MessageQueue,
+        context: Optional[Dict] = None,
+        functions: List[FunctionItem] = None,
+    ) -> AsyncIterator[(str | Message)]:
+        """Async version of get_response_message_stream."""
+        full_history, functions = self._prepare_response(
+            input_message, history, context, functions
+        )
+
+        async for item in self.model_handler.aget_completion_stream(
+            history=full_history, functions=functions
+        ):
+            if isinstance(item, Message):
+                item.agent_name = self.name
+            yield item
+
+    def _prepare_response(
+        self,
+        input_message: Message,
+        history: MessageQueue,
+        context: Optional[Dict],
+        functions: List[FunctionItem],
+    ) -> Tuple[MessageQueue, List[FunctionItem]]:
+        """
+        Select functions and build the model history for a response.
+        """
         self.logger.debug(f"Getting response to message: {input_message}")
         self.logger.debug(f"Context = {context}")
 
@@ -126,23 +231,44 @@ class Agent(ABC):
         full_history = self.history_manager.create_history(
             input_message, history, context, max_tokens=available_tokens
         )
+        return full_history, functions
+
+    def call_function(
+        self,
+        input_message: Message,
+        history: MessageQueue,
+        context: Dict,
+        function_item: FunctionItem,
+    ) -> FunctionRequestMessage:
+        """Force the agent to call a given funuction
+
+        Args:
+            input_message: The input message to respond to.
+            history: The history of the conversation.
+            function_item: The function to call.
+
+        Returns:
+            The parsed response from the OpenAI API.
+        """
+        full_history = self._prepare_function_call(
+            input_message, history, context, function_item
+        )
 
         # Get response from model
-        response = self.model_handler.get_completion(
-            history=full_history, functions=functions
+        response = self.model_handler.call_function(
+            history=full_history, function_item=function_item
         )
-        response.agent_name = self.name
 
         return response
 
-    def call_function(
+    async def acall_function(
         self,
         input_message: Message,
         history: MessageQueue,
         context: Dict,
         function_item: FunctionItem,
     ) -> FunctionRequestMessage:
-        """Force the agent to call a given funuction
+        """Async version of call_function.
 
         Args:
             input_message: The input message to respond to.
@@ -150,9 +276,26 @@ class Agent(ABC):
             function_item: The function to call.
 
         Returns:
-            The parsed response from the OpenAI API.
+            The parsed response from the model.
         """
+        full_history = self._prepare_function_call(
+            input_message, history, context, function_item
+        )
+
+        # Get response from model
+        response = await self.model_handler.acall_function(
+            history=full_history, function_item=function_item
+        )
+
+        return response
 
+    def _prepare_function_call(
+        self,
+        input_message: Message,
+        history: MessageQueue,
+        context: Dict,
+        function_item: FunctionItem,
+    ) -> MessageQueue:
         function_token_count = function_item.token_count
 
         # Prepare history
@@ -161,37 +304,92 @@ class Agent(ABC):
             - function_token_count
             - self.token_settings.min_response_tokens
         )
-        full_history = self.history_manager.create_history(
+        return self.history_manager.create_history(
             input_message, history, context, max_tokens=available_tokens
         )
 
-        # Get response from model
-        response = self.model_handler.call_function(
-            history=full_history, function_item=function_item
+    def give_function_response(
+        self,
+        history: MessageQueue,
+        functions: List[FunctionItem] = None,
+    ) -> Message:
+        """
+        Respond to function results at the end of the history.
+
+        Args:
+            history: The history, ending with the function responses.
+            functions: Functions the agent may call again. Defaults to none, so
+                the agent answers in plain text.
+        """
+        full_history, functions = self._prepare_function_response(history, functions)
+
+        response = self.model_handler.get_completion(
+            history=full_history, functions=functions
         )
 
         return response
 
-    def give_function_response(
+    async def agive_function_response(
         self,
         history: MessageQueue,
+        functions: List[FunctionItem] = None,
     ) -> Message:
-        """ """
+        """Async version of give_function_response."""
+        full_history, functions = self._prepare_function_response(history, functions)
+
+        response = await self.model_handler.aget_completion(
+            history=full_history, functions=functions
+        )
+
+        return response
+
+    def give_function_response_stream(
+        self,
+        history: MessageQueue,
+    ) -> Iterator[(str | Message)]:
+        """Stream the response to function results. See give_function_response."""
+        full_history, _ = self._prepare_function_response(history)
+        yield from self.model_handler.get_completion_stream(
+            history=full_history, functions=None
+        )
+
+    async def agive_function_response_stream(
+        self,
+        history: MessageQueue,
+    ) -> AsyncIterator[(str | Message)]:
+        """Async version of give_function_response_stream."""
+        full_history, _ = self._prepare_function_response(history)
+        async for item in self.model_handler.aget_completion_stream(
+            history=full_history, functions=None
+        ):
+            yield item
+
+    def _prepare_function_response(
+        self, history: MessageQueue, functions: List[FunctionItem] = None
+    ) -> Tuple[MessageQueue, List[FunctionItem]]:
+        """
+        Select functions and build the model history for a response to function
+        results, as _prepare_response does for a new message.
+        """
+        # Get functions
+        if functions:
+            functions = self.function_handler.select_functions(
+                functions, history[-1], history
+            )
+            self.logger.debug(f"Functions = {[f.name for f in functions]}")
+        function_token_count = sum(f.token_count for f in functions or [])
 
         # Prepare history
         available_tokens = (
-            self.model_handler.max_tokens - self.token_settings.min_response_tokens
+            self.model_handler.max_tokens
+            - function_token_count
+            - self.token_settings.min_response_tokens
         )
         full_history = self.history_manager.create_history(
             None, history, None, max_tokens=available_tokens
         )
 
-        # Get response from model
         self.logger.debug("Getting response to function request with history:")
         for message in full_history:
             self.logger.debug(f"  {message}")
-        response = self.model_handler.get_completion(
-            history=full_history, functions=None
-        )
-
-        return response
+        return full_history, functions
@@ -0,0 +1,330 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict, namedtuple
+import json
+import sqlite3
+import threading
+import time
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+from ..message import AgentMessage, Message, MessageQueue
+from ..function import FunctionItem, FunctionRequestMessage
+from .model import (
+    ModelHandler,
+    WrappedModelHandler,
+    _dump_response,
+    _load_response,
+    request_hash,
+)
+
+DEFAULT_CACHE_SIZE = 1024
+
+ResponseCacheInfo = namedtuple(
+    "ResponseCacheInfo", ["hits", "misses", "hit_rate", "currsize"]
+)
+
+
+class ResponseStore(ABC):
+    """
+    Storage backend for cached model responses.
+
+    Responses are stored as JSON-serializable dicts keyed by request hash.
+    Entries older than ttl seconds are treated as missing.
+
+    Args:
+        ttl (float, optional): Seconds an entry stays valid. Defaults to forever.
+    """
+
+    def __init__(self, ttl: Optional[float] = None) -> None:
+        if ttl is not None and ttl <= 0:
+            raise ValueError(f"ttl must be positive, not {ttl}")
+        self.ttl = ttl
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Returns:
+            Optional[Dict]: The stored response, or None if missing or expired.
+        """
+        pass  # pragma: no cover
+
+    @abstractmethod
+    def set(self, key: str, value: Dict) -> None:
+        pass  # pragma: no cover
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Drop all entries."""
+        pass  # pragma: no cover
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass  # pragma: no cover
+
+
+class MemoryResponseStore(ResponseStore):
+    """
+    A bounded, thread-safe LRU store kept in memory.
+
+    Args:
+        maxsize (int): The maximum number of entries. Defaults to 1024.
+        ttl (float, optional): Seconds an entry stays valid. Defaults to forever.
+    """
+
+    def __init__(
+        self, maxsize: int = DEFAULT_CACHE_SIZE, ttl: Optional[float] = None
+    ) -> None:
+        super().__init__(ttl)
+        if not isinstance(maxsize, int) or maxsize < 0:
+            raise ValueError(f"maxsize must be a non-negative int, not {maxsize}")
+        self.maxsize = maxsize
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict) -> None:
+        if self.maxsize == 0:
+            return
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SqliteResponseStore(ResponseStore):
+    """
+    A store kept in a local sqlite database, so cached responses survive
+    restarts and can be shared by processes on the same machine.
+
+    Args:
+        path (str): The database file. Use ":memory:" for a private database.
+        ttl (float, optional): Seconds an entry stays valid. Defaults to forever.
+        table (str): The table used for entries. Defaults to "responses".
+    """
+
+    def __init__(
+        self, path: str, ttl: Optional[float] = None, table: str = "responses"
+    ) -> None:
+        super().__init__(ttl)
+        if not table.isidentifier():
+            raise ValueError(f"table must be a valid identifier, not {table}")
+        self.path = path
+        self.table = table
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._connection.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at <= time.time():
+                with self._connection:
+                    self._connection.execute(
+                        f"DELETE FROM {self.table} WHERE key = ?", (key,)
+                    )
+                return None
+        return json.loads(value)
+
+    def set(self, key: str, value: Dict) -> None:
+        expires_at = None if self.ttl is None else time.time() + self.ttl
+        with self._lock, self._connection:
+            self._connection.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) "
+                "VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at),
+            )
+
+    def clear(self) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(f"DELETE FROM {self.table}")
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._connection.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute(
+                f"SELECT COUNT(*) FROM {self.table}"
+            ).fetchone()[0]
+
+
+class CachingModelHandler(WrappedModelHandler):
+    """
+    A ModelHandler that caches the responses of another handler.
+
+    Requests are keyed by a hash of the handler's request description (for GPT
+    handlers, the converted messages, tool schemas, model and tool_choice), so
+    identical requests, such as common first questions, skip the model. Every
+    call returns a new message with the original token count.
+
+    Example:
+        agent.model_handler = CachingModelHandler(agent.model_handler)
+
+    Args:
+        handler (ModelHandler): The handler to wrap.
+        store (ResponseStore, optional): Where responses are kept. Defaults to a
+            MemoryResponseStore.
+        cache_function_calls (bool): Whether call_function responses are cached
+            too. Defaults to True.
+    """
+
+    def __init__(
+        self,
+        handler: ModelHandler,
+        store: Optional[ResponseStore] = None,
+        cache_function_calls: bool = True,
+    ) -> None:
+        super().__init__(handler)
+        self.store = store if store is not None else MemoryResponseStore()
+        self.cache_function_calls = cache_function_calls
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    # Cache
+
+    def _lookup(self, key: str) -> Optional[Message]:
+        record = self.store.get(key)
+        with self._stats_lock:
+            if record is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if record is None:
+            return None
+        self.logger.debug(f"Cache hit for request {key}")
+        return _load_response(record)
+
+    def _store(self, key: str, message: Message) -> Message:
+        self.store.set(key, _dump_response(message))
+        return message
+
+    def cache_info(self) -> ResponseCacheInfo:
+        """Report hits, misses, hit rate and current size."""
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return ResponseCacheInfo(
+            hits, misses, hits / total if total else 0.0, len(self.store)
+        )
+
+    def clear(self) -> None:
+        """Drop all cached responses and reset the statistics."""
+        self.store.clear()
+        with self._stats_lock:
+            self.hits = 0
+            self.misses = 0
+
+    def _completion_key(
+        self, history: MessageQueue, functions: List[FunctionItem] = None
+    ) -> str:
+        return request_hash(self.completion_request(history, functions))
+
+    def _function_call_key(
+        self, history: MessageQueue, function_item: FunctionItem
+    ) -> str:
+        return request_hash(self.function_call_request(history, function_item))
+
+    # ModelHandler
+
+    def get_completion(
+        self, history: MessageQueue, functions: List[FunctionItem] = None
+    ) -> AgentMessage:
+        key = self._completion_key(history, functions)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        return self._store(key, self.handler.get_completion(history, functions))
+
+    def call_function(
+        self, history: MessageQueue, function_item: FunctionItem
+    ) -> FunctionRequestMessage:
+        if not self.cache_function_calls:
+            return self.handler.call_function(history, function_item)
+        key = self._function_call_key(history, function_item)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        return self._store(key, self.handler.call_function(history, function_item))
+
+    async def aget_completion(
+        self, history: MessageQueue, functions: List[FunctionItem] = None
+    ) -> AgentMessage:
+        key = self._completion_key(history, functions)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        return self._store(key, await self.handler.aget_completion(history, functions))
+
+    async def acall_function(
+        self, history: MessageQueue, function_item: FunctionItem
+    ) -> FunctionRequestMessage:
+        if not self.cache_function_calls:
+            return await self.handler.acall_function(history, function_item)
+        key = self._function_call_key(history, function_item)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        return self._store(
+            key, await self.handler.acall_function(history, function_item)
+        )
+
+    def get_completion_stream(
+        self, history: MessageQueue, functions: List[FunctionItem] = None
+    ) -> Iterator[(str | Message)]:
+        key = self._completion_key(history, functions)
+        cached = self._lookup(key)
+        if cached is not None:
+            if not isinstance(cached, FunctionRequestMessage) and cached.content:
+                yield cached.content
+            yield cached
+            return
+        for item in self.handler.get_completion_stream(history, functions):
+            if isinstance(item, Message):
+                self._store(key, item)
+            yield item
+
+    async def aget_completion_stream(
+        self, history: MessageQueue, functions: List[FunctionItem] = None
+    ) -> AsyncIterator[(str | Message)]:
+        key = self._completion_key(history, functions)
+        cached = self._lookup(key)
+        if cached is not None:
+            if not isinstance(cached, FunctionRequestMessage) and cached.content:
+                yield cached.content
+            yield cached
+            return
+        async for item in self.handler.aget_completion_stream(history, functions):
+            if isinstance(item, Message):
+                self._store(key, item)
+            yield item
@@ -0,0 +1,110 @@
+import asyncio
+from concurrent.futures import Future
+import threading
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from ..message import AgentMessage, Message, MessageQueue
+from ..function import FunctionItem, FunctionRequestMessage
+from .model import ModelHandler, WrappedModelHandler, _copy_response, request_hash
+
+
+class CoalescingModelHandler(WrappedModelHandler):
+    """
+    A ModelHandler that shares one upstream call between concurrent identical
+    requests.
+
+    Requests are keyed by a hash of the handler's request description. While a
+    request is in flight, identical requests from other threads (or other tasks
+    on the same event loop) wait for it instead of calling the model again, and
+    each receives its own copy of the response. Errors are shared the same way.
+    Streams are not coalesced.
+
+    Example:
+        agent.model_handler = CoalescingModelHandler(agent.model_handler)
+
+    Args:
+        handler (ModelHandler): The handler to wrap.
+    """
+
+    def __init__(self, handler: ModelHandler) -> None:
+        super().__init__(handler)
+        self.coalesced = 0
+        self._flights: Dict[str, Future] = {}
+        self._async_flights: Dict[Tuple[asyncio.AbstractEventLoop, str], Future] = {}
+        self._lock = threading.Lock()
+
+    def _single_flight(self, key: str, call: Callable[[], Message]) -> Message:
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Future()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            self.logger.debug(f"Waiting for in-flight request {key}")
+            return _copy_response(flight.result())
+
+        try:
+            response = call()
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        else:
+            flight.set_result(response)
+            return response
+        finally:
+            with self._lock:
+                del self._flights[key]
+
+    async def _asingle_flight(
+        self, key: str, call: Callable[[], Awaitable[Message]]
+    ) -> Message:
+        # The upstream call runs as its own task, so a cancelled waiter does not
+        # cancel it for the others
+        loop = asyncio.get_running_loop()
+        flight_key = (loop, key)
+        with self._lock:
+            task = self._async_flights.get(flight_key)
+            if task is None:
+                task = self._async_flights[flight_key] = loop.create_task(call())
+                task.add_done_callback(
+                    lambda _: self._async_flights.pop(flight_key, None)
+                )
+            else:
+                self.coalesced += 1
+                self.logger.debug(f"Waiting for in-flight request {key}")
+        return _copy_response(await asyncio.shield(task))
+
+    def get_completion(
+        self, history: MessageQueue, functions: List[FunctionItem] = None
+    ) -> AgentMessage:
+        return self._single_flight(
+            request_hash(self.completion_request(history, functions)),
+            lambda: self.handler.get_completion(history, functions),
+        )
+
+    def call_function(
+        self, history: MessageQueue, function_item: FunctionItem
+    ) -> FunctionRequestMessage:
+        return self._single_flight(
+            request_hash(self.function_call_request(history, function_item)),
+            lambda: self.handler.call_function(history, function_item),
+        )
+
+    async def aget_completion(
+        self, history: MessageQueue, functions: List[FunctionItem] = None
+    ) -> AgentMessage:
+        return await self._asingle_flight(
+            request_hash(self.completion_request(history, functions)),
+            lambda: self.handler.aget_completion(history, functions),
+        )
+
+    async def acall_function(
+        self, history: MessageQueue, function_item: FunctionItem
+    ) -> FunctionRequestMessage:
+        return await self._asingle_flight(
+            request_hash(self.function_call_request(history, function_item)),
+            lambda: self.handler.acall_function(history, function_item),
+        )
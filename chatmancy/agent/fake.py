@@ -0,0 +1,284 @@
+import asyncio
+from dataclasses import dataclass, field
+from functools import partial
+import itertools
+import math
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from ..message import AgentMessage, Message, MessageQueue
+from ..function import FunctionItem, FunctionRequestMessage
+from .base import Agent, TokenSettings
+from .gpt.history import GPTHistoryManager
+from .history import HistoryGenerator
+from .model import ModelHandler
+
+Latency = Union[float, Tuple[float, float], Callable[[random.Random], float]]
+
+
+def lognormal_latency(median: float, sigma: float = 0.5) -> Callable:
+    """
+    A log-normal latency distribution, with the long tail of real API latencies.
+
+    Args:
+        median (float): The median latency in seconds.
+        sigma (float): The spread of the tail. Defaults to 0.5.
+
+    Returns:
+        Callable[[random.Random], float]: A latency for FakeModelHandler.
+    """
+    mu = math.log(median)
+    return lambda rng: rng.lognormvariate(mu, sigma)
+
+
+def approximate_token_count(text: str) -> int:
+    """
+    Estimate tokens as one per four characters, without a tokenizer.
+    """
+    return (len(text or "") + 3) // 4
+
+
+@dataclass
+class FakeResponse:
+    """
+    A scripted FakeModelHandler response.
+
+    Attributes:
+        content (str, optional): The message content.
+        tool_calls (List[Dict]): Function calls to request, each a dict with a
+            name and optional args.
+        completion_tokens (int, optional): The reported completion tokens.
+            Defaults to counting the content.
+        latency (float, optional): Seconds to wait instead of sampling the
+            handler's latency.
+    """
+
+    content: Optional[str] = None
+    tool_calls: List[Dict] = field(default_factory=list)
+    completion_tokens: Optional[int] = None
+    latency: Optional[float] = None
+
+
+class FakeModelHandler(ModelHandler):
+    """
+    A deterministic ModelHandler that answers without calling a model, for tests
+    and benchmarks.
+
+    Responses are taken from a script in order, cycling when it runs out.
+    Latency is sampled from a seeded distribution and usage is recorded for
+    every call, as a real API would report it.
+
+    Args:
+        responses (List[FakeResponse | str | Dict], optional): The scripted
+            responses. Strings are content, dicts are FakeResponse fields.
+            Defaults to a single fixed answer.
+        latency (float | Tuple[float, float] | Callable): Seconds per call: a
+            constant, a (low, high) uniform range, or a function of a
+            random.Random. Defaults to 0.
+        max_tokens (int): The model's context size. Defaults to 8192.
+        token_counter (Callable[[str], int], optional): Counts tokens. Defaults
+            to approximate_token_count, so no tokenizer is needed.
+        seed (int): Seed for latency sampling. Defaults to 0.
+        agent_name (str): The agent name of responses. Defaults to "assistant".
+    """
+
+    def __init__(
+        self,
+        responses: Optional[List[Union[FakeResponse, str, Dict]]] = None,
+        latency: Latency = 0.0,
+        max_tokens: int = 8192,
+        token_counter: Optional[Callable[[str], int]] = None,
+        seed: int = 0,
+        agent_name: str = "assistant",
+    ) -> None:
+        super().__init__(max_tokens=max_tokens)
+        scripted = [self._validate_response(r) for r in responses or []]
+        self.responses = scripted or [FakeResponse(content="This is a fake answer.")]
+        self.latency = latency
+        self.token_counter = token_counter or approximate_token_count
+        self.agent_name = agent_name
+        self.calls = 0
+        self.usage: List[Dict[str, int]] = []
+        self._script = itertools.cycle(self.responses)
+        self._call_ids = itertools.count(1)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _validate_response(response) -> FakeResponse:
+        if isinstance(response, FakeResponse):
+            return response
+        if isinstance(response, str):
+            return FakeResponse(content=response)
+        if isinstance(response, dict):
+            return FakeResponse(**response)
+        raise TypeError(
+            f"responses must be FakeResponses, strings or dicts, not {type(response)}"
+        )
+
+    def count_tokens(self, text: str, cache: Optional[bool] = None) -> int:
+        return self.token_counter(text)
+
+    def _sample_latency(self) -> float:
+        latency = self.latency
+        if callable(latency):
+            return max(latency(self._rng), 0.0)
+        if isinstance(latency, tuple):
+            return self._rng.uniform(*latency)
+        return latency
+
+    def _next_response(self) -> Tuple[FakeResponse, float]:
+        with self._lock:
+            self.calls += 1
+            response = next(self._script)
+            latency = (
+                response.latency
+                if response.latency is not None
+                else self._sample_latency()
+            )
+        return response, latency
+
+    def _create_message(
+        self,
+        response: FakeResponse,
+        history: MessageQueue,
+        functions: List[FunctionItem] = None,
+        tool_calls: List[Dict] = None,
+    ) -> Message:
+        tool_calls = response.tool_calls if tool_calls is None else tool_calls
+        with self._lock:
+            requests = [
+                {
+                    "name": call["name"],
+                    "args": dict(call.get("args", {})),
+                    "id": f"call_{next(self._call_ids)}",
+                }
+                for call in tool_calls
+            ]
+        content = response.content or ""
+        completion_tokens = response.completion_tokens
+        if completion_tokens is None:
+            completion_tokens = self.count_tokens(
+                content + "".join(call["name"] + str(call["args"]) for call in requests)
+            )
+        prompt_tokens = self._estimate_tokens(history, functions)
+        with self._lock:
+            self.usage.append(
+                {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                }
+            )
+
+        if requests:
+            return FunctionRequestMessage(
+                requests=requests,
+                token_count=completion_tokens,
+                agent_name=self.agent_name,
+            )
+        return AgentMessage(
+            content=content,
+            token_count=completion_tokens,
+            agent_name=self.agent_name,
+        )
+
+    @staticmethod
+    def _forced_calls(response: FakeResponse, function_item: FunctionItem) -> List:
+        calls = [c for c in response.tool_calls if c["name"] == function_item.name]
+        return calls[:1] or [{"name": function_item.name, "args": {}}]
+
+    def get_completion(
+        self, history: MessageQueue, functions: List[FunctionItem] = None
+    ) -> AgentMessage:
+        response, latency = self._next_response()
+        time.sleep(latency)
+        return self._create_message(response, history, functions)
+
+    def call_function(
+        self, history: MessageQueue, function_item: FunctionItem
+    ) -> FunctionRequestMessage:
+        response, latency = self._next_response()
+        time.sleep(latency)
+        return self._create_message(
+            response,
+            history,
+            [function_item],
+            tool_calls=self._forced_calls(response, function_item),
+        )
+
+    async def aget_completion(
+        self, history: MessageQueue, functions: List[FunctionItem] = None
+    ) -> AgentMessage:
+        response, latency = self._next_response()
+        await asyncio.sleep(latency)
+        return self._create_message(response, history, functions)
+
+    async def acall_function(
+        self, history: MessageQueue, function_item: FunctionItem
+    ) -> FunctionRequestMessage:
+        response, latency = self._next_response()
+        await asyncio.sleep(latency)
+        return self._create_message(
+            response,
+            history,
+            [function_item],
+            tool_calls=self._forced_calls(response, function_item),
+        )
+
+
+class FakeAgent(Agent):
+    """
+    An Agent backed by a FakeModelHandler, with the same history handling as a
+    GPTAgent.
+
+    Args:
+        name: The name of the agent.
+        desc: A description of the agent.
+        model_handler: The handler to use. Defaults to a new FakeModelHandler.
+        system_prompt: The system prompt.
+        history: A generator to add a history prefix to all calls to the agent.
+        token_settings: Settings for the token generation.
+    """
+
+    def __init__(
+        self,
+        name: str = "fake",
+        desc: str = "A fake agent",
+        model_handler: Optional[ModelHandler] = None,
+        system_prompt: str = "You are a helpful chat agent.",
+        history: (List[str] | HistoryGenerator) = None,
+        token_settings: (TokenSettings | dict) = None,
+    ) -> None:
+        super().__init__(
+            name=name,
+            desc=desc,
+            model_handler=model_handler,
+            system_prompt=system_prompt,
+            history=history,
+            token_settings=token_settings,
+        )
+
+    def _initialize_model_handler(
+        self, model_handler: Optional[ModelHandler] = None, **kwargs
+    ) -> ModelHandler:
+        return model_handler if model_handler is not None else FakeModelHandler()
+
+    def _initialize_history_manager(
+        self, history: (List[str] | HistoryGenerator), system_prompt: str, **kwargs
+    ):
+        return GPTHistoryManager(
+            system_message=Message(
+                sender="system",
+                content=system_prompt,
+                token_count=self.model_handler.count_tokens(
+                    system_prompt, cache=True
+                ),
+            ),
+            generator=history,
+            max_prefix_tokens=self.token_settings.max_prefix_tokens,
+            # Counts the context message, which repeats across turns
+            token_counter=partial(self.model_handler.count_tokens, cache=True),
+        )
@@ -1,3 +1,27 @@
 from .agent import GPTAgent
+from .cassette import (
+    CassetteWriter,
+    RecordingModelHandler,
+    ReplayMissError,
+    ReplayModelHandler,
+    ReplayReport,
+    load_sessions,
+    read_cassette,
+    replay_sessions,
+)
+from .client import OpenAIClientPool, client_pool, configure_client_pool
 
-__all__ = [GPTAgent]
+__all__ = [
+    GPTAgent,
+    CassetteWriter,
+    RecordingModelHandler,
+    ReplayMissError,
+    ReplayModelHandler,
+    ReplayReport,
+    load_sessions,
+    read_cassette,
+    replay_sessions,
+    OpenAIClientPool,
+    client_pool,
+    configure_client_pool,
+]
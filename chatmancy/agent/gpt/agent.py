@@ -1,11 +1,15 @@
+from functools import partial
 from typing import List
 
+from openai import AsyncOpenAI, OpenAI
+
 from ...agent.base import Agent, TokenSettings
 from ...agent.history import HistoryGenerator
 from ...message import Message
+from ..scheduler import Priority, RequestScheduler
 
 
-from .model import GPTModelHandler
+from .model import AsyncGPTModelHandler, GPTModelHandler
 from .history import GPTHistoryManager
 
 
@@ -22,6 +26,16 @@ class GPTAgent(Agent):
         token_settings: Settings for the token generation.
         model_max_tokens: The maximum number of tokens to generate for the model.
             Required if the passed model is not recorded in GPTModelHandler.
+        async_client: Use an AsyncGPTModelHandler, so the async methods use the
+            AsyncOpenAI client instead of a worker thread.
+        openai_client: A pre-built OpenAI client. Defaults to a pooled client
+            shared by agents with the same credentials.
+        async_openai_client: A pre-built AsyncOpenAI client, used with
+            async_client.
+        scheduler: The RequestScheduler API calls are submitted through.
+            Defaults to the shared request_scheduler.
+        priority: The scheduling priority of the agent's calls. Defaults to
+            Priority.INTERACTIVE.
 
     """
 
@@ -34,6 +48,11 @@ class GPTAgent(Agent):
         history: (List[str] | HistoryGenerator) = None,
         token_settings: (TokenSettings | dict) = None,
         model_max_tokens: int = None,
+        async_client: bool = False,
+        openai_client: OpenAI = None,
+        async_openai_client: AsyncOpenAI = None,
+        scheduler: RequestScheduler = None,
+        priority: Priority = Priority.INTERACTIVE,
     ) -> None:
         """Create a new Agent instance.
 
@@ -49,18 +68,54 @@ class GPTAgent(Agent):
             history=history,
             token_settings=token_settings,
             model_max_tokens=model_max_tokens,
+            async_client=async_client,
+            openai_client=openai_client,
+            async_openai_client=async_openai_client,
+            scheduler=scheduler,
+            priority=priority,
         )
 
     def _initialize_model_handler(
-        self, model: str, model_max_tokens: int = None, **kwargs
+        self,
+        model: str,
+        model_max_tokens: int = None,
+        async_client: bool = False,
+        openai_client: OpenAI = None,
+        async_openai_client: AsyncOpenAI = None,
+        scheduler: RequestScheduler = None,
+        priority: Priority = Priority.INTERACTIVE,
+        **kwargs,
     ):
-        return GPTModelHandler(model=model, max_tokens=model_max_tokens)
+        if async_client:
+            return AsyncGPTModelHandler(
+                model=model,
+                max_tokens=model_max_tokens,
+                openai_client=openai_client,
+                async_openai_client=async_openai_client,
+                scheduler=scheduler,
+                priority=priority,
+            )
+        return GPTModelHandler(
+            model=model,
+            max_tokens=model_max_tokens,
+            openai_client=openai_client,
+            scheduler=scheduler,
+            priority=priority,
+        )
 
     def _initialize_history_manager(
         self, history: (List[str] | HistoryGenerator), system_prompt: str, **kwargs
     ):
         return GPTHistoryManager(
-            system_message=Message(sender="system", content=system_prompt),
+            system_message=Message(
+                sender="system",
+                content=system_prompt,
+                token_count=self.model_handler.count_tokens(
+                    system_prompt, cache=True
+                ),
+            ),
             generator=history,
             max_prefix_tokens=self.token_settings.max_prefix_tokens,
+            # Counts the context message, which repeats across turns
+            token_counter=partial(self.model_handler.count_tokens, cache=True),
         )
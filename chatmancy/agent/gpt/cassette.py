@@ -0,0 +1,420 @@
+import asyncio
+from collections import defaultdict, deque, namedtuple
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Union
+
+from openai.types.chat import ChatCompletion
+
+from ...message import AgentMessage, MessageQueue
+from ...function import FunctionItem, FunctionRequestMessage
+from ..model import WrappedModelHandler, request_hash
+from .model import AsyncGPTModelHandler, GPTModelHandler
+
+ReplayReport = namedtuple(
+    "ReplayReport",
+    ["sessions", "turns", "errors", "elapsed", "turn_p50", "turn_p99"],
+)
+
+# Request arguments stored once per cassette and referenced by hash
+_SHARED_ARGS = ("messages", "tools")
+
+# Replay handlers never call the API, so they are given a placeholder client
+_NO_CLIENT = object()
+
+
+def _compact_json(value) -> str:
+    return json.dumps(value, separators=(",", ":"), sort_keys=True)
+
+
+class CassetteWriter:
+    """
+    Appends recorded GPT requests and responses to a cassette file.
+
+    Cassettes are JSON lines. Messages and tool schemas are written once, the
+    first time they are seen, and requests refer to them by hash, so a long
+    conversation does not repeat its history on every turn. Writing is
+    thread-safe, and an existing cassette is extended rather than replaced.
+
+    Args:
+        path (str): The cassette file.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike]) -> None:
+        self.path = path
+        self._seen = set()
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    if record["t"] == "b":
+                        self._seen.add(record["h"])
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _blob(self, value, lines: List[str]) -> str:
+        encoded = _compact_json(value)
+        key = request_hash({"v": value})
+        if key not in self._seen:
+            self._seen.add(key)
+            lines.append(f'{{"t":"b","h":"{key}","v":{encoded}}}')
+        return key
+
+    def record(
+        self,
+        request: Dict,
+        completion: ChatCompletion,
+        latency: float,
+        session: Optional[str] = None,
+    ) -> None:
+        """
+        Append one request and its response.
+
+        Args:
+            request (Dict): The chat completions API arguments.
+            completion (ChatCompletion): The API response.
+            latency (float): Seconds the call took.
+            session (str, optional): The session the request belongs to.
+        """
+        response = completion.model_dump(mode="json", exclude_unset=True)
+        with self._lock:
+            lines = []
+            record = {"t": "r", "k": request_hash(request), "l": round(latency, 6)}
+            record["a"] = {k: v for k, v in request.items() if k not in _SHARED_ARGS}
+            for arg in _SHARED_ARGS:
+                if arg in request:
+                    record[arg] = [self._blob(v, lines) for v in request[arg]]
+            record["c"] = response
+            if session is not None:
+                record["s"] = session
+            lines.append(_compact_json(record))
+            self._file.write("\n".join(lines) + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self) -> "CassetteWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def read_cassette(path: Union[str, os.PathLike]) -> Iterator[Dict]:
+    """
+    Read the recorded requests of a cassette, in recording order.
+
+    Yields:
+        Dict: Entries with the request hash (key), the API arguments (request),
+            the ChatCompletion as a dict (response), the latency and the session.
+    """
+    blobs = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if record["t"] == "b":
+                blobs[record["h"]] = record["v"]
+                continue
+            request = dict(record["a"])
+            for arg in _SHARED_ARGS:
+                if arg in record:
+                    request[arg] = [blobs[h] for h in record[arg]]
+            yield {
+                "key": record["k"],
+                "request": request,
+                "response": record["c"],
+                "latency": record["l"],
+                "session": record.get("s"),
+            }
+
+
+class RecordingModelHandler(WrappedModelHandler):
+    """
+    A ModelHandler that records every request and response of a GPTModelHandler
+    to a cassette: the API arguments (converted messages, tools and
+    tool_choice), the ChatCompletion and the observed latency. Streams are
+    passed through without recording.
+
+    Example:
+        writer = CassetteWriter("traffic.jsonl")
+        agent.model_handler = RecordingModelHandler(
+            agent.model_handler, writer, session=conversation_id
+        )
+
+    Given a path, the handler opens its own CassetteWriter, which close() or
+    leaving a with block closes. A writer that was passed in is left open for
+    its owner to close.
+
+    Args:
+        handler (GPTModelHandler): The handler to record.
+        writer (CassetteWriter | str): The cassette, or a path to append to.
+        session (str, optional): Recorded with each request, so the replay
+            driver can group requests into conversations.
+    """
+
+    def __init__(
+        self,
+        handler: GPTModelHandler,
+        writer: Union[CassetteWriter, str, os.PathLike],
+        session: Optional[str] = None,
+    ) -> None:
+        if not isinstance(handler, GPTModelHandler):
+            raise TypeError(f"handler must be a GPTModelHandler, not {type(handler)}")
+        super().__init__(handler)
+        self._owns_writer = not isinstance(writer, CassetteWriter)
+        self.writer = CassetteWriter(writer) if self._owns_writer else writer
+        self.session = session
+
+    def close(self) -> None:
+        """Close the cassette, if this handler opened it."""
+        if self._owns_writer:
+            self.writer.close()
+
+    def __enter__(self) -> "RecordingModelHandler":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _record(self, create: Callable, args: Dict, tokens: int):
+        start = time.perf_counter()
+        completion = create(args, tokens)
+        self.writer.record(args, completion, time.perf_counter() - start, self.session)
+        return self.handler._parse_gpt_response(completion)
+
+    async def _arecord(self, args: Dict, tokens: int):
+        if not isinstance(self.handler, AsyncGPTModelHandler):
+            return await asyncio.to_thread(
+                self._record, self.handler._create, args, tokens
+            )
+        start = time.perf_counter()
+        completion = await self.handler._acreate(args, tokens)
+        self.writer.record(args, completion, time.perf_counter() - start, self.session)
+        return self.handler._parse_gpt_response(completion)
+
+    def get_completion(
+        self, history: MessageQueue, functions: List[FunctionItem] = None
+    ) -> AgentMessage:
+        return self._record(
+            self.handler._create,
+            self.handler._build_completion_args(history, functions),
+            self.handler._estimate_tokens(history, functions),
+        )
+
+    def call_function(
+        self, history: MessageQueue, function_item: FunctionItem
+    ) -> FunctionRequestMessage:
+        return self._record(
+            self.handler._create,
+            self.handler._build_function_call_args(history, function_item),
+            self.handler._estimate_tokens(history, [function_item]),
+        )
+
+    async def aget_completion(
+        self, history: MessageQueue, functions: List[FunctionItem] = None
+    ) -> AgentMessage:
+        return await self._arecord(
+            self.handler._build_completion_args(history, functions),
+            self.handler._estimate_tokens(history, functions),
+        )
+
+    async def acall_function(
+        self, history: MessageQueue, function_item: FunctionItem
+    ) -> FunctionRequestMessage:
+        return await self._arecord(
+            self.handler._build_function_call_args(history, function_item),
+            self.handler._estimate_tokens(history, [function_item]),
+        )
+
+
+class ReplayMissError(LookupError):
+    """Raised when a replayed request was not recorded."""
+
+
+class ReplayModelHandler(AsyncGPTModelHandler):
+    """
+    A GPT ModelHandler that serves recorded responses instead of calling the
+    API.
+
+    Requests are converted exactly as a GPTModelHandler would convert them and
+    looked up by request hash. When a request was recorded several times, its
+    responses are served in turn. Requests that were not recorded raise
+    ReplayMissError. Streaming is not supported.
+
+    Args:
+        cassette (str | Iterable[Dict]): A cassette path, or entries from
+            read_cassette.
+        model (str): The model the requests were recorded with.
+        max_tokens (int): The maximum number of tokens the model can use.
+        replay_latency (bool): Wait for each response's recorded latency.
+            Defaults to False.
+        latency_scale (float): Multiplies recorded latencies. Defaults to 1.
+        agent_name (str): The agent name of responses.
+    """
+
+    def __init__(
+        self,
+        cassette: Union[str, os.PathLike, Iterable[Dict]],
+        model: str = "gpt-4",
+        max_tokens: int = None,
+        replay_latency: bool = False,
+        latency_scale: float = 1.0,
+        agent_name: str = "assistant",
+    ) -> None:
+        super().__init__(
+            model=model,
+            max_tokens=max_tokens,
+            agent_name=agent_name,
+            openai_client=_NO_CLIENT,
+            async_openai_client=_NO_CLIENT,
+        )
+        entries = (
+            read_cassette(cassette)
+            if isinstance(cassette, (str, os.PathLike))
+            else cassette
+        )
+        self._responses: Dict[str, Deque] = defaultdict(deque)
+        for entry in entries:
+            self._responses[entry["key"]].append(
+                (ChatCompletion.model_validate(entry["response"]), entry["latency"])
+            )
+        self.replay_latency = replay_latency
+        self.latency_scale = latency_scale
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _lookup(self, args: Dict):
+        if args.get("stream"):
+            raise ValueError("ReplayModelHandler does not support streaming")
+        key = request_hash(args)
+        with self._lock:
+            responses = self._responses.get(key)
+            if not responses:
+                self.misses += 1
+                raise ReplayMissError(f"No recorded response for request {key}")
+            self.hits += 1
+            completion, latency = responses[0]
+            responses.rotate(-1)
+        delay = latency * self.latency_scale if self.replay_latency else 0.0
+        return completion.model_copy(deep=True), delay
+
+    def _create(self, args: Dict, tokens: int):
+        completion, delay = self._lookup(args)
+        if delay:
+            time.sleep(delay)
+        return completion
+
+    async def _acreate(self, args: Dict, tokens: int):
+        completion, delay = self._lookup(args)
+        if delay:
+            await asyncio.sleep(delay)
+        return completion
+
+
+def load_sessions(path: Union[str, os.PathLike]) -> Dict[str, List[Dict]]:
+    """
+    Recover the user turns of each recorded session.
+
+    The user messages of a session's last request are its turns, except those
+    that were already in its first request's history prefix.
+
+    Returns:
+        Dict[str, List[Dict]]: The user messages of each session, in order.
+    """
+    first: Dict[str, List[Dict]] = {}
+    last: Dict[str, List[Dict]] = {}
+    for entry in read_cassette(path):
+        session = entry["session"] or entry["key"]
+        messages = entry["request"]["messages"]
+        first.setdefault(session, messages)
+        if len(messages) >= len(last.get(session, ())):
+            last[session] = messages
+
+    sessions = {}
+    for session, messages in last.items():
+        prefix = [m for m in first[session] if m["role"] == "user"][:-1]
+        turns = [m for m in messages if m["role"] == "user"]
+        sessions[session] = turns[len(prefix):]
+    return sessions
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(percentile / 100 * len(values)), len(values) - 1)]
+
+
+def replay_sessions(
+    path: Union[str, os.PathLike],
+    conversation_factory: Callable,
+    concurrency: int = 100,
+    replay_latency: bool = False,
+    latency_scale: float = 1.0,
+    model: str = "gpt-4",
+    limit: Optional[int] = None,
+) -> ReplayReport:
+    """
+    Replay recorded sessions through Conversations, many at once on one event
+    loop, to measure framework overhead under production-like traffic.
+
+    Args:
+        path (str): The cassette.
+        conversation_factory (Callable[[ReplayModelHandler], Conversation]):
+            Builds a fresh Conversation whose agents use the given handler. The
+            agents must match the recorded ones, or requests will not be found.
+        concurrency (int): Sessions replayed at the same time. Defaults to 100.
+        replay_latency (bool): Wait for recorded latencies. Defaults to False.
+        latency_scale (float): Multiplies recorded latencies. Defaults to 1.
+        model (str): The model the requests were recorded with.
+        limit (int, optional): Replay at most this many sessions.
+
+    Returns:
+        ReplayReport: Sessions and turns replayed, failed turns, total seconds,
+            and the median and 99th percentile seconds per turn.
+    """
+    sessions = list(load_sessions(path).values())[:limit]
+    handler = ReplayModelHandler(
+        path,
+        model=model,
+        replay_latency=replay_latency,
+        latency_scale=latency_scale,
+    )
+    logger = logging.getLogger("chatmancy.replay_sessions")
+    turn_times: List[float] = []
+    errors = 0
+
+    async def replay(turns: List[Dict], semaphore: asyncio.Semaphore) -> None:
+        nonlocal errors
+        async with semaphore:
+            conversation = conversation_factory(handler)
+            for turn in turns:
+                start = time.perf_counter()
+                try:
+                    await conversation.asend_message(turn["content"])
+                except Exception:
+                    errors += 1
+                    logger.exception("Replayed turn failed, skipping session")
+                    return
+                turn_times.append(time.perf_counter() - start)
+
+    async def run() -> None:
+        semaphore = asyncio.Semaphore(concurrency)
+        await asyncio.gather(*(replay(turns, semaphore) for turns in sessions))
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    return ReplayReport(
+        sessions=len(sessions),
+        turns=len(turn_times),
+        errors=errors,
+        elapsed=time.perf_counter() - start,
+        turn_p50=_percentile(turn_times, 50),
+        turn_p99=_percentile(turn_times, 99),
+    )
@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import os
+import threading
+import weakref
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import httpx
+
+# The connection limits of the OpenAI SDK, used for options left unset
+DEFAULT_LIMITS = httpx.Limits(
+    max_connections=100, max_keepalive_connections=20, keepalive_expiry=5.0
+)
+
+# Environment variables the OpenAI clients fall back to when an option is not given
+_ENV_OPTIONS = {
+    "api_key": "OPENAI_API_KEY",
+    "organization": "OPENAI_ORG_ID",
+    "base_url": "OPENAI_BASE_URL",
+}
+
+
+class OpenAIClientPool:
+    """
+    Process-wide registry of OpenAI clients.
+
+    Handlers created with the same credentials, base URL and client options share
+    one client, and therefore one HTTP connection pool, instead of each opening
+    their own connections and repeating TLS handshakes. Async clients hold
+    connections bound to an event loop, so they are shared per loop.
+
+    Args:
+        limits (httpx.Limits, optional): Connection limits and keep-alive for new
+            clients. Defaults to the OpenAI SDK defaults.
+    """
+
+    def __init__(self, limits: Optional[httpx.Limits] = None) -> None:
+        self.limits = limits
+        self._clients: Dict[Hashable, Any] = {}
+        self._loop_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger("chatmancy.OpenAIClientPool")
+
+    def configure(
+        self,
+        max_connections: Optional[int] = None,
+        max_keepalive_connections: Optional[int] = None,
+        keepalive_expiry: Optional[float] = None,
+    ) -> None:
+        """
+        Set connection limits and keep-alive for clients created from now on.
+        Options left unset keep their current value. Existing clients keep their
+        connection pools.
+
+        Args:
+            max_connections (int, optional): The maximum number of connections.
+            max_keepalive_connections (int, optional): The maximum number of idle
+                connections kept alive.
+            keepalive_expiry (float, optional): Seconds before an idle connection
+                is closed.
+        """
+        current = self.limits or DEFAULT_LIMITS
+        self.limits = httpx.Limits(
+            max_connections=(
+                max_connections
+                if max_connections is not None
+                else current.max_connections
+            ),
+            max_keepalive_connections=(
+                max_keepalive_connections
+                if max_keepalive_connections is not None
+                else current.max_keepalive_connections
+            ),
+            keepalive_expiry=(
+                keepalive_expiry
+                if keepalive_expiry is not None
+                else current.keepalive_expiry
+            ),
+        )
+
+    @staticmethod
+    def _make_key(factory: Callable, kwargs: Dict) -> Optional[Tuple]:
+        options = dict(kwargs)
+        for option, env_var in _ENV_OPTIONS.items():
+            if options.get(option) is None:
+                options[option] = os.environ.get(env_var)
+        key = (factory, tuple(sorted(options.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def get_client(
+        self,
+        factory: Callable,
+        http_client_cls: Callable = httpx.Client,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        **kwargs,
+    ):
+        """
+        Get a shared client, creating it on first use.
+
+        Clients given their own http_client, or options that cannot be compared,
+        are created directly and not shared.
+
+        Args:
+            factory (Callable): The client class, such as OpenAI or AsyncOpenAI.
+            http_client_cls (Callable): The httpx client class used when connection
+                limits are configured. Defaults to httpx.Client.
+            loop (asyncio.AbstractEventLoop, optional): The event loop an async
+                client is used on. Each loop gets its own client, which is
+                dropped with the loop.
+            **kwargs: Keyword arguments for the client.
+
+        Returns:
+            The shared client.
+        """
+        key = None if "http_client" in kwargs else self._make_key(factory, kwargs)
+        if key is None:
+            return factory(**kwargs)
+
+        clients = self._clients if loop is None else self._loop_clients.get(loop, {})
+        client = clients.get(key)
+        if client is not None:
+            return client
+
+        with self._lock:
+            if loop is not None:
+                clients = self._loop_clients.setdefault(loop, {})
+            client = clients.get(key)
+            if client is None:
+                self.logger.debug(f"Creating shared client {factory}")
+                if self.limits is not None:
+                    kwargs["http_client"] = http_client_cls(
+                        limits=self.limits, follow_redirects=True
+                    )
+                client = factory(**kwargs)
+                clients[key] = client
+        return client
+
+    def clear(self) -> None:
+        """Forget all shared clients. Clients already handed out keep working."""
+        with self._lock:
+            self._clients.clear()
+            self._loop_clients.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._clients) + sum(
+                len(clients) for clients in self._loop_clients.values()
+            )
+
+
+client_pool = OpenAIClientPool()
+
+
+def configure_client_pool(
+    max_connections: Optional[int] = None,
+    max_keepalive_connections: Optional[int] = None,
+    keepalive_expiry: Optional[float] = None,
+) -> None:
+    """
+    Set connection limits and keep-alive for the shared OpenAI clients.
+    See OpenAIClientPool.configure.
+    """
+    client_pool.configure(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=keepalive_expiry,
+    )
@@ -1,4 +1,4 @@
-from typing import Dict, List
+from typing import Callable, Dict, List
 import logging
 
 from ...agent.history import HistoryGenerator, HistoryManager
@@ -11,11 +11,16 @@ class GPTHistoryManager(HistoryManager):
         system_message: Message,
         generator: (List[str] | HistoryGenerator),
         max_prefix_tokens: int = None,
+        token_counter: Callable[[str], int] = None,
     ) -> None:
-        super().__init__(generator, max_prefix_tokens)
+        super().__init__(generator, max_prefix_tokens, token_counter)
         # System message check
         if isinstance(system_message, str):
-            system_message = Message(sender="system", content=system_message)
+            system_message = Message(
+                sender="system",
+                content=system_message,
+                token_count=token_counter(system_message) if token_counter else None,
+            )
         elif system_message.sender != "system":
             logging.getLogger("chatmancy.GPTHistoryManager").warning(
                 (
@@ -1,13 +1,25 @@
+import asyncio
 import json
-from typing import List, Dict
+import time
+from typing import AsyncIterator, Dict, Iterator, List, Optional
 
-from openai import OpenAI
-from openai.types.chat import ChatCompletion
+import httpx
+from openai import AsyncOpenAI, OpenAI
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
 
 from ...logging import trace
-from ...message import Message, AgentMessage, UserMessage, MessageQueue
+from ...message import (
+    Message,
+    AgentMessage,
+    UserMessage,
+    MessageQueue,
+    count_tokens,
+    count_tokens_batch,
+)
 from ...function import FunctionItem, FunctionResponseMessage, FunctionRequestMessage
 from ..base import ModelHandler
+from ..scheduler import Priority, RequestScheduler, request_scheduler
+from .client import client_pool
 
 MODEL_INFO = {
     "gpt-4-1106-preview": {
@@ -46,12 +58,68 @@ MODEL_INFO = {
 }
 
 
+class _StreamedCompletion:
+    """
+    Accumulates ChatCompletionChunks into the content, tool calls and usage of
+    a complete response.
+    """
+
+    def __init__(self) -> None:
+        self.content: List[str] = []
+        self.tool_calls: Dict[int, Dict] = {}
+        self.usage = None
+        self.started = time.perf_counter()
+        self.time_to_first_token: Optional[float] = None
+
+    def add(self, chunk: ChatCompletionChunk) -> Optional[str]:
+        """
+        Add a chunk, returning its content delta if it has one.
+        """
+        if getattr(chunk, "usage", None) is not None:
+            self.usage = chunk.usage
+        if not chunk.choices:
+            return None
+
+        delta = chunk.choices[0].delta
+        if self.time_to_first_token is None and (delta.content or delta.tool_calls):
+            self.time_to_first_token = time.perf_counter() - self.started
+
+        # Tool calls arrive as fragments keyed by index; only the first fragment
+        # of each call carries its id
+        for fragment in delta.tool_calls or []:
+            call = self.tool_calls.setdefault(
+                fragment.index, {"id": None, "name": "", "arguments": ""}
+            )
+            if fragment.id:
+                call["id"] = fragment.id
+            if fragment.function is not None:
+                call["name"] += fragment.function.name or ""
+                call["arguments"] += fragment.function.arguments or ""
+
+        if delta.content:
+            self.content.append(delta.content)
+        return delta.content or None
+
+
+def _client_options(kwargs: Dict) -> Dict:
+    """
+    Options for a handler's pooled client. Calls are retried by the scheduler,
+    within its budgets, so the SDK does not retry them again unless max_retries
+    is given.
+    """
+    return {"max_retries": 0, **kwargs}
+
+
 class GPTModelHandler(ModelHandler):
     def __init__(
         self,
         model: str,
         max_tokens: int = None,
         agent_name: str = "assistant",
+        stream_usage: bool = False,
+        openai_client: OpenAI = None,
+        scheduler: RequestScheduler = None,
+        priority: Priority = Priority.INTERACTIVE,
         **kwargs,
     ) -> None:
         """
@@ -64,12 +132,29 @@ class GPTModelHandler(ModelHandler):
             model (str): The name of the OpenAI model to use.
             max_tokens (int): The maximum number of tokens the model can use.
                 Pass this is explicitly if the given model is not known.
+            stream_usage (bool): Ask the API to report usage at the end of a
+                stream. Requires an API version with stream_options. Otherwise
+                streamed responses are counted locally.
+            openai_client (OpenAI, optional): A pre-built client to use. By default
+                handlers with the same client options share a pooled client.
+            scheduler (RequestScheduler, optional): The scheduler API calls are
+                submitted through. Defaults to the shared request_scheduler.
+            priority (Priority): The scheduling priority of this handler's calls.
+                Defaults to Priority.INTERACTIVE.
             **kwargs: Additional keyword arguments to pass to the OpenAI client.
+                max_retries defaults to 0, as the scheduler retries failed calls.
 
         """
         self._model = model
-        self._openai_client = OpenAI(**kwargs)
+        self._openai_client = (
+            openai_client
+            if openai_client is not None
+            else client_pool.get_client(OpenAI, httpx.Client, **_client_options(kwargs))
+        )
         self._agent_name = agent_name
+        self._stream_usage = stream_usage
+        self._scheduler = scheduler if scheduler is not None else request_scheduler
+        self._priority = priority
         if max_tokens is None:
             try:
                 max_tokens = MODEL_INFO[model]["max_tokens"]
@@ -80,6 +165,18 @@ class GPTModelHandler(ModelHandler):
 
         super().__init__(max_tokens=max_tokens, **kwargs)
 
+    def count_tokens(self, text: str, cache: Optional[bool] = None) -> int:
+        """
+        Count the tokens in a string using this handler's model encoding.
+        """
+        return count_tokens(text, model=self._model, cache=cache)
+
+    def count_tokens_batch(self, texts: List[str]) -> List[int]:
+        """
+        Count the tokens in many strings with one batched encode.
+        """
+        return count_tokens_batch(texts, model=self._model)
+
     @trace(name="Model.submit_request")
     def get_completion(
         self,
@@ -97,21 +194,13 @@ class GPTModelHandler(ModelHandler):
         Returns:
             ChatCompletion: The generated chatbot response.
         """
-        args = {
-            "model": self._model,
-            "messages": self._convert_history(history),
-        }
-
-        # Add functions if present and enabled
-        if functions:
-            args["tools"] = [
-                {"type": "function", "function": self._func_item_to_gpt(f)}
-                for f in functions
-            ]
+        args = self._build_completion_args(history, functions)
 
         # Call and parse
         self.logger.debug(f"Calling OpenAI API completion with args: {args}")
-        response: ChatCompletion = self._openai_client.chat.completions.create(**args)
+        response: ChatCompletion = self._create(
+            args, self._estimate_tokens(history, functions)
+        )
         return self._parse_gpt_response(response)
 
     def call_function(
@@ -130,18 +219,106 @@ class GPTModelHandler(ModelHandler):
             The parsed response from the OpenAI API.
         """
         # Call and parse
-        response = self._openai_client.chat.completions.create(
-            model=self._model,
-            messages=self._convert_history(history),
-            tools=[
+        response = self._create(
+            self._build_function_call_args(history, function_item),
+            self._estimate_tokens(history, [function_item]),
+        )
+        return self._parse_gpt_response(response)
+
+    def get_completion_stream(
+        self,
+        history: MessageQueue,
+        functions: List[FunctionItem] = None,
+    ) -> Iterator[(str | Message)]:
+        """
+        Stream a chatbot response, yielding content deltas as they arrive and
+        then the final message. Tool call fragments are assembled into a
+        FunctionRequestMessage.
+
+        Args:
+            history (MessageQueue): The message history to generate a response from.
+            functions (List[FunctionItem], optional): A list of FunctionItem objects
+                to use for generating the response. Defaults to None.
+
+        Yields:
+            str | Message: Content deltas, then the final AgentMessage or
+                FunctionRequestMessage.
+        """
+        args = self._build_stream_args(history, functions)
+        self.logger.debug(f"Streaming OpenAI API completion with args: {args}")
+        streamed = _StreamedCompletion()
+        for chunk in self._create(args, self._estimate_tokens(history, functions)):
+            delta = streamed.add(chunk)
+            if delta:
+                yield delta
+        yield self._parse_gpt_stream(streamed)
+
+    def _create(self, args: Dict, tokens: int):
+        """
+        Call the chat completions API through the scheduler.
+        """
+        return self._scheduler.submit(
+            self._model,
+            tokens,
+            lambda: self._openai_client.chat.completions.create(**args),
+            priority=self._priority,
+        )
+
+    def completion_request(
+        self, history: MessageQueue, functions: List[FunctionItem] = None
+    ) -> Dict:
+        """
+        Describe a get_completion call by its OpenAI API arguments.
+        """
+        return self._build_completion_args(history, functions)
+
+    def function_call_request(
+        self, history: MessageQueue, function_item: FunctionItem
+    ) -> Dict:
+        """
+        Describe a call_function call by its OpenAI API arguments.
+        """
+        return self._build_function_call_args(history, function_item)
+
+    def _build_stream_args(
+        self, history: MessageQueue, functions: List[FunctionItem] = None
+    ) -> Dict:
+        args = self._build_completion_args(history, functions)
+        args["stream"] = True
+        if self._stream_usage:
+            args["stream_options"] = {"include_usage": True}
+        return args
+
+    def _build_completion_args(
+        self, history: MessageQueue, functions: List[FunctionItem] = None
+    ) -> Dict:
+        args = {
+            "model": self._model,
+            "messages": self._convert_history(history),
+        }
+
+        # Add functions if present and enabled
+        if functions:
+            args["tools"] = [
+                {"type": "function", "function": self._func_item_to_gpt(f)}
+                for f in functions
+            ]
+        return args
+
+    def _build_function_call_args(
+        self, history: MessageQueue, function_item: FunctionItem
+    ) -> Dict:
+        return {
+            "model": self._model,
+            "messages": self._convert_history(history),
+            "tools": [
                 {"type": "function", "function": self._func_item_to_gpt(function_item)}
             ],
-            tool_choice={
+            "tool_choice": {
                 "type": "function",
                 "function": {"name": function_item.name},
             },
-        )
-        return self._parse_gpt_response(response)
+        }
 
     def _message_to_gpt(self, message: Message) -> Dict:
         if isinstance(message, FunctionResponseMessage):
@@ -197,27 +374,171 @@ class GPTModelHandler(ModelHandler):
         If the response is a function call, return a FunctionRequestMessage instead.
         """
         response_message = response.choices[0].message
-        tool_calls = response_message.tool_calls
+        tool_calls = [
+            {
+                "id": tool_call.id,
+                "name": tool_call.function.name,
+                "arguments": tool_call.function.arguments,
+            }
+            for tool_call in response_message.tool_calls or []
+        ]
+        return self._create_response_message(
+            response_message.content, tool_calls, response.usage.completion_tokens
+        )
+
+    def _parse_gpt_stream(self, streamed: _StreamedCompletion) -> Message:
+        """
+        Convert an assembled stream into a Message object, using the reported
+        usage if there was one and counting the generated text otherwise.
+        """
+        self.logger.debug(f"Time to first token: {streamed.time_to_first_token}")
+        content = "".join(streamed.content)
+        tool_calls = [streamed.tool_calls[i] for i in sorted(streamed.tool_calls)]
+        if streamed.usage is not None:
+            token_count = streamed.usage.completion_tokens
+        else:
+            token_count = self.count_tokens(
+                content + "".join(c["name"] + c["arguments"] for c in tool_calls)
+            )
+        return self._create_response_message(content, tool_calls, token_count)
+
+    def _create_response_message(
+        self, content: Optional[str], tool_calls: List[Dict], token_count: int
+    ) -> Message:
         if tool_calls:
             requests = [
                 {
-                    "name": tool_call.function.name,
-                    "args": json.loads(tool_call.function.arguments),
-                    "id": tool_call.id,
+                    "name": tool_call["name"],
+                    "args": json.loads(tool_call["arguments"] or "{}"),
+                    "id": tool_call["id"],
                     "func_item": None,
                 }
                 for tool_call in tool_calls
             ]
             return FunctionRequestMessage(
                 requests=requests,
-                token_count=response.usage.completion_tokens,
+                token_count=token_count,
             )
         else:
             return AgentMessage(
-                content=response_message.content,
-                token_count=response.usage.completion_tokens,
+                content=content,
+                token_count=token_count,
                 agent_name=self._agent_name,
             )
 
     def _convert_history(self, history: MessageQueue) -> List[Dict]:
         return [self._message_to_gpt(m) for m in history]
+
+
+class AsyncGPTModelHandler(GPTModelHandler):
+    """
+    A GPTModelHandler whose async methods use the AsyncOpenAI client, so many
+    conversations can share one event loop instead of one thread per request.
+    The sync methods still use the blocking client.
+
+    Args:
+        model (str): The name of the OpenAI model to use.
+        max_tokens (int): The maximum number of tokens the model can use.
+            Pass this explicitly if the given model is not known.
+        stream_usage (bool): Ask the API to report usage at the end of a stream.
+        openai_client (OpenAI, optional): A pre-built sync client to use.
+        async_openai_client (AsyncOpenAI, optional): A pre-built async client to
+            use. By default handlers with the same client options share a pooled
+            client on each event loop.
+        scheduler (RequestScheduler, optional): The scheduler API calls are
+            submitted through. Defaults to the shared request_scheduler.
+        priority (Priority): The scheduling priority of this handler's calls.
+        **kwargs: Additional keyword arguments to pass to the OpenAI clients.
+            max_retries defaults to 0, as the scheduler retries failed calls.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        max_tokens: int = None,
+        agent_name: str = "assistant",
+        stream_usage: bool = False,
+        openai_client: OpenAI = None,
+        async_openai_client: AsyncOpenAI = None,
+        scheduler: RequestScheduler = None,
+        priority: Priority = Priority.INTERACTIVE,
+        **kwargs,
+    ) -> None:
+        super().__init__(
+            model=model,
+            max_tokens=max_tokens,
+            agent_name=agent_name,
+            stream_usage=stream_usage,
+            openai_client=openai_client,
+            scheduler=scheduler,
+            priority=priority,
+            **kwargs,
+        )
+        self._async_openai_client = async_openai_client
+        self._async_client_options = _client_options(kwargs)
+
+    def _get_async_client(self) -> AsyncOpenAI:
+        """
+        The async client given to the handler, or the pooled client for the
+        running event loop.
+        """
+        if self._async_openai_client is not None:
+            return self._async_openai_client
+        return client_pool.get_client(
+            AsyncOpenAI,
+            httpx.AsyncClient,
+            loop=asyncio.get_running_loop(),
+            **self._async_client_options,
+        )
+
+    async def _acreate(self, args: Dict, tokens: int):
+        """
+        Call the async chat completions API through the scheduler.
+        """
+        client = self._get_async_client()
+        return await self._scheduler.asubmit(
+            self._model,
+            tokens,
+            lambda: client.chat.completions.create(**args),
+            priority=self._priority,
+        )
+
+    @trace(name="Model.asubmit_request")
+    async def aget_completion(
+        self,
+        history: MessageQueue,
+        functions: List[FunctionItem] = None,
+    ) -> AgentMessage:
+        args = self._build_completion_args(history, functions)
+        self.logger.debug(f"Calling async OpenAI API completion with args: {args}")
+        response: ChatCompletion = await self._acreate(
+            args, self._estimate_tokens(history, functions)
+        )
+        return self._parse_gpt_response(response)
+
+    async def acall_function(
+        self,
+        history: MessageQueue,
+        function_item: FunctionItem,
+    ) -> FunctionRequestMessage:
+        response = await self._acreate(
+            self._build_function_call_args(history, function_item),
+            self._estimate_tokens(history, [function_item]),
+        )
+        return self._parse_gpt_response(response)
+
+    async def aget_completion_stream(
+        self,
+        history: MessageQueue,
+        functions: List[FunctionItem] = None,
+    ) -> AsyncIterator[(str | Message)]:
+        args = self._build_stream_args(history, functions)
+        self.logger.debug(f"Streaming async OpenAI API completion with args: {args}")
+        streamed = _StreamedCompletion()
+        async for chunk in await self._acreate(
+            args, self._estimate_tokens(history, functions)
+        ):
+            delta = streamed.add(chunk)
+            if delta:
+                yield delta
+        yield self._parse_gpt_stream(streamed)
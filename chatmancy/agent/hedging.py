@@ -0,0 +1,240 @@
+import asyncio
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+import math
+import threading
+import time
+from typing import Awaitable, Callable, List, Optional
+
+from ..message import AgentMessage, Message, MessageQueue
+from ..function import FunctionItem, FunctionRequestMessage
+from .model import ModelHandler, WrappedModelHandler
+
+HedgeInfo = namedtuple(
+    "HedgeInfo", ["requests", "hedges", "hedge_rate", "hedge_wins", "win_rate"]
+)
+
+
+class HedgingModelHandler(WrappedModelHandler):
+    """
+    A ModelHandler that sends a duplicate of a slow request and uses whichever
+    response arrives first.
+
+    A request that has not returned after the given percentile of recent
+    latencies is hedged once, and the losing call is cancelled. Async calls
+    are cancelled outright. Sync calls run in worker threads, which cannot be
+    interrupted, so a losing sync call finishes in the background and its
+    response is discarded. At most max_hedge_rate of requests are hedged, and
+    never more than one duplicate per request, so request volume at most
+    doubles. Streams are not hedged.
+
+    Example:
+        agent.model_handler = HedgingModelHandler(agent.model_handler)
+
+    Args:
+        handler (ModelHandler): The handler to wrap.
+        percentile (float): The latency percentile after which a request is
+            hedged. Defaults to 95.
+        initial_delay (float): Seconds before hedging until min_samples
+            latencies are known. Defaults to 2.
+        min_delay (float): The shortest delay in seconds. Defaults to 0.
+        max_hedge_rate (float): The largest fraction of requests that may be
+            hedged, between 0 and 1. Defaults to 0.1.
+        window (int): The number of recent latencies kept. Defaults to 200.
+        min_samples (int): Latencies needed before the percentile is used.
+            Defaults to 20.
+        max_workers (int): Threads used for sync hedges. Defaults to 16.
+    """
+
+    def __init__(
+        self,
+        handler: ModelHandler,
+        percentile: float = 95.0,
+        initial_delay: float = 2.0,
+        min_delay: float = 0.0,
+        max_hedge_rate: float = 0.1,
+        window: int = 200,
+        min_samples: int = 20,
+        max_workers: int = 16,
+    ) -> None:
+        super().__init__(handler)
+        if not 0 < percentile <= 100:
+            raise ValueError(f"percentile must be in (0, 100], not {percentile}")
+        if not 0 <= max_hedge_rate <= 1:
+            raise ValueError(f"max_hedge_rate must be in [0, 1], not {max_hedge_rate}")
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.max_hedge_rate = max_hedge_rate
+        self.min_samples = min_samples
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    # Statistics
+
+    def hedge_delay(self) -> float:
+        """
+        Seconds a request may run before it is hedged.
+        """
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return max(self.initial_delay, self.min_delay)
+            latencies = sorted(self._latencies)
+        # Nearest-rank percentile
+        rank = math.ceil(self.percentile / 100 * len(latencies)) - 1
+        return max(latencies[max(rank, 0)], self.min_delay)
+
+    def hedge_info(self) -> HedgeInfo:
+        """Report requests, hedges, hedge rate, hedge wins and win rate."""
+        with self._lock:
+            requests, hedges, wins = self.requests, self.hedges, self.hedge_wins
+        return HedgeInfo(
+            requests,
+            hedges,
+            hedges / requests if requests else 0.0,
+            wins,
+            wins / hedges if hedges else 0.0,
+        )
+
+    def _start_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def _try_hedge(self) -> bool:
+        with self._lock:
+            if self.hedges + 1 > self.max_hedge_rate * self.requests:
+                return False
+            self.hedges += 1
+            return True
+
+    def _record(self, latency: float, hedge_won: bool = False) -> None:
+        with self._lock:
+            self._latencies.append(latency)
+            if hedge_won:
+                self.hedge_wins += 1
+
+    # Hedging
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self._max_workers,
+                        thread_name_prefix="chatmancy-hedge",
+                    )
+        return self._executor
+
+    @staticmethod
+    def _run(call: Callable[[], Message], future: Future) -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(call())
+        except BaseException as e:
+            future.set_exception(e)
+
+    def _start_primary(self, call: Callable[[], Message]) -> Future:
+        """
+        Start a request on its own thread, so it is not queued behind other
+        requests and the caller can still return early if its hedge wins.
+        """
+        primary = Future()
+        threading.Thread(
+            target=self._run,
+            args=(call, primary),
+            name="chatmancy-hedge-primary",
+            daemon=True,
+        ).start()
+        return primary
+
+    def _hedged(self, call: Callable[[], Message]) -> Message:
+        self._start_request()
+        start = time.perf_counter()
+        primary = self._start_primary(call)
+        done, _ = wait([primary], timeout=self.hedge_delay())
+        if done or not self._try_hedge():
+            result = primary.result()
+            self._record(time.perf_counter() - start)
+            return result
+
+        self.logger.debug("Request is slow, sending a hedged request")
+        hedge = self._get_executor().submit(call)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                for loser in pending:
+                    loser.cancel()
+                self._record(time.perf_counter() - start, hedge_won=future is hedge)
+                return future.result()
+        raise error
+
+    async def _ahedged(self, call: Callable[[], Awaitable[Message]]) -> Message:
+        self._start_request()
+        start = time.perf_counter()
+        primary = asyncio.ensure_future(call())
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self.hedge_delay())
+            if done or not self._try_hedge():
+                result = await primary
+                self._record(time.perf_counter() - start)
+                return result
+
+            self.logger.debug("Request is slow, sending a hedged request")
+            hedge = asyncio.ensure_future(call())
+            pending.add(hedge)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    self._record(
+                        time.perf_counter() - start, hedge_won=task is hedge
+                    )
+                    return task.result()
+            raise error
+        finally:
+            # Cancel the losing call, or both calls if this one was cancelled
+            for task in pending:
+                task.cancel()
+
+    # ModelHandler
+
+    def get_completion(
+        self, history: MessageQueue, functions: List[FunctionItem] = None
+    ) -> AgentMessage:
+        return self._hedged(lambda: self.handler.get_completion(history, functions))
+
+    def call_function(
+        self, history: MessageQueue, function_item: FunctionItem
+    ) -> FunctionRequestMessage:
+        return self._hedged(lambda: self.handler.call_function(history, function_item))
+
+    async def aget_completion(
+        self, history: MessageQueue, functions: List[FunctionItem] = None
+    ) -> AgentMessage:
+        return await self._ahedged(
+            lambda: self.handler.aget_completion(history, functions)
+        )
+
+    async def acall_function(
+        self, history: MessageQueue, function_item: FunctionItem
+    ) -> FunctionRequestMessage:
+        return await self._ahedged(
+            lambda: self.handler.acall_function(history, function_item)
+        )
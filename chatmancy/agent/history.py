@@ -1,9 +1,9 @@
 from abc import ABC
-from typing import Dict, List
+from typing import Callable, Dict, List
 import logging
 
 
-from ..message import Message, MessageQueue, UserMessage
+from ..message import Message, MessageQueue, PersistentMessageQueue, UserMessage
 from ..logging import trace
 
 
@@ -82,6 +82,9 @@ class HistoryManager:
             create the history.
         max_prefix_tokens (int, optional): The maximum number of tokens to include in
             the prefix. Defaults to None.
+        token_counter (Callable[[str], int], optional): Counts tokens for messages
+            created by the manager, such as the context message. Defaults to the
+            shared tokenizer registry.
 
     Raises:
         TypeError: If the generator is not a list of statements or a HistoryGenerator.
@@ -99,11 +102,13 @@ class HistoryManager:
         self,
         generator: (List[str] | HistoryGenerator),
         max_prefix_tokens: int = None,
+        token_counter: Callable[[str], int] = None,
     ) -> None:
         self.logger = logging.getLogger("chatmancy.HistoryManager")
 
         # Tokens
         self.max_prefix_tokens = max_prefix_tokens
+        self.token_counter = token_counter
 
         # Create prefix
         if generator is None:
@@ -140,7 +145,9 @@ class HistoryManager:
         """
         prefix = self.generator.create_history(input_message, context)
         if self.max_prefix_tokens is not None:
-            prefix = MessageQueue(prefix.get_last_n_tokens(self.max_prefix_tokens))
+            prefix = MessageQueue._from_trusted(
+                prefix.get_last_n_tokens(self.max_prefix_tokens)
+            )
         return prefix
 
     @trace(name="Agent.create_history")
@@ -158,18 +165,20 @@ class HistoryManager:
         Args:
             input_message (Message): The input message.
             history (MessageQueue): The history of messages in the conversation.
+                A PersistentMessageQueue history is combined without copying.
             context (Dict[str, str]): The context of the conversation.
             max_tokens (int): The maximum number of tokens in the history.
 
         Returns:
-            MessageQueue: The created history.
+            MessageQueue: The created history, a PersistentMessageQueue if the
+                given history was one.
 
         Raises:
             ValueError: If the maximum number of tokens is less than the number
                  of tokens in the context and input message.
         """
         # Validate args
-        if not isinstance(history, MessageQueue):
+        if not isinstance(history, (MessageQueue, PersistentMessageQueue)):
             try:
                 history = MessageQueue(history)
             except Exception:
@@ -188,7 +197,13 @@ class HistoryManager:
         prefix = self._create_prefix(input_message, context)
         self.logger.debug(f"Prefix token count is {prefix.token_count}")
         if context:
-            context_message = UserMessage(f"The current context is {context}")
+            context_content = f"The current context is {context}"
+            context_message = UserMessage(
+                context_content,
+                token_count=(
+                    self.token_counter(context_content) if self.token_counter else None
+                ),
+            )
             context_token_count = context_message.token_count
         else:
             context_message = None
@@ -211,8 +226,12 @@ class HistoryManager:
 
         history = history.get_last_n_tokens(available_tokens)
 
-        # Combine
-        result = prefix + history
+        # Combine, as a view over the history if it is persistent
+        if isinstance(history, PersistentMessageQueue):
+            result = PersistentMessageQueue._from_trusted(prefix) + history
+        else:
+            result = prefix.copy()
+            result._extend_trusted(history)
         if context_message:
             result += [context_message]
         result += [input_message]
@@ -1,18 +1,43 @@
 from abc import ABC, abstractmethod
+import asyncio
+import copy
+import hashlib
+import json
 import logging
-from typing import List
+from typing import AsyncIterator, Dict, Iterator, List, Optional
 
 
-from ..message import AgentMessage, MessageQueue
+from ..message import AgentMessage, Message, MessageQueue, count_tokens
 from ..function import FunctionItem, FunctionRequestMessage
 
 
+def request_hash(request: Dict) -> str:
+    """
+    Hash a request description, such as one returned by
+    ModelHandler.completion_request, independently of key order.
+
+    Args:
+        request (Dict): The JSON-serializable request.
+
+    Returns:
+        str: A hex digest identifying the request.
+    """
+    payload = json.dumps(request, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(
+        payload.encode("utf-8", "surrogatepass"), digest_size=16
+    ).hexdigest()
+
+
 class ModelHandler(ABC):
     """
     Abstract base class for ModelHandlers.
     ModelHandlers convert Messages and Functions into the correct format
     for an LLM API or model, and convert responses from the model into Messages
     and FunctionRequestMessages.
+
+    The async methods default to running the sync methods in a worker thread,
+    and the stream methods default to yielding the full completion at once.
+    Override them to use a native async client or streaming API.
     """
 
     max_tokens: int
@@ -23,6 +48,85 @@ class ModelHandler(ABC):
             f"chatmancy.ModelHandler.{self.__class__.__name__}"
         )
 
+    def count_tokens(self, text: str, cache: Optional[bool] = None) -> int:
+        """
+        Count the tokens in a string as this model would.
+        Override for models that do not use the default encoding.
+
+        Args:
+            text (str): The text to count.
+            cache (bool, optional): Whether to cache the count; pass True for
+                text counted every turn. See TokenCountCache.
+
+        Returns:
+            int: The number of tokens in the text.
+        """
+        return count_tokens(text, cache=cache)
+
+    def count_tokens_batch(self, texts: List[str]) -> List[int]:
+        """
+        Count the tokens in many strings as this model would.
+        Override to count them in a single batch.
+
+        Args:
+            texts (List[str]): The texts to count.
+
+        Returns:
+            List[int]: The number of tokens in each text, in order.
+        """
+        return [self.count_tokens(text) for text in texts]
+
+    @staticmethod
+    def _estimate_tokens(
+        history: MessageQueue, functions: List[FunctionItem] = None
+    ) -> int:
+        """
+        Estimate the prompt tokens of a request from the counts we already hold.
+        """
+        tokens = getattr(history, "token_count", None)
+        if not isinstance(tokens, int):
+            tokens = sum(m.token_count for m in history)
+        return tokens + sum(f.token_count or 0 for f in functions or [])
+
+    def completion_request(
+        self, history: MessageQueue, functions: List[FunctionItem] = None
+    ) -> Dict:
+        """
+        Describe a get_completion call as a JSON-serializable dict. Identical
+        calls give equal dicts, so they can be hashed with request_hash.
+        Override to describe the payload the model actually receives.
+
+        Args:
+            history (MessageQueue): The message history.
+            functions (List[FunctionItem], optional): The available functions.
+
+        Returns:
+            Dict: The request description.
+        """
+        return {
+            "handler": type(self).__name__,
+            "messages": [_message_request(m) for m in history],
+            "tools": [_function_request(f) for f in functions or []],
+        }
+
+    def function_call_request(
+        self, history: MessageQueue, function_item: FunctionItem
+    ) -> Dict:
+        """
+        Describe a call_function call as a JSON-serializable dict.
+        See completion_request.
+
+        Args:
+            history (MessageQueue): The message history.
+            function_item (FunctionItem): The function to call.
+
+        Returns:
+            Dict: The request description.
+        """
+        request = self.completion_request(history, [function_item])
+        request["tool_choice"] = function_item.name
+        return request
+
     @abstractmethod
     def get_completion(
         self,
@@ -59,3 +163,204 @@ class ModelHandler(ABC):
             The parsed response from the OpenAI API.
         """
         pass  # pragma: no cover
+
+    async def aget_completion(
+        self,
+        history: MessageQueue,
+        functions: List[FunctionItem] = None,
+    ) -> AgentMessage:
+        """
+        Async version of get_completion.
+
+        Args:
+            history (MessageQueue): The message history to generate a response from.
+            functions (List[FunctionItem], optional): A list of FunctionItem objects
+                to use for generating the response. Defaults to None.
+
+        Returns:
+            AgentMessage: The generated chatbot response.
+        """
+        return await asyncio.to_thread(self.get_completion, history, functions)
+
+    async def acall_function(
+        self,
+        history: MessageQueue,
+        function_item: FunctionItem,
+    ) -> FunctionRequestMessage:
+        """
+        Async version of call_function.
+
+        Args:
+            history (MessageQueue): The message history.
+            function_item (FunctionItem): The function to call.
+
+        Returns:
+            FunctionRequestMessage: The parsed response.
+        """
+        return await asyncio.to_thread(self.call_function, history, function_item)
+
+    def get_completion_stream(
+        self,
+        history: MessageQueue,
+        functions: List[FunctionItem] = None,
+    ) -> Iterator[(str | Message)]:
+        """
+        Stream a chatbot response given a message history and optional functions.
+
+        Args:
+            history (MessageQueue): The message history to generate a response from.
+            functions (List[FunctionItem], optional): A list of FunctionItem objects
+                to use for generating the response. Defaults to None.
+
+        Yields:
+            str | Message: Content deltas as they arrive, then the final
+                AgentMessage or FunctionRequestMessage.
+        """
+        response = self.get_completion(history, functions)
+        if not isinstance(response, FunctionRequestMessage) and response.content:
+            yield response.content
+        yield response
+
+    async def aget_completion_stream(
+        self,
+        history: MessageQueue,
+        functions: List[FunctionItem] = None,
+    ) -> AsyncIterator[(str | Message)]:
+        """
+        Async version of get_completion_stream.
+
+        Args:
+            history (MessageQueue): The message history to generate a response from.
+            functions (List[FunctionItem], optional): A list of FunctionItem objects
+                to use for generating the response. Defaults to None.
+
+        Yields:
+            str | Message: Content deltas as they arrive, then the final
+                AgentMessage or FunctionRequestMessage.
+        """
+        response = await self.aget_completion(history, functions)
+        if not isinstance(response, FunctionRequestMessage) and response.content:
+            yield response.content
+        yield response
+
+
+class WrappedModelHandler(ModelHandler):
+    """
+    A ModelHandler that forwards every call to another handler. Subclass it to
+    add behaviour around a handler, such as caching, and set it as an agent's
+    model_handler. Attributes not found on the wrapper are read from the wrapped
+    handler.
+
+    Args:
+        handler (ModelHandler): The handler to wrap.
+    """
+
+    def __init__(self, handler: ModelHandler) -> None:
+        if not isinstance(handler, ModelHandler):
+            raise TypeError(f"handler must be a ModelHandler, not {type(handler)}")
+        self.handler = handler
+        super().__init__(max_tokens=handler.max_tokens)
+
+    def __getattr__(self, name: str):
+        if name == "handler":
+            raise AttributeError(name)
+        return getattr(self.handler, name)
+
+    def count_tokens(self, text: str, cache: Optional[bool] = None) -> int:
+        return self.handler.count_tokens(text, cache=cache)
+
+    def count_tokens_batch(self, texts: List[str]) -> List[int]:
+        return self.handler.count_tokens_batch(texts)
+
+    def completion_request(
+        self, history: MessageQueue, functions: List[FunctionItem] = None
+    ) -> Dict:
+        return self.handler.completion_request(history, functions)
+
+    def function_call_request(
+        self, history: MessageQueue, function_item: FunctionItem
+    ) -> Dict:
+        return self.handler.function_call_request(history, function_item)
+
+    def get_completion(
+        self, history: MessageQueue, functions: List[FunctionItem] = None
+    ) -> AgentMessage:
+        return self.handler.get_completion(history, functions)
+
+    def call_function(
+        self, history: MessageQueue, function_item: FunctionItem
+    ) -> FunctionRequestMessage:
+        return self.handler.call_function(history, function_item)
+
+    async def aget_completion(
+        self, history: MessageQueue, functions: List[FunctionItem] = None
+    ) -> AgentMessage:
+        return await self.handler.aget_completion(history, functions)
+
+    async def acall_function(
+        self, history: MessageQueue, function_item: FunctionItem
+    ) -> FunctionRequestMessage:
+        return await self.handler.acall_function(history, function_item)
+
+    def get_completion_stream(
+        self, history: MessageQueue, functions: List[FunctionItem] = None
+    ) -> Iterator[(str | Message)]:
+        return self.handler.get_completion_stream(history, functions)
+
+    def aget_completion_stream(
+        self, history: MessageQueue, functions: List[FunctionItem] = None
+    ) -> AsyncIterator[(str | Message)]:
+        return self.handler.aget_completion_stream(history, functions)
+
+
+def _message_request(message: Message) -> Dict:
+    return message.model_dump(
+        mode="json",
+        exclude={"token_count": True, "requests": {"__all__": {"func_item"}}},
+    )
+
+
+def _function_request(function_item: FunctionItem) -> Dict:
+    return {
+        "name": function_item.name,
+        "description": function_item.description,
+        "params": {
+            k: v.model_dump(exclude_none=True) for k, v in function_item.params.items()
+        },
+        "required": function_item.required,
+    }
+
+
+def _dump_response(message: Message) -> Dict:
+    record = {
+        "content": message.content,
+        "token_count": message.token_count,
+        "agent_name": message.agent_name,
+    }
+    if isinstance(message, FunctionRequestMessage):
+        record["requests"] = [
+            {"name": r.name, "args": copy.deepcopy(r.args), "id": r.id}
+            for r in message.requests
+        ]
+    return record
+
+
+def _load_response(record: Dict) -> Message:
+    if "requests" in record:
+        return FunctionRequestMessage(
+            requests=copy.deepcopy(record["requests"]),
+            token_count=record["token_count"],
+            agent_name=record["agent_name"],
+        )
+    return AgentMessage(
+        content=record["content"],
+        token_count=record["token_count"],
+        agent_name=record["agent_name"],
+    )
+
+
+def _copy_response(message: Message) -> Message:
+    """
+    Return a new message equal to a model response, sharing no mutable state.
+    """
+    return _load_response(_dump_response(message))
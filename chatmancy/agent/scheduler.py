@@ -0,0 +1,300 @@
+import asyncio
+from dataclasses import dataclass
+from enum import IntEnum
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from openai import APIConnectionError
+from tenacity import (
+    AsyncRetrying,
+    Retrying,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+
+T = TypeVar("T")
+
+# Longest single sleep while waiting for budget, so waiters notice changes.
+# Threads are also woken when a waiter leaves the queue; tasks poll more often.
+_MAX_POLL = 1.0
+_ASYNC_POLL = 0.05
+
+
+class Priority(IntEnum):
+    """
+    Scheduling priority of a model call. Lower values are served first.
+    """
+
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+@dataclass
+class RateLimits:
+    """
+    Per-minute budgets for one model. None means unlimited.
+
+    Attributes:
+        rpm (int, optional): Requests per minute.
+        tpm (int, optional): Prompt tokens per minute.
+    """
+
+    rpm: Optional[int] = None
+    tpm: Optional[int] = None
+
+
+class _TokenBucket:
+    """
+    A bucket holding up to capacity units, refilled evenly over a minute.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.level = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(
+            self.capacity, self.level + (now - self.updated) * self.capacity / 60
+        )
+        self.updated = now
+
+    def wait_time(self, amount: int, now: float) -> float:
+        """Seconds until amount units are available."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60 / self.capacity
+
+    def take(self, amount: int) -> None:
+        self.level -= min(amount, self.capacity)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Whether a failed call should be retried: connection errors and timeouts,
+    request timeouts (408), conflicts (409), rate limits (429) and server
+    errors (5xx), as reported by the error's status_code. These are the
+    errors the OpenAI SDK retries itself.
+    """
+    if isinstance(error, APIConnectionError):
+        return True
+    status = getattr(error, "status_code", None)
+    return isinstance(status, int) and (status in (408, 409, 429) or status >= 500)
+
+
+class RequestScheduler:
+    """
+    Coordinates model calls across every agent in a process.
+
+    Calls are admitted within per-model requests-per-minute and
+    tokens-per-minute budgets, using the caller's own prompt token estimate.
+    While calls wait for budget, interactive calls are admitted before
+    background ones, such as context manager calls. Calls that fail with a
+    connection error, rate limit or server error are retried with jittered
+    exponential backoff (see is_retryable), and each attempt uses budget. GPT
+    handlers build their clients with the OpenAI SDK's own retries off, so
+    every attempt passes through here.
+
+    Args:
+        limits (Dict[str, RateLimits], optional): Budgets by model name.
+        default_limits (RateLimits, optional): Budgets for models without their
+            own. Defaults to unlimited.
+        max_attempts (int): Attempts per call, including the first. Defaults to 5.
+        max_backoff (float): The longest wait between attempts in seconds.
+            Defaults to 30.
+    """
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, RateLimits]] = None,
+        default_limits: Optional[RateLimits] = None,
+        max_attempts: int = 5,
+        max_backoff: float = 30.0,
+    ) -> None:
+        self.limits: Dict[str, RateLimits] = dict(limits or {})
+        self.default_limits = default_limits or RateLimits()
+        self.max_attempts = max_attempts
+        self.max_backoff = max_backoff
+        self.retries = 0
+        self._buckets: Dict[Tuple[str, str], _TokenBucket] = {}
+        self._waiting: Dict[str, List[Tuple[int, int]]] = {}
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self.logger = logging.getLogger("chatmancy.RequestScheduler")
+
+    def set_limits(
+        self, model: str, rpm: Optional[int] = None, tpm: Optional[int] = None
+    ) -> None:
+        """
+        Set the budgets of a model. Options left unset are unlimited.
+
+        Args:
+            model (str): The model name.
+            rpm (int, optional): Requests per minute.
+            tpm (int, optional): Prompt tokens per minute.
+        """
+        with self._condition:
+            self.limits[model] = RateLimits(rpm=rpm, tpm=tpm)
+            self._buckets = {k: v for k, v in self._buckets.items() if k[0] != model}
+            self._condition.notify_all()
+
+    # Admission
+
+    def _bucket(self, model: str, kind: str, capacity: Optional[int]):
+        if capacity is None:
+            return None
+        bucket = self._buckets.get((model, kind))
+        if bucket is None:
+            bucket = self._buckets[(model, kind)] = _TokenBucket(capacity)
+        return bucket
+
+    def _enqueue(self, model: str, priority: Priority) -> Tuple[int, int]:
+        ticket = (int(priority), next(self._counter))
+        with self._condition:
+            heapq.heappush(self._waiting.setdefault(model, []), ticket)
+        return ticket
+
+    def _dequeue(self, model: str, ticket: Tuple[int, int]) -> None:
+        with self._condition:
+            waiting = self._waiting[model]
+            waiting.remove(ticket)
+            heapq.heapify(waiting)
+            self._condition.notify_all()
+
+    def _try_acquire(self, model: str, tokens: int, ticket: Tuple[int, int]) -> float:
+        """
+        Take budget for a call if it is next in line and the budget allows.
+
+        Returns:
+            float: 0 if the budget was taken, otherwise seconds to wait.
+        """
+        with self._condition:
+            if self._waiting[model][0] != ticket:
+                return _MAX_POLL
+            limits = self.limits.get(model, self.default_limits)
+            now = time.monotonic()
+            buckets = [
+                (bucket, amount)
+                for bucket, amount in (
+                    (self._bucket(model, "requests", limits.rpm), 1),
+                    (self._bucket(model, "tokens", limits.tpm), tokens),
+                )
+                if bucket is not None
+            ]
+            wait = max((b.wait_time(a, now) for b, a in buckets), default=0.0)
+            if wait > 0:
+                return wait
+            for bucket, amount in buckets:
+                bucket.take(amount)
+            return 0.0
+
+    def acquire(
+        self, model: str, tokens: int, priority: Priority = Priority.INTERACTIVE
+    ) -> None:
+        """
+        Block until a call to model with this many prompt tokens is admitted.
+        """
+        ticket = self._enqueue(model, priority)
+        try:
+            with self._condition:
+                while True:
+                    wait = self._try_acquire(model, tokens, ticket)
+                    if wait == 0:
+                        return
+                    self._condition.wait(min(wait, _MAX_POLL))
+        finally:
+            self._dequeue(model, ticket)
+
+    async def aacquire(
+        self, model: str, tokens: int, priority: Priority = Priority.INTERACTIVE
+    ) -> None:
+        """
+        Async version of acquire.
+        """
+        ticket = self._enqueue(model, priority)
+        try:
+            while True:
+                wait = self._try_acquire(model, tokens, ticket)
+                if wait == 0:
+                    return
+                await asyncio.sleep(min(wait, _ASYNC_POLL))
+        finally:
+            self._dequeue(model, ticket)
+
+    # Calls
+
+    def _retry_options(self) -> Dict:
+        return {
+            "retry": retry_if_exception(is_retryable),
+            "wait": wait_random_exponential(multiplier=0.5, max=self.max_backoff),
+            "stop": stop_after_attempt(self.max_attempts),
+            "before_sleep": self._log_retry,
+            "reraise": True,
+        }
+
+    def _log_retry(self, retry_state) -> None:
+        self.retries += 1
+        self.logger.warning(
+            f"Model call failed with {retry_state.outcome.exception()!r}, "
+            f"retrying (attempt {retry_state.attempt_number})"
+        )
+
+    def submit(
+        self,
+        model: str,
+        tokens: int,
+        call: Callable[[], T],
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> T:
+        """
+        Run a model call within the model's budgets, retrying connection, rate
+        limit and server errors.
+
+        Args:
+            model (str): The model name.
+            tokens (int): The estimated prompt tokens of the call.
+            call (Callable): Makes the call.
+            priority (Priority): The call's priority. Defaults to INTERACTIVE.
+
+        Returns:
+            The result of the call.
+        """
+        for attempt in Retrying(**self._retry_options()):
+            with attempt:
+                self.acquire(model, tokens, priority)
+                return call()
+
+    async def asubmit(
+        self,
+        model: str,
+        tokens: int,
+        call: Callable[[], Awaitable[T]],
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> T:
+        """
+        Async version of submit. call returns an awaitable.
+        """
+        async for attempt in AsyncRetrying(**self._retry_options()):
+            with attempt:
+                await self.aacquire(model, tokens, priority)
+                return await call()
+
+
+request_scheduler = RequestScheduler()
+
+
+def configure_rate_limits(
+    model: str, rpm: Optional[int] = None, tpm: Optional[int] = None
+) -> None:
+    """
+    Set the budgets of a model on the shared scheduler.
+    See RequestScheduler.set_limits.
+    """
+    request_scheduler.set_limits(model, rpm=rpm, tpm=tpm)
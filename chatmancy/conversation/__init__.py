@@ -1,4 +1,31 @@
-from .context_manager import ContextManager, AgentContextManager, ContextItem
-from .conversation import Conversation
+from .context_manager import (
+    ContextManager,
+    AgentContextManager,
+    ContextItem,
+    MultiItemAgentContextManager,
+)
+from .conversation import Conversation, ToolRound, configure_context_executor
+from .gating import (
+    AnyGate,
+    ClassifierGate,
+    ContextGate,
+    GateInfo,
+    KeywordGate,
+    LengthGate,
+)
 
-__all__ = [ContextManager, AgentContextManager, ContextItem, Conversation]
+__all__ = [
+    ContextManager,
+    AgentContextManager,
+    ContextItem,
+    MultiItemAgentContextManager,
+    Conversation,
+    ToolRound,
+    configure_context_executor,
+    ContextGate,
+    KeywordGate,
+    LengthGate,
+    ClassifierGate,
+    AnyGate,
+    GateInfo,
+]
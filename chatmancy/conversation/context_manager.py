@@ -1,26 +1,57 @@
 from abc import ABC, abstractmethod
+import asyncio
+from itertools import islice
 import logging
-from typing import List, Dict, Optional
+import threading
+from typing import Any, List, Dict, Optional
+import weakref
 
 from pydantic import BaseModel
 
 from ..agent import GPTAgent
-from ..message import UserMessage, MessageQueue
+from ..agent.scheduler import Priority
+from ..message import Message, UserMessage, MessageQueue
 from ..function import FunctionItem, FunctionRequestMessage
 from ..logging import trace
+from .gating import ContextGate, GateInfo
 
 
 class ContextManager(ABC):
     """
     A class that manages the context of a conversation.
 
+    Subclasses implement _get_context_updates, and may also implement
+    _aget_context_updates to use async IO. By default the async path runs
+    _get_context_updates in a worker thread.
+
+    An optional ContextGate decides, from the messages added since the last
+    update, whether the manager needs to run at all. When it does not, the
+    previous updates are returned again. Gating state is kept per session, so
+    one manager can be shared by many conversations, each passing itself as
+    the session, and called from many threads.
+
     Attributes:
         name (str): The name of the context manager.
+        gate (ContextGate, optional): Skips updates that are not needed.
     """
 
-    def __init__(self, name: str, keys: Optional[List[str]] = None) -> None:
+    def __init__(
+        self,
+        name: str,
+        keys: Optional[List[str]] = None,
+        gate: Optional[ContextGate] = None,
+    ) -> None:
         self.name: str = name
         self._static_keys = keys
+        self.gate = gate
+
+        # Gating state, per session. Sessions are held weakly so that state is
+        # dropped with the conversation it belongs to.
+        self._lock = threading.Lock()
+        self._default_session = _GateState()
+        self._sessions = weakref.WeakKeyDictionary()
+        self._hits = 0
+        self._skips = 0
 
         self.logger = logging.getLogger(f"chatmancy.ContextManager.{name}")
 
@@ -40,18 +71,117 @@ class ContextManager(ABC):
         """
         pass  # pragma: no cover
 
-    def get_context_updates(self, history: MessageQueue, current_context: Dict) -> Dict:
+    async def _aget_context_updates(
+        self, history: MessageQueue, current_context: Dict
+    ) -> Dict:
+        """
+        Async version of _get_context_updates.
+        """
+        return await asyncio.to_thread(
+            self._get_context_updates, history, current_context
+        )
+
+    def get_context_updates(
+        self, history: MessageQueue, current_context: Dict, session: Any = None
+    ) -> Dict:
         """
         Analyzes the message history and updates the current context.
 
         Args:
             history (MessageQueue): The list of past messages.
             current_context (Dict): The current context.
+            session (Any, optional): The conversation the history belongs to,
+                which keys the gating state. Must be weak-referenceable.
+                Defaults to one session shared by all callers.
 
         Returns:
             Dict: Updated context.
         """
+        state = self._session_state(session)
+        last_updates = self._skip_update(state, history, current_context)
+        if last_updates is not None:
+            return last_updates
         updates = self._get_context_updates(history, current_context)
+        return self._record_updates(state, history, self._filter_updates(updates))
+
+    async def aget_context_updates(
+        self, history: MessageQueue, current_context: Dict, session: Any = None
+    ) -> Dict:
+        """
+        Async version of get_context_updates.
+
+        Args:
+            history (MessageQueue): The list of past messages.
+            current_context (Dict): The current context.
+            session (Any, optional): The conversation the history belongs to.
+
+        Returns:
+            Dict: Updated context.
+        """
+        state = self._session_state(session)
+        last_updates = self._skip_update(state, history, current_context)
+        if last_updates is not None:
+            return last_updates
+        updates = await self._aget_context_updates(history, current_context)
+        return self._record_updates(state, history, self._filter_updates(updates))
+
+    def _session_state(self, session: Any) -> "_GateState":
+        if session is None:
+            return self._default_session
+        with self._lock:
+            state = self._sessions.get(session)
+            if state is None:
+                state = self._sessions[session] = _GateState()
+            return state
+
+    def _skip_update(
+        self, state: "_GateState", history: MessageQueue, current_context: Dict
+    ) -> Optional[Dict]:
+        """
+        Ask the gate whether the messages added to a session since its last
+        update need a new one. Managers without a gate, or sessions without a
+        previous update, always run.
+
+        Returns:
+            Optional[Dict]: A copy of the previous updates if the update is
+                skipped, otherwise None.
+        """
+        if self.gate is None:
+            return None
+        with self._lock:
+            last_updates, seen = state.last_updates, state.seen_messages
+        if last_updates is None:
+            return None
+
+        # A history shorter than the one last seen was replaced, so it is all new
+        seen = seen if seen <= len(history) else 0
+        new_messages = list(islice(history, seen, None))
+        if self.gate.should_update(new_messages, current_context):
+            return None
+
+        with self._lock:
+            self._skips += 1
+        self.logger.debug(f"Skipping context update for {self.name}")
+        return dict(last_updates)
+
+    def _record_updates(
+        self, state: "_GateState", history: MessageQueue, updates: Dict
+    ) -> Dict:
+        with self._lock:
+            self._hits += 1
+            state.last_updates = updates
+            state.seen_messages = len(history)
+        return updates
+
+    def gate_info(self) -> GateInfo:
+        """
+        Report how many updates ran (hits) and how many reused the previous
+        result (skips).
+        """
+        with self._lock:
+            return GateInfo(self._hits, self._skips)
+
+    def _filter_updates(self, updates: Optional[Dict]) -> Dict:
         if not updates:
             return {}
 
@@ -75,18 +205,28 @@ class ContextManager(ABC):
             return []
 
 
+class _GateState:
+    """The updates last returned to one session, and how much history it had."""
+
+    __slots__ = ("last_updates", "seen_messages")
+
+    def __init__(self) -> None:
+        self.last_updates: Optional[Dict] = None
+        self.seen_messages = 0
+
+
 class ContextItem(BaseModel):
     name: str
     description: str
     type: str = "string"
     valid_values: Optional[List[str]] = None
 
-    def to_function_item(self) -> FunctionItem:
+    def to_function_parameter(self) -> Dict:
         """
-        Converts the ContextItem to a dictionary fitting JSON schema object specs.
+        Converts the ContextItem to a function parameter specification.
 
         Returns:
-            Dict: A dictionary representing the JSON schema object.
+            Dict: The type, description and enum of the parameter.
         """
         param = {
             "type": self.type,
@@ -94,40 +234,71 @@ class ContextItem(BaseModel):
         }
         if self.valid_values is not None:
             param["enum"] = self.valid_values
+        return param
 
-        def noop(x):
-            return x  # pragma: no cover
+    def to_function_item(self) -> FunctionItem:
+        """
+        Converts the ContextItem to a dictionary fitting JSON schema object specs.
 
+        Returns:
+            Dict: A dictionary representing the JSON schema object.
+        """
         return FunctionItem(
-            method=noop,
+            method=_noop,
             name=f"update_{self.name}_context",
             description=f"Update the current context for {self.name}",
-            params={self.name: param},
+            params={self.name: self.to_function_parameter()},
             required=[],
             auto_call=False,
         )
 
+    @staticmethod
+    def combine(context_items: List["ContextItem"]) -> FunctionItem:
+        """
+        Combine ContextItems into a single function with one optional parameter
+        per item, so all of them can be extracted in one call.
 
-class AgentContextManager(ContextManager):
-    """
-    A context manager that determines context using an LLM agent
+        Args:
+            context_items (List[ContextItem]): The items to combine.
 
-    Attributes:
-        name (str): The name of the context.
-        context_items (List[ContextItem]): A list of context items.
-        model_handler (ModelHandler): A model handler for the context.
+        Returns:
+            FunctionItem: The combined update_context function.
+        """
+        return FunctionItem(
+            method=_noop,
+            name="update_context",
+            description=(
+                "Update the current context. Only include the items that the "
+                "conversation is currently about."
+            ),
+            params={item.name: item.to_function_parameter() for item in context_items},
+            required=[],
+            auto_call=False,
+        )
 
-    Methods:
-        get_context_updates(history: MessageQueue) -> Dict:
-            Analyzes the message history and updates the current context.
+
+def _noop(**kwargs):
+    return kwargs  # pragma: no cover
+
+
+class _AgentBackedContextManager(ContextManager):
+    """
+    Base class for context managers that determine context by forcing an LLM
+    agent to call a context update function.
     """
 
     def __init__(
-        self, name: str, context_item: (ContextItem | Dict), model: str = "gpt-4"
+        self,
+        name: str,
+        keys: List[str],
+        function_item: FunctionItem,
+        model: str = "gpt-4",
+        async_client: bool = False,
+        openai_client=None,
+        gate: Optional[ContextGate] = None,
+        scheduler=None,
     ) -> None:
-        # Validate context items and create function items
-        self.context_item = ContextItem.model_validate(context_item)
-        self.function_item = self.context_item.to_function_item()
+        self.function_item = function_item
 
         # Agent
         self._agent = GPTAgent(
@@ -138,10 +309,15 @@ class AgentContextManager(ContextManager):
                 "You are a context manager. "
                 "You will analyze conversations to determine the current context."
             ),
+            async_client=async_client,
+            openai_client=openai_client,
+            # Context updates wait behind the main agent's calls
+            scheduler=scheduler,
+            priority=Priority.BACKGROUND,
         )
 
         # Super
-        super().__init__(name, keys=[self.context_item.name])
+        super().__init__(name, keys=keys, gate=gate)
 
     @trace(name="AgentContextManager.get_context_updates")
     def _get_context_updates(
@@ -152,16 +328,33 @@ class AgentContextManager(ContextManager):
 
         * history: The list of past messages.
         """
-        input_message = UserMessage(
-            content="At the current point, which things are we talking about? Use "
-            "the update_context functions to tell me.",
-        )
         response = self._agent.call_function(
             history=history,
             function_item=self.function_item,
-            input_message=input_message,
+            input_message=self._request_message(),
             context={},
         )
+        return self._parse_response(response)
+
+    @trace(name="AgentContextManager.aget_context_updates")
+    async def _aget_context_updates(
+        self, history: MessageQueue, current_context: Dict
+    ) -> Dict:
+        response = await self._agent.acall_function(
+            history=history,
+            function_item=self.function_item,
+            input_message=self._request_message(),
+            context={},
+        )
+        return self._parse_response(response)
+
+    def _request_message(self) -> UserMessage:
+        return UserMessage(
+            content="At the current point, which things are we talking about? Use "
+            "the update_context functions to tell me.",
+        )
+
+    def _parse_response(self, response: Message) -> Dict:
         self.logger.debug(f"Response from agent: {response}")
 
         if not isinstance(response, FunctionRequestMessage):
@@ -172,6 +365,85 @@ class AgentContextManager(ContextManager):
         if not args:
             return {}
 
-        return {
-            self.context_item.name: args[self.context_item.name],
-        }
+        return {k: args[k] for k in self.registered_keys if k in args}
+
+
+class AgentContextManager(_AgentBackedContextManager):
+    """
+    A context manager that determines context using an LLM agent
+
+    Attributes:
+        name (str): The name of the context.
+        context_item (ContextItem): The context item.
+        function_item (FunctionItem): The function the agent is forced to call.
+
+    Methods:
+        get_context_updates(history: MessageQueue) -> Dict:
+            Analyzes the message history and updates the current context.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        context_item: (ContextItem | Dict),
+        model: str = "gpt-4",
+        async_client: bool = False,
+        openai_client=None,
+        gate: Optional[ContextGate] = None,
+        scheduler=None,
+    ) -> None:
+        # Validate context items and create function items
+        self.context_item = ContextItem.model_validate(context_item)
+        super().__init__(
+            name,
+            keys=[self.context_item.name],
+            function_item=self.context_item.to_function_item(),
+            model=model,
+            async_client=async_client,
+            openai_client=openai_client,
+            gate=gate,
+            scheduler=scheduler,
+        )
+
+
+class MultiItemAgentContextManager(_AgentBackedContextManager):
+    """
+    A context manager that determines many context items with a single LLM call.
+
+    The items are combined into one update_context function with an optional
+    parameter per item (see ContextItem.combine), so tracking N items costs one
+    forced function call instead of N.
+
+    Attributes:
+        name (str): The name of the context manager.
+        context_items (List[ContextItem]): The context items.
+        function_item (FunctionItem): The combined function.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        context_items: List[(ContextItem | Dict)],
+        model: str = "gpt-4",
+        async_client: bool = False,
+        openai_client=None,
+        gate: Optional[ContextGate] = None,
+        scheduler=None,
+    ) -> None:
+        self.context_items = [ContextItem.model_validate(ci) for ci in context_items]
+        if not self.context_items:
+            raise ValueError("context_items must not be empty")
+        keys = [ci.name for ci in self.context_items]
+        if len(set(keys)) != len(keys):
+            raise ValueError(f"Duplicate context item names in {keys}")
+
+        super().__init__(
+            name,
+            keys=keys,
+            function_item=ContextItem.combine(self.context_items),
+            model=model,
+            async_client=async_client,
+            openai_client=openai_client,
+            gate=gate,
+            scheduler=scheduler,
+        )
@@ -1,9 +1,20 @@
+import asyncio
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
 import logging
-from typing import Dict, List
+import threading
+import time
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
 
 from chatmancy.function.function_message import _FunctionRequest
 
-from ..message import MessageQueue, Message, UserMessage, AgentMessage
+from ..message import (
+    MessageQueue,
+    PersistentMessageQueue,
+    Message,
+    UserMessage,
+    AgentMessage,
+)
 from ..agent import Agent
 from ..function import (
     FunctionItemGenerator,
@@ -15,8 +26,50 @@ from .context_manager import ContextManager
 from ..logging import trace
 
 
+CONTEXT_MODES = ("blocking", "speculative", "deferred")
+
+ToolRound = namedtuple(
+    "ToolRound", ["functions", "function_time", "agent_time", "tokens"]
+)
+
+DEFAULT_CONTEXT_WORKERS = 32
+
+# Runs context managers for every conversation in the process
+_context_executor: Optional[ThreadPoolExecutor] = None
+_context_workers = DEFAULT_CONTEXT_WORKERS
+_context_lock = threading.Lock()
+
+
+def _get_context_executor() -> ThreadPoolExecutor:
+    global _context_executor
+    with _context_lock:
+        if _context_executor is None:
+            _context_executor = ThreadPoolExecutor(
+                max_workers=_context_workers, thread_name_prefix="chatmancy-context"
+            )
+        return _context_executor
+
+
+def configure_context_executor(max_workers: int) -> None:
+    """
+    Set the number of threads shared by all conversations for context updates.
+    The pool is replaced; updates already running finish normally.
+
+    Args:
+        max_workers (int): Threads for context updates. Defaults to 32.
+    """
+    global _context_executor, _context_workers
+    if not isinstance(max_workers, int) or max_workers < 1:
+        raise ValueError(f"max_workers must be a positive integer, not {max_workers}")
+    with _context_lock:
+        _context_workers = max_workers
+        if _context_executor is not None:
+            _context_executor.shutdown(wait=False)
+            _context_executor = None
+
+
 class Conversation:
-    user_message_history: MessageQueue
+    user_message_history: (MessageQueue | PersistentMessageQueue)
     _context: Dict[str, str]
     main_agent: Agent
     context_managers: List[ContextManager]
@@ -30,9 +83,81 @@ class Conversation:
         history=None,
         name: str = None,
         context: Dict[str, str] = None,
+        context_timeout: Optional[float] = None,
+        context_mode: str = "blocking",
+        regenerate_on_context_change: bool = True,
+        max_tool_rounds: int = 1,
+        max_tool_tokens: Optional[int] = None,
+        max_tool_time: Optional[float] = None,
     ) -> None:
+        """
+        Args:
+            main_agent (Agent): The agent that responds to messages.
+            opening_prompt (str): The first agent message of a new history.
+            context_managers (List[ContextManager], optional): Managers that update
+                the context before each message. They run concurrently. A manager
+                may be shared by conversations; its gating state is kept per
+                conversation.
+            function_generators (List[FunctionItemGenerator], optional): Generators
+                of the functions available to the agent.
+            history (MessageQueue | PersistentMessageQueue, optional): An existing
+                history to hot-load. Defaults to a MessageQueue holding the
+                opening prompt. Pass a PersistentMessageQueue to make the
+                per-turn history copies O(1) snapshots.
+            name (str, optional): The name of the conversation.
+            context (Dict[str, str], optional): An existing context to hot-load.
+            context_timeout (float, optional): Seconds to wait for the context
+                managers on each turn. Managers that time out or fail are skipped
+                for that turn. Defaults to no timeout.
+            context_mode (str): When context managers run.
+                "blocking" (default) updates the context before the agent is
+                called. "speculative" calls the agent with the current context
+                while the managers run, and regenerates the response if the
+                context changed. "deferred" updates the context in the
+                background after each response, for the next turn. In every
+                mode, context managers run on a bounded pool of threads shared
+                by all conversations; see configure_context_executor.
+            regenerate_on_context_change (bool): In speculative mode, whether a
+                response is regenerated when the context changed. If False the
+                response is kept and the changes are recorded in
+                last_context_changes. Defaults to True.
+            max_tool_rounds (int): Rounds of function calls run for one message.
+                While rounds remain, the agent may request more functions after
+                seeing results. The last round's results are answered without
+                functions. Defaults to 1.
+            max_tool_tokens (int, optional): Ends the function loop early, once
+                its function and agent responses reach this many tokens.
+            max_tool_time (float, optional): Ends the function loop early, once
+                it has run for this many seconds.
+        """
         # Validate types
         self._validate(main_agent, opening_prompt, context_managers, history, context)
+        if context_timeout is not None and not isinstance(
+            context_timeout, (int, float)
+        ):
+            raise TypeError(
+                f"context_timeout must be a number, not {type(context_timeout)}"
+            )
+        self.context_timeout = context_timeout
+        if context_mode not in CONTEXT_MODES:
+            raise ValueError(
+                f"context_mode must be one of {CONTEXT_MODES}, not {context_mode}"
+            )
+        self.context_mode = context_mode
+        self.regenerate_on_context_change = regenerate_on_context_change
+        if not isinstance(max_tool_rounds, int) or max_tool_rounds < 1:
+            raise ValueError(
+                f"max_tool_rounds must be a positive integer, not {max_tool_rounds}"
+            )
+        self.max_tool_rounds = max_tool_rounds
+        self.max_tool_tokens = max_tool_tokens
+        self.max_tool_time = max_tool_time
+        self.last_tool_rounds: List[ToolRound] = []
+        self.last_context_changes: Dict[str, str] = {}
+        self._pending_context = None
+        # The latest call of each context manager, so a call that is still
+        # running is not started again
+        self._context_calls: Dict[ContextManager, Future] = {}
 
         # Set attributes for hot-loading
         self.user_message_history = (
@@ -77,9 +202,10 @@ class Conversation:
                         f"Context manager {cm} is not an instance of ContextManager"
                     )
         if history is not None:
-            if not isinstance(history, MessageQueue):
+            if not isinstance(history, (MessageQueue, PersistentMessageQueue)):
                 raise TypeError(
-                    f"history must be an instance of MessageQueue, not {type(history)}"
+                    "history must be an instance of MessageQueue or "
+                    f"PersistentMessageQueue, not {type(history)}"
                 )
         if context is not None:
             if not isinstance(context, dict):
@@ -92,6 +218,15 @@ class Conversation:
         Send message to the specified agent, and record message and response in
         user message history.
         """
+        agent_response, functions = self._request_agent_response(agent, message)
+        return self._handle_agent_response(agent, message, agent_response, functions)
+
+    def _request_agent_response(
+        self, agent: Agent, message: Message
+    ) -> Tuple[Message, List[FunctionItem]]:
+        """
+        Get the agent's response with the current context, without recording it.
+        """
         self.logger.info(f"Current context is {self.context}")
 
         # Create functions
@@ -99,39 +234,250 @@ class Conversation:
             message, self.user_message_history.copy(), self.context.copy()
         )
 
-        # Get response and update history
+        # Get response
         agent_response: Message = agent.get_response_message(
             message,
             self.user_message_history.copy(),
             context=self.context.copy(),
             functions=functions,
         )
+        return agent_response, functions
 
+    def _handle_agent_response(
+        self,
+        agent: Agent,
+        message: Message,
+        agent_response: Message,
+        functions: List[FunctionItem],
+    ) -> Message:
+        """
+        Record the message and response in history and run requested functions.
+        """
         # Update history
         self.user_message_history.extend([message, agent_response])
+        self.last_tool_rounds = []
 
-        # Check function requests
-        if isinstance(agent_response, FunctionRequestMessage):
+        # Run requested functions until the agent answers
+        loop_start = time.monotonic()
+        while isinstance(agent_response, FunctionRequestMessage):
+            if self.last_tool_rounds:
+                self.user_message_history.append(agent_response)
+
+            round_start = time.perf_counter()
             function_response = self._handle_function_request_message(
-                agent_response, functions
+                agent_response, functions, agent
             )
 
             # Pass along unapproved requests
             if isinstance(function_response, FunctionRequestMessage):
                 return function_response
-            else:
-                return self._send_agent_responses(agent, function_response)
+
+            function_time = time.perf_counter() - round_start
+            final = self._is_final_tool_round(loop_start, function_response)
+            agent_response = self._send_agent_responses(
+                agent, function_response, None if final else functions
+            )
+            self._record_tool_round(
+                function_response, agent_response, round_start, function_time
+            )
+
+        return agent_response
+
+    async def _amessage_agent(self, agent: Agent, message: Message) -> Message:
+        """
+        Async version of _message_agent.
+        """
+        agent_response, functions = await self._arequest_agent_response(
+            agent, message
+        )
+        return await self._ahandle_agent_response(
+            agent, message, agent_response, functions
+        )
+
+    async def _arequest_agent_response(
+        self, agent: Agent, message: Message
+    ) -> Tuple[Message, List[FunctionItem]]:
+        """
+        Async version of _request_agent_response.
+        """
+        self.logger.info(f"Current context is {self.context}")
+
+        # Create functions
+        functions = await self._acreate_functions(
+            message, self.user_message_history.copy(), self.context.copy()
+        )
+
+        # Get response
+        agent_response: Message = await agent.aget_response_message(
+            message,
+            self.user_message_history.copy(),
+            context=self.context.copy(),
+            functions=functions,
+        )
+        return agent_response, functions
+
+    async def _ahandle_agent_response(
+        self,
+        agent: Agent,
+        message: Message,
+        agent_response: Message,
+        functions: List[FunctionItem],
+    ) -> Message:
+        """
+        Async version of _handle_agent_response.
+        """
+        # Update history
+        self.user_message_history.extend([message, agent_response])
+        self.last_tool_rounds = []
+
+        # Run requested functions until the agent answers
+        loop_start = time.monotonic()
+        while isinstance(agent_response, FunctionRequestMessage):
+            if self.last_tool_rounds:
+                self.user_message_history.append(agent_response)
+
+            round_start = time.perf_counter()
+            function_response = await self._ahandle_function_request_message(
+                agent_response, functions, agent
+            )
+
+            # Pass along unapproved requests
+            if isinstance(function_response, FunctionRequestMessage):
+                return function_response
+
+            function_time = time.perf_counter() - round_start
+            final = self._is_final_tool_round(loop_start, function_response)
+            agent_response = await self._asend_agent_responses(
+                agent, function_response, None if final else functions
+            )
+            self._record_tool_round(
+                function_response, agent_response, round_start, function_time
+            )
 
         return agent_response
 
-    def _send_agent_responses(self, agent: Agent, responses: List[Message]) -> Message:
+    def _is_final_tool_round(
+        self, loop_start: float, function_responses: List[Message]
+    ) -> bool:
+        """
+        Whether the agent must answer this round's function results without
+        requesting more, because a tool loop budget is used up.
+        """
+        if len(self.last_tool_rounds) + 1 >= self.max_tool_rounds:
+            return True
+        if (
+            self.max_tool_time is not None
+            and time.monotonic() - loop_start >= self.max_tool_time
+        ):
+            self.logger.info("Function loop time budget reached")
+            return True
+        if self.max_tool_tokens is not None:
+            tokens = sum(r.tokens for r in self.last_tool_rounds) + sum(
+                m.token_count for m in function_responses
+            )
+            if tokens >= self.max_tool_tokens:
+                self.logger.info("Function loop token budget reached")
+                return True
+        return False
+
+    def _record_tool_round(
+        self,
+        function_responses: List[Message],
+        agent_response: Message,
+        round_start: float,
+        function_time: float,
+    ) -> None:
+        """
+        Record the functions, timings and tokens of a tool loop round.
+        """
+        tool_round = ToolRound(
+            functions=[m.func_name for m in function_responses],
+            function_time=function_time,
+            agent_time=time.perf_counter() - round_start - function_time,
+            tokens=sum(m.token_count for m in function_responses)
+            + agent_response.token_count,
+        )
+        self.logger.debug(f"Function round {len(self.last_tool_rounds)}: {tool_round}")
+        self.last_tool_rounds.append(tool_round)
+
+    def _message_agent_speculative(self, agent: Agent, message: Message) -> Message:
+        """
+        Request the agent's response with the current context while the context
+        managers run, then regenerate it if the context changed. Functions only
+        run once the final response is known.
+        """
+        pending = self._submit_context_updates([message])
+        agent_response, functions = self._request_agent_response(agent, message)
+        if self._apply_speculative_updates(self._collect_context_updates(*pending)):
+            agent_response, functions = self._request_agent_response(agent, message)
+        return self._handle_agent_response(agent, message, agent_response, functions)
+
+    async def _amessage_agent_speculative(
+        self, agent: Agent, message: Message
+    ) -> Message:
+        """
+        Async version of _message_agent_speculative.
+        """
+        updates, (agent_response, functions) = await asyncio.gather(
+            self._acompute_context_updates([message]),
+            self._arequest_agent_response(agent, message),
+        )
+        if self._apply_speculative_updates(updates):
+            agent_response, functions = await self._arequest_agent_response(
+                agent, message
+            )
+        return await self._ahandle_agent_response(
+            agent, message, agent_response, functions
+        )
+
+    def _apply_speculative_updates(self, updates: Dict) -> bool:
+        """
+        Apply context updates computed alongside a speculative response.
+
+        Returns:
+            bool: Whether the response should be regenerated.
+        """
+        changes = self._apply_context_updates(updates)
+        if not changes:
+            return False
+        if self.regenerate_on_context_change:
+            self.logger.info(f"Context changed for {list(changes)}, regenerating")
+            return True
+        self.logger.info(f"Context changed for {list(changes)}, keeping response")
+        return False
+
+    def _send_agent_responses(
+        self,
+        agent: Agent,
+        responses: List[Message],
+        functions: List[FunctionItem] = None,
+    ) -> Message:
         """
         Sends a list of messages to the agent and updates the history.
+        The agent may call the given functions in its response.
         """
         self.logger.info(f"Sending {len(responses)} response messages to agent")
         self.logger.debug(f"Messages: {responses}")
         self.user_message_history.extend(responses)
-        return agent.give_function_response(self.user_message_history.copy())
+        return agent.give_function_response(
+            self.user_message_history.copy(), functions=functions
+        )
+
+    async def _asend_agent_responses(
+        self,
+        agent: Agent,
+        responses: List[Message],
+        functions: List[FunctionItem] = None,
+    ) -> Message:
+        """
+        Async version of _send_agent_responses.
+        """
+        self.logger.info(f"Sending {len(responses)} response messages to agent")
+        self.logger.debug(f"Messages: {responses}")
+        self.user_message_history.extend(responses)
+        return await agent.agive_function_response(
+            self.user_message_history.copy(), functions=functions
+        )
 
     @property
     def context(self):
@@ -148,27 +494,452 @@ class Conversation:
         Returns:
             Message: The response message.
         """
-        # Validate message
-        if isinstance(message, str):
-            message = UserMessage(content=message)
-        elif not isinstance(message, Message):
-            raise TypeError(f"message must be a string or Message, not {type(message)}")
+        message = self._validate_message(message)
+        self.last_context_changes = {}
+        self._apply_deferred_context()
+
+        if self.context_mode == "speculative":
+            return self._message_agent_speculative(self.main_agent, message)
 
         # Update context
-        self._update_context([message])
+        if self.context_mode == "blocking":
+            self._update_context([message])
 
         # Send message to agent
-        return self._message_agent(self.main_agent, message)
+        response = self._message_agent(self.main_agent, message)
 
-    def _update_context(self, extra_messages: List[Message] = None):
-        if extra_messages is None:
-            extra_messages = []
+        if self.context_mode == "deferred":
+            self._start_deferred_context()
+        return response
+
+    @trace(name="Conversation.aask_question")
+    async def asend_message(self, message: (Message | str)) -> Message:
+        """
+        Async version of send_message. Context managers, function generators and
+        the agent are awaited, so one event loop can drive many conversations.
+
+        Args:
+            message (Message): The message to send.
+
+        Returns:
+            Message: The response message.
+        """
+        message = self._validate_message(message)
+        self.last_context_changes = {}
+        await self._aapply_deferred_context()
+
+        if self.context_mode == "speculative":
+            return await self._amessage_agent_speculative(self.main_agent, message)
+
+        # Update context
+        if self.context_mode == "blocking":
+            await self._aupdate_context([message])
+
+        # Send message to agent
+        response = await self._amessage_agent(self.main_agent, message)
+
+        if self.context_mode == "deferred":
+            self._astart_deferred_context()
+        return response
+
+    def send_message_stream(
+        self, message: (Message | str)
+    ) -> Iterator[(str | Message)]:
+        """
+        Sends a message to the conversation and streams the response.
+
+        Args:
+            message (Message): The message to send.
+
+        Yields:
+            str | Message: Content deltas as they arrive, then the final response
+                message, as returned by send_message.
+        """
+        message = self._validate_message(message)
+        self.last_context_changes = {}
+        self._apply_deferred_context()
+
+        # Speculative mode cannot retract streamed content, so it blocks instead
+        if self.context_mode != "deferred":
+            self._update_context([message])
+
+        yield from self._message_agent_stream(self.main_agent, message)
+
+        if self.context_mode == "deferred":
+            self._start_deferred_context()
+
+    def _message_agent_stream(
+        self, agent: Agent, message: Message
+    ) -> Iterator[(str | Message)]:
+        """
+        Streaming version of _message_agent.
+        """
+        functions = self._create_functions(
+            message, self.user_message_history.copy(), self.context.copy()
+        )
+        agent_response = None
+        for item in agent.get_response_message_stream(
+            message,
+            self.user_message_history.copy(),
+            context=self.context.copy(),
+            functions=functions,
+        ):
+            if isinstance(item, Message):
+                agent_response = item
+            else:
+                yield item
+        self.user_message_history.extend([message, agent_response])
+
+        if isinstance(agent_response, FunctionRequestMessage):
+            function_response = self._handle_function_request_message(
+                agent_response, functions, agent
+            )
+
+            # Pass along unapproved requests
+            if isinstance(function_response, FunctionRequestMessage):
+                yield function_response
+                return
+
+            self.logger.info(
+                f"Sending {len(function_response)} response messages to agent"
+            )
+            self.user_message_history.extend(function_response)
+            yield from agent.give_function_response_stream(
+                self.user_message_history.copy()
+            )
+            return
+
+        yield agent_response
+
+    async def asend_message_stream(
+        self, message: (Message | str)
+    ) -> AsyncIterator[(str | Message)]:
+        """
+        Async version of send_message_stream.
+
+        Args:
+            message (Message): The message to send.
+
+        Yields:
+            str | Message: Content deltas as they arrive, then the final response
+                message, as returned by asend_message.
+        """
+        message = self._validate_message(message)
+        self.last_context_changes = {}
+        await self._aapply_deferred_context()
+
+        # Speculative mode cannot retract streamed content, so it blocks instead
+        if self.context_mode != "deferred":
+            await self._aupdate_context([message])
+
+        async for item in self._amessage_agent_stream(self.main_agent, message):
+            yield item
+
+        if self.context_mode == "deferred":
+            self._astart_deferred_context()
+
+    async def _amessage_agent_stream(
+        self, agent: Agent, message: Message
+    ) -> AsyncIterator[(str | Message)]:
+        """
+        Async version of _message_agent_stream.
+        """
+        functions = await self._acreate_functions(
+            message, self.user_message_history.copy(), self.context.copy()
+        )
+        agent_response = None
+        async for item in agent.aget_response_message_stream(
+            message,
+            self.user_message_history.copy(),
+            context=self.context.copy(),
+            functions=functions,
+        ):
+            if isinstance(item, Message):
+                agent_response = item
+            else:
+                yield item
+        self.user_message_history.extend([message, agent_response])
+
+        if isinstance(agent_response, FunctionRequestMessage):
+            function_response = await self._ahandle_function_request_message(
+                agent_response, functions, agent
+            )
+
+            # Pass along unapproved requests
+            if isinstance(function_response, FunctionRequestMessage):
+                yield function_response
+                return
+
+            self.logger.info(
+                f"Sending {len(function_response)} response messages to agent"
+            )
+            self.user_message_history.extend(function_response)
+            async for item in agent.agive_function_response_stream(
+                self.user_message_history.copy()
+            ):
+                yield item
+            return
+
+        yield agent_response
+
+    def _validate_message(self, message: (Message | str)) -> Message:
+        if isinstance(message, str):
+            return UserMessage(content=message)
+        elif not isinstance(message, Message):
+            raise TypeError(f"message must be a string or Message, not {type(message)}")
+        return message
+
+    def _context_history(self, extra_messages: List[Message] = None):
         history = self.user_message_history.copy()
-        history.extend(extra_messages)
+        history.extend(extra_messages or [])
+        return history
+
+    def _update_context(self, extra_messages: List[Message] = None):
+        """
+        Run all context managers concurrently and apply their updates.
+        """
+        self._apply_context_updates(self._compute_context_updates(extra_messages))
+
+    async def _aupdate_context(self, extra_messages: List[Message] = None):
+        """
+        Async version of _update_context.
+        """
+        self._apply_context_updates(
+            await self._acompute_context_updates(extra_messages)
+        )
+
+    def _apply_context_updates(self, updates: Dict) -> Dict:
+        """
+        Apply merged context updates, recording the keys whose values changed in
+        last_context_changes.
+
+        Returns:
+            Dict: The changed keys and their new values.
+        """
+        changes = {k: v for k, v in updates.items() if self._context.get(k) != v}
+        self._context.update(updates)
+        if changes:
+            self.last_context_changes.update(changes)
+        return changes
+
+    def _compute_context_updates(self, extra_messages: List[Message] = None) -> Dict:
+        """
+        Run all context managers concurrently on a snapshot of the context, then
+        merge their updates without applying them. See _merge_context_updates.
+        """
+        return self._collect_context_updates(
+            *self._submit_context_updates(extra_messages)
+        )
+
+    def _submit_context_updates(
+        self, extra_messages: List[Message] = None
+    ) -> Tuple[float, List[Future]]:
+        """
+        Start all context managers on the shared context executor. A manager
+        whose previous call is still running, after timing out, is not started
+        again; its running call is collected instead. So each conversation
+        holds at most one pool thread per manager.
+
+        Returns:
+            Tuple[float, List[Future]]: When they started, and their futures.
+        """
+        if not self.context_managers:
+            return time.perf_counter(), []
+        history = self._context_history(extra_messages)
+        executor = _get_context_executor()
+        calls = {}
         for cm in self.context_managers:
-            additions = cm.get_context_updates(history, self._context)
-            if additions is not None:
-                self._context.update(additions)
+            previous = self._context_calls.get(cm)
+            if previous is not None and not previous.done():
+                # Still running after a timeout, so wait for that call instead
+                # of adding another to the shared pool
+                self.logger.debug(f"Context manager {cm.name} still running")
+                calls[cm] = previous
+            else:
+                calls[cm] = executor.submit(
+                    cm.get_context_updates, history, self.context, session=self
+                )
+        self._context_calls = calls
+        return time.perf_counter(), [calls[cm] for cm in self.context_managers]
+
+    def _collect_context_updates(self, start: float, futures: List[Future]) -> Dict:
+        """
+        Wait for context managers started by _submit_context_updates, up to
+        context_timeout from their start, and merge their updates.
+        """
+        if not futures:
+            return {}
+        deadline = (
+            None if self.context_timeout is None else start + self.context_timeout
+        )
+        updates = []
+        for cm, future in zip(self.context_managers, futures):
+            timeout = (
+                None if deadline is None else max(deadline - time.perf_counter(), 0)
+            )
+            try:
+                updates.append(future.result(timeout=timeout))
+            except TimeoutError:
+                self.logger.warning(f"Context manager {cm.name} timed out, skipping")
+                # Only stops a call that has not started. A running call keeps
+                # its thread until it returns, and is reused by the next turn.
+                future.cancel()
+                updates.append(None)
+            except Exception:
+                self.logger.exception(f"Context manager {cm.name} failed, skipping")
+                updates.append(None)
+
+        self.logger.debug(
+            f"Context updated in {time.perf_counter() - start:.3f}s "
+            f"by {len(self.context_managers)} managers"
+        )
+        return self._merge_context_updates(updates)
+
+    async def _acompute_context_updates(
+        self, extra_messages: List[Message] = None
+    ) -> Dict:
+        """
+        Async version of _compute_context_updates.
+        """
+        if not self.context_managers:
+            return {}
+        history = self._context_history(extra_messages)
+        start = time.perf_counter()
+
+        results = await asyncio.gather(
+            *(
+                asyncio.wait_for(
+                    cm.aget_context_updates(history, self.context, session=self),
+                    self.context_timeout,
+                )
+                for cm in self.context_managers
+            ),
+            return_exceptions=True,
+        )
+        updates = []
+        for cm, result in zip(self.context_managers, results):
+            if isinstance(result, asyncio.TimeoutError):
+                self.logger.warning(f"Context manager {cm.name} timed out, skipping")
+                updates.append(None)
+            elif isinstance(result, Exception):
+                self.logger.error(
+                    f"Context manager {cm.name} failed, skipping", exc_info=result
+                )
+                updates.append(None)
+            else:
+                updates.append(result)
+
+        self.logger.debug(
+            f"Context updated in {time.perf_counter() - start:.3f}s "
+            f"by {len(self.context_managers)} managers"
+        )
+        return self._merge_context_updates(updates)
+
+    def _merge_context_updates(self, updates: List[Optional[Dict]]) -> Dict:
+        """
+        Merge context updates in context manager order, so the result does not
+        depend on which manager finished first. If two managers set the same key
+        to different values, the later manager wins and a warning is logged.
+        """
+        merged = {}
+        sources = {}
+        for cm, additions in zip(self.context_managers, updates):
+            if not additions:
+                continue
+            for key, value in additions.items():
+                if key in merged and merged[key] != value:
+                    self.logger.warning(
+                        f"Context key {key} set by both {sources[key].name} and "
+                        f"{cm.name}, using {cm.name}"
+                    )
+                merged[key] = value
+                sources[key] = cm
+        return merged
+
+    # Background context updates
+
+    def _start_deferred_context(self) -> None:
+        """
+        Start updating the context in the background, for the next turn. An
+        update that is still running from an earlier turn is kept instead.
+        """
+        if self.context_managers and self._pending_context is None:
+            self._pending_context = self._submit_context_updates()
+
+    def _astart_deferred_context(self) -> None:
+        """
+        Async version of _start_deferred_context, running as a task on the
+        current event loop.
+        """
+        if self.context_managers and self._pending_context is None:
+            self._pending_context = asyncio.ensure_future(
+                self._acompute_context_updates()
+            )
+
+    def _take_pending_context(self):
+        pending, self._pending_context = self._pending_context, None
+        return pending
+
+    def _apply_deferred_context(self) -> None:
+        """
+        Wait for context updates started after the previous response and apply
+        them.
+        """
+        pending = self._take_pending_context()
+        if pending is None:
+            return
+        if isinstance(pending, asyncio.Future):
+            # Started by asend_message, and cannot be awaited from here.
+            # Cancelling it would leave its manager threads running, so keep
+            # it for the next turn rather than starting the managers again.
+            if not pending.done():
+                self._pending_context = pending
+                self.logger.warning(
+                    "Deferred context update still running, applying it next turn"
+                )
+                return
+            if pending.cancelled():
+                return
+        try:
+            if isinstance(pending, asyncio.Future):
+                updates = pending.result()
+            else:
+                updates = self._collect_context_updates(*pending)
+        except Exception:
+            self.logger.exception("Deferred context update failed, skipping")
+            return
+        self._apply_context_updates(updates)
+
+    async def _aapply_deferred_context(self) -> None:
+        """
+        Async version of _apply_deferred_context.
+        """
+        pending = self._take_pending_context()
+        if pending is None:
+            return
+        if isinstance(pending, asyncio.Future):
+            if pending.get_loop() is not asyncio.get_running_loop():
+                # Started on another event loop, so it cannot be awaited here
+                if not pending.done():
+                    self._pending_context = pending
+                    self.logger.warning(
+                        "Deferred context update belongs to another event loop, "
+                        "applying it next turn"
+                    )
+                    return
+            elif not pending.done():
+                await asyncio.wait([pending])
+            if pending.cancelled():
+                return
+        else:
+            # Started by send_message, so wait for its futures in a thread
+            pending = asyncio.to_thread(self._collect_context_updates, *pending)
+        try:
+            updates = await pending
+        except Exception:
+            self.logger.exception("Deferred context update failed, skipping")
+            return
+        self._apply_context_updates(updates)
 
     def _create_functions(
         self, input_message: Message, history: MessageQueue, context: Dict[str, str]
@@ -182,19 +953,26 @@ class Conversation:
             functions.extend(generated_functions)
         return functions
 
-    def _handle_function_request_message(
+    async def _acreate_functions(
+        self, input_message: Message, history: MessageQueue, context: Dict[str, str]
+    ) -> List[FunctionItem]:
+        generated = await asyncio.gather(
+            *(
+                fg.agenerate_functions(
+                    input_message=input_message, history=history, context=context
+                )
+                for fg in self.function_generators
+            )
+        )
+        return [f for generated_functions in generated for f in generated_functions]
+
+    def _attach_function_items(
         self, request_message: FunctionRequestMessage, functions: list[FunctionItem]
-    ) -> FunctionRequestMessage | List[FunctionResponseMessage]:
+    ) -> List[FunctionResponseMessage]:
         """
-        Handles a function request. Finds the function in the list of
-        functions and calls it.
-        If function is not in list, creates message to agent saying function
-        could not be found.
-        If function is auto-call, calls function and returns response.
-        Otherwise, returns the function request with the function item attached.
+        Attaches function items to all requests of a message.
+        Returns an error response for each function that could not be found.
         """
-        self.logger.info("Handling function request message")
-        self.logger.debug(f"Request message: {request_message}")
         errors = []
         for request in request_message.requests:
             # Attach fi
@@ -211,8 +989,32 @@ class Conversation:
                         content=f"Error: {e}",
                     )
                 )
-                continue
+        return errors
+
+    def _token_counter(self, agent: Optional[Agent]):
+        """
+        Count function responses with the responding agent's model, so its
+        tokenizer is used.
+        """
+        return (agent or self.main_agent).count_tokens_batch
 
+    def _handle_function_request_message(
+        self,
+        request_message: FunctionRequestMessage,
+        functions: list[FunctionItem],
+        agent: Optional[Agent] = None,
+    ) -> FunctionRequestMessage | List[FunctionResponseMessage]:
+        """
+        Handles a function request. Finds the function in the list of
+        functions and calls it.
+        If function is not in list, creates message to agent saying function
+        could not be found.
+        If function is auto-call, calls function and returns response.
+        Otherwise, returns the function request with the function item attached.
+        """
+        self.logger.info("Handling function request message")
+        self.logger.debug(f"Request message: {request_message}")
+        errors = self._attach_function_items(request_message, functions)
         if errors:
             self.logger.warning("Errors found, returning errors")
             return errors
@@ -220,12 +1022,40 @@ class Conversation:
         # If no approval, call and return
         if not request_message.approvals_required:
             self.logger.info("All functions are autocall, calling them")
-            return request_message.create_responses()
+            return request_message.create_responses(
+                token_counter=self._token_counter(agent)
+            )
 
         # Pass on the full request if any approvals are required
         self.logger.info("Some functions require approval, passing on request")
         return request_message
 
+    async def _ahandle_function_request_message(
+        self,
+        request_message: FunctionRequestMessage,
+        functions: list[FunctionItem],
+        agent: Optional[Agent] = None,
+    ) -> FunctionRequestMessage | List[FunctionResponseMessage]:
+        """
+        Async version of _handle_function_request_message. async def functions
+        run on the event loop, others in the shared function runtime.
+        """
+        self.logger.info("Handling function request message")
+        self.logger.debug(f"Request message: {request_message}")
+        errors = self._attach_function_items(request_message, functions)
+        if errors:
+            self.logger.warning("Errors found, returning errors")
+            return errors
+
+        if not request_message.approvals_required:
+            self.logger.info("All functions are autocall, calling them")
+            return await request_message.acreate_responses(
+                token_counter=self._token_counter(agent)
+            )
+
+        self.logger.info("Some functions require approval, passing on request")
+        return request_message
+
     def _attach_function_item(
         self, request: _FunctionRequest, functions: List[FunctionItem]
     ) -> None:
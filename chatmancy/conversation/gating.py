@@ -0,0 +1,123 @@
+from abc import ABC, abstractmethod
+from collections import namedtuple
+import re
+from typing import Callable, Dict, Iterable, List
+
+from ..message import Message
+
+GateInfo = namedtuple("GateInfo", ["hits", "skips"])
+
+
+class ContextGate(ABC):
+    """
+    Decides cheaply whether a context manager needs to run.
+
+    Gates see only the messages added since the manager last ran. When a gate
+    returns False the manager's previous updates are reused without calling it.
+    """
+
+    @abstractmethod
+    def should_update(
+        self, new_messages: List[Message], current_context: Dict
+    ) -> bool:
+        """
+        Args:
+            new_messages (List[Message]): Messages added since the last update.
+            current_context (Dict): The current context.
+
+        Returns:
+            bool: Whether the context manager should run.
+        """
+        pass  # pragma: no cover
+
+
+class KeywordGate(ContextGate):
+    """
+    Runs when new messages mention any of the keywords, as whole words and
+    ignoring case.
+
+    Args:
+        keywords (Iterable[str]): The keywords to look for.
+    """
+
+    def __init__(self, keywords: Iterable[str]) -> None:
+        self.keywords = sorted({str(k).lower() for k in keywords if str(k)})
+        self._pattern = (
+            re.compile(
+                r"\b(?:" + "|".join(re.escape(k) for k in self.keywords) + r")\b",
+                re.IGNORECASE,
+            )
+            if self.keywords
+            else None
+        )
+
+    @classmethod
+    def from_context_items(cls, context_items: Iterable) -> "KeywordGate":
+        """
+        Build a gate from the names and valid values of ContextItems.
+        """
+        keywords = []
+        for item in context_items:
+            keywords.append(item.name.replace("_", " "))
+            keywords.extend(item.valid_values or [])
+        return cls(keywords)
+
+    def should_update(
+        self, new_messages: List[Message], current_context: Dict
+    ) -> bool:
+        if self._pattern is None:
+            return False
+        return any(self._pattern.search(m.content or "") for m in new_messages)
+
+
+class LengthGate(ContextGate):
+    """
+    Runs once enough new content has accumulated since the last update.
+
+    Args:
+        min_chars (int): The number of new characters needed to run.
+    """
+
+    def __init__(self, min_chars: int) -> None:
+        self.min_chars = min_chars
+
+    def should_update(
+        self, new_messages: List[Message], current_context: Dict
+    ) -> bool:
+        return sum(len(m.content or "") for m in new_messages) >= self.min_chars
+
+
+class ClassifierGate(ContextGate):
+    """
+    Runs when a classifier, such as a small local model, says the new messages
+    may change the context.
+
+    Args:
+        classifier (Callable[[List[Message], Dict], bool]): Called with the new
+            messages and the current context.
+    """
+
+    def __init__(self, classifier: Callable[[List[Message], Dict], bool]) -> None:
+        self.classifier = classifier
+
+    def should_update(
+        self, new_messages: List[Message], current_context: Dict
+    ) -> bool:
+        return bool(self.classifier(new_messages, current_context))
+
+
+class AnyGate(ContextGate):
+    """
+    Runs when any of its gates would run.
+
+    Args:
+        *gates (ContextGate): The gates to combine.
+    """
+
+    def __init__(self, *gates: ContextGate) -> None:
+        self.gates = gates
+
+    def should_update(
+        self, new_messages: List[Message], current_context: Dict
+    ) -> bool:
+        return any(g.should_update(new_messages, current_context) for g in self.gates)
@@ -5,6 +5,19 @@ from .function_item import (
 )
 from .generator import FunctionItemGenerator, StaticFunctionItemGenerator
 from .function_message import FunctionRequestMessage, FunctionResponseMessage
+from .cache import (
+    FunctionCacheInfo,
+    FunctionResultCache,
+    configure_function_cache,
+    function_cache,
+)
+from .truncation import TRUNCATION_POLICIES, truncate_response
+from .runtime import (
+    FunctionRuntime,
+    FunctionStats,
+    configure_function_runtime,
+    function_runtime,
+)
 
 __all__ = [
     FunctionItem,
@@ -14,4 +27,14 @@ __all__ = [
     FunctionResponseMessage,
     FunctionItemGenerator,
     StaticFunctionItemGenerator,
+    FunctionRuntime,
+    FunctionStats,
+    configure_function_runtime,
+    function_runtime,
+    FunctionCacheInfo,
+    FunctionResultCache,
+    configure_function_cache,
+    function_cache,
+    TRUNCATION_POLICIES,
+    truncate_response,
 ]
@@ -0,0 +1,219 @@
+from collections import OrderedDict, namedtuple
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+DEFAULT_CACHE_SIZE = 1024
+
+FunctionCacheInfo = namedtuple(
+    "FunctionCacheInfo", ["hits", "misses", "hit_rate", "currsize"]
+)
+
+
+class FunctionResultCache:
+    """
+    A bounded, thread-safe LRU cache of function results, for FunctionItems
+    marked cacheable.
+
+    Results are keyed by function name and canonical arguments, so identical
+    calls within and across conversations run once until their cache_ttl
+    expires. Only successful results are cached. With a path, results are also
+    kept in a local sqlite database, shared by processes on the same machine
+    and surviving restarts.
+
+    Args:
+        maxsize (int): The maximum number of results kept in memory.
+            Defaults to 1024.
+        path (str, optional): A sqlite database for shared results.
+        table (str): The table used for shared results. Defaults to
+            "function_results".
+    """
+
+    def __init__(
+        self,
+        maxsize: int = DEFAULT_CACHE_SIZE,
+        path: Optional[str] = None,
+        table: str = "function_results",
+    ) -> None:
+        if not isinstance(maxsize, int) or maxsize < 0:
+            raise ValueError(f"maxsize must be a non-negative int, not {maxsize}")
+        if not table.isidentifier():
+            raise ValueError(f"table must be a valid identifier, not {table}")
+        self.maxsize = maxsize
+        self.path = path
+        self.table = table
+        self._entries: OrderedDict = OrderedDict()
+        self._stats: Dict[str, list] = {}
+        self._lock = threading.Lock()
+        self._connection = None
+        if path is not None:
+            self._connection = self._connect(path)
+
+    def _connect(self, path: str) -> sqlite3.Connection:
+        connection = sqlite3.connect(path, check_same_thread=False)
+        with connection:
+            connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+        return connection
+
+    def configure(
+        self, maxsize: Optional[int] = None, path: Optional[str] = None
+    ) -> None:
+        """
+        Change the memory size or shared database. Options left unset keep their
+        current value.
+
+        Args:
+            maxsize (int, optional): The maximum number of results kept in
+                memory. Extra results are evicted, oldest first.
+            path (str, optional): A sqlite database for shared results.
+        """
+        if maxsize is not None and (not isinstance(maxsize, int) or maxsize < 0):
+            raise ValueError(f"maxsize must be a non-negative int, not {maxsize}")
+        connection = self._connect(path) if path is not None else None
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+                while len(self._entries) > maxsize:
+                    self._entries.popitem(last=False)
+            if connection is not None:
+                if self._connection is not None:
+                    self._connection.close()
+                self.path = path
+                self._connection = connection
+
+    @staticmethod
+    def make_key(name: str, kwargs: Dict[str, Any]) -> str:
+        """
+        Hash a function name and validated arguments, independent of their order.
+        """
+        canonical = json.dumps(
+            {"name": name, "args": kwargs},
+            sort_keys=True,
+            separators=(",", ":"),
+            default=str,
+        )
+        return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+    def _count(self, name: str, hit: bool) -> None:
+        stats = self._stats.setdefault(name, [0, 0])
+        stats[0 if hit else 1] += 1
+
+    def _get_shared(self, key: str) -> Optional[tuple]:
+        row = self._connection.execute(
+            f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at <= time.time():
+            with self._connection:
+                self._connection.execute(
+                    f"DELETE FROM {self.table} WHERE key = ?", (key,)
+                )
+            return None
+        return expires_at, value
+
+    def get(self, name: str, key: str) -> Optional[str]:
+        """
+        Get a cached result, recording a hit or miss for the function.
+
+        Returns:
+            Optional[str]: The cached result, or None if missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] <= time.time():
+                del self._entries[key]
+                entry = None
+            if entry is None and self._connection is not None:
+                entry = self._get_shared(key)
+                if entry is not None:
+                    self._set_local(key, *entry)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self._count(name, entry is not None)
+            return None if entry is None else entry[1]
+
+    def _set_local(self, key: str, expires_at: Optional[float], value: str) -> None:
+        if self.maxsize == 0:
+            return
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        """
+        Cache a result.
+
+        Args:
+            key (str): The key from make_key.
+            value (str): The result.
+            ttl (float, optional): Seconds the result stays valid. Defaults to
+                forever.
+        """
+        expires_at = None if ttl is None else time.time() + ttl
+        with self._lock:
+            self._set_local(key, expires_at, value)
+            if self._connection is not None:
+                with self._connection:
+                    self._connection.execute(
+                        f"INSERT OR REPLACE INTO {self.table} "
+                        "(key, value, expires_at) VALUES (?, ?, ?)",
+                        (key, value, expires_at),
+                    )
+
+    def cache_info(self) -> Dict[str, FunctionCacheInfo]:
+        """
+        Report hits, misses and hit rate by function name, with the number of
+        results kept in memory.
+        """
+        with self._lock:
+            currsize = len(self._entries)
+            return {
+                name: FunctionCacheInfo(
+                    hits,
+                    misses,
+                    hits / (hits + misses) if hits + misses else 0.0,
+                    currsize,
+                )
+                for name, (hits, misses) in self._stats.items()
+            }
+
+    def clear(self) -> None:
+        """Drop all cached results, including shared ones, and the statistics."""
+        with self._lock:
+            self._entries.clear()
+            self._stats.clear()
+            if self._connection is not None:
+                with self._connection:
+                    self._connection.execute(f"DELETE FROM {self.table}")
+
+    def close(self) -> None:
+        """Close the shared database connection."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+function_cache = FunctionResultCache()
+
+
+def configure_function_cache(
+    maxsize: Optional[int] = None, path: Optional[str] = None
+) -> None:
+    """
+    Configure the shared function result cache.
+    See FunctionResultCache.configure.
+    """
+    function_cache.configure(maxsize=maxsize, path=path)
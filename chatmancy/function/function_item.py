@@ -6,9 +6,10 @@ import dill as pickle
 from typing import Any, Callable, List, Dict, Optional, Set, Union
 
 from pydantic import BaseModel, Field, ValidationInfo, field_serializer, field_validator
-import tiktoken
 
 from ..logging import trace
+from ..message.tokenizer import count_tokens
+from .truncation import TRUNCATION_POLICIES
 
 
 class FunctionParameter(BaseModel):
@@ -44,6 +45,23 @@ class FunctionItem(BaseModel):
         auto_call (bool): If True, the function will be automatically invoked when its
             name is called. If False, a FunctionRequest object is returned instead.
             Defaults to True.
+        timeout (Optional[float]): Seconds a call may run before it is cancelled
+            and an error is returned instead. Defaults to the runtime's timeout.
+        run_in_process (bool): Run calls in the runtime's process pool, for
+            CPU-bound methods. The method and arguments must be picklable with
+            dill. Defaults to False.
+        cacheable (bool): Cache results by arguments, for read-only methods.
+            Defaults to False.
+        cache_ttl (Optional[float]): Seconds a cached result stays valid. Setting
+            it makes the FunctionItem cacheable. Defaults to forever.
+        max_response_tokens (Optional[int]): The most tokens a response may use
+            in the history. Longer responses are shortened with truncation.
+            Defaults to no limit.
+        truncation (str | Callable[[str, int], str]): How long responses are
+            shortened: "head" keeps the start, "tail" the end, "head_tail" both,
+            and "json" prunes JSON responses field by field. A callable is a
+            summarizer, given the response and max_response_tokens.
+            Defaults to "head".
 
     Methods:
         to_dict(): Converts the FunctionItem to a dictionary in JSON object format.
@@ -58,6 +76,12 @@ class FunctionItem(BaseModel):
     required: Optional[List[str]] = Field(default=None, validate_default=True)
     auto_call: bool = True
     tags: Set[str] = Field(default_factory=set)
+    timeout: Optional[float] = None
+    run_in_process: bool = False
+    cacheable: bool = False
+    cache_ttl: Optional[float] = None
+    max_response_tokens: Optional[int] = None
+    truncation: (str | Callable[[str, int], str]) = "head"
     token_count: Optional[int] = Field(validate_default=True, default=None)
 
     model_config = {
@@ -82,8 +106,6 @@ class FunctionItem(BaseModel):
     def compute_token_count(cls, v: Any, v_info: ValidationInfo):
         if v is not None:
             return v
-        enc = tiktoken.encoding_for_model("gpt-4")
-
         # Check required params and encode
         relevant_content_keys = ["name", "description", "params", "required"]
         relevant_content = {}
@@ -97,8 +119,8 @@ class FunctionItem(BaseModel):
         }
 
         relevant_content = json.dumps(relevant_content)
-        tk = len(enc.encode(relevant_content))
-        return tk
+        # Generators rebuild the same functions every turn
+        return count_tokens(relevant_content, cache=True)
 
     @field_validator("required", mode="before")
     def set_required(cls, v, v_info: ValidationInfo):
@@ -110,6 +132,25 @@ class FunctionItem(BaseModel):
             return pickle.loads(base64.b64decode(v))
         return v
 
+    @field_validator("truncation", mode="before")
+    def validate_truncation(cls, v, v_info: ValidationInfo):
+        if callable(v) or v in TRUNCATION_POLICIES:
+            return v
+        if isinstance(v, str):
+            try:
+                return pickle.loads(base64.b64decode(v))
+            except Exception:
+                pass
+        raise ValueError(
+            f"truncation must be one of {TRUNCATION_POLICIES} or callable, not {v}"
+        )
+
+    @field_serializer("truncation")
+    def serialize_truncation(self, truncation):
+        if callable(truncation):
+            return self.serialize_method(truncation)
+        return truncation
+
     @field_serializer("method")
     def serialize_method(self, method):
         serialized_data = pickle.dumps(method)
@@ -126,6 +167,14 @@ class FunctionItem(BaseModel):
         validated_args = self._validate_call(kwargs)
         return self.method(**validated_args)
 
+    @trace(name="FunctionItem.acall_method")
+    async def acall_method(self, **kwargs) -> str:
+        """
+        Async version of call_method, for async def methods.
+        """
+        validated_args = self._validate_call(kwargs)
+        return await self.method(**validated_args)
+
     def _validate_call(self, kwargs) -> Dict[str, Any]:
         for arg_name, arg_value in kwargs.items():
             # param exists
@@ -1,11 +1,15 @@
-from concurrent.futures import ThreadPoolExecutor
-from typing import Dict, Optional, List
+from typing import Callable, Dict, Optional, List, Tuple
 
 from pydantic import BaseModel
 
 
 from ..message import Message, AgentMessage
+from ..message.tokenizer import is_lazy
 from .function_item import FunctionItem
+from .runtime import FunctionRuntime, function_runtime
+from .truncation import truncate_response
+
+TokenCounter = Callable[[List[str]], List[int]]
 
 
 class FunctionResponseMessage(Message):
@@ -65,49 +69,122 @@ class FunctionRequestMessage(AgentMessage):
         return [r for r in self.requests if not r.func_item.auto_call]
 
     @staticmethod
-    def _function_to_response(f: _FunctionRequest) -> FunctionResponseMessage:
-        try:
-            payload = f.func_item.call_method(**f.args)
-            response = str(payload)
-        except Exception as e:
-            response = f"Error running function {f.name}: {e}"
+    def _response_record(f: _FunctionRequest, content: str) -> Dict:
+        """
+        The fields of a function's response, shortened to the FunctionItem's
+        max_response_tokens. Other responses are counted when created.
+        """
+        record = {"func_name": f.name, "func_id": f.id, "content": content}
+        max_tokens = f.func_item.max_response_tokens
+        if max_tokens is not None:
+            content, token_count = truncate_response(
+                content, max_tokens, f.func_item.truncation
+            )
+            record.update(content=content, token_count=token_count)
+        return record
 
-        return FunctionResponseMessage(
-            func_name=f.name,
-            content=response,
-            token_count=0,
-            func_id=f.id,
-        )
+    @staticmethod
+    def _denial_record(f: _FunctionRequest) -> Dict:
+        return {
+            "func_name": f.name,
+            "func_id": f.id,
+            "content": f"Function {f.name} denied.",
+        }
 
     @staticmethod
-    def _function_to_denial(f: _FunctionRequest) -> FunctionResponseMessage:
+    def _content_to_response(
+        f: _FunctionRequest, content: str
+    ) -> FunctionResponseMessage:
         return FunctionResponseMessage(
-            func_name=f.name,
-            content=f"Function {f.name} denied.",
-            token_count=0,
-            func_id=f.id,
+            **FunctionRequestMessage._response_record(f, content)
         )
 
-    def create_responses(
-        self, approved_ids: List[str] = None
+    @staticmethod
+    def _function_to_response(
+        f: _FunctionRequest, runtime: FunctionRuntime = None
+    ) -> FunctionResponseMessage:
+        runtime = runtime or function_runtime
+        (content,) = runtime.run([(f.func_item, f.args)])
+        return FunctionRequestMessage._content_to_response(f, content)
+
+    @staticmethod
+    def _function_to_denial(f: _FunctionRequest) -> FunctionResponseMessage:
+        return FunctionResponseMessage(**FunctionRequestMessage._denial_record(f))
+
+    def _build_responses(
+        self,
+        denied: List[_FunctionRequest],
+        approved: List[_FunctionRequest],
+        contents: List[str],
+        token_counter: Optional[TokenCounter] = None,
     ) -> List[FunctionResponseMessage]:
-        if not self.requests:
-            return []
+        """
+        Create denials and responses, counting their tokens in one batch.
+        """
+        records = [self._denial_record(f) for f in denied] + [
+            self._response_record(f, content) for f, content in zip(approved, contents)
+        ]
+        if token_counter is not None and not is_lazy():
+            missing = [r for r in records if r.get("token_count") is None]
+            counts = token_counter([r["content"] for r in missing])
+            for record, token_count in zip(missing, counts):
+                record["token_count"] = token_count
+        return FunctionResponseMessage.bulk_create(records, lazy=is_lazy())
+
+    def _split_approved(
+        self, approved_ids: List[str] = None
+    ) -> Tuple[List[_FunctionRequest], List[_FunctionRequest]]:
         if approved_ids is None:
             approved_ids = []
-
-        # First filter out approved
-        denied = []
         approved = []
+        denied = []
         for f in self.requests:
             if f.func_item.auto_call or (f.id in approved_ids):
                 approved.append(f)
             else:
                 denied.append(f)
-        denied_responses = [self._function_to_denial(f) for f in denied]
-        with ThreadPoolExecutor() as pool:
-            approved_responses = list(
-                pool.map(lambda f: self._function_to_response(f), approved)
-            )
+        return approved, denied
 
-        return denied_responses + approved_responses
+    def create_responses(
+        self,
+        approved_ids: List[str] = None,
+        runtime: FunctionRuntime = None,
+        token_counter: Optional[TokenCounter] = None,
+    ) -> List[FunctionResponseMessage]:
+        """
+        Run the approved functions concurrently and deny the rest.
+
+        Args:
+            approved_ids (List[str], optional): Ids of requests approved to run,
+                in addition to auto_call functions.
+            runtime (FunctionRuntime, optional): The runtime functions run in.
+                Defaults to the shared function_runtime.
+            token_counter (Callable[[List[str]], List[int]], optional): Counts
+                the tokens of a batch of responses, such as an agent's
+                count_tokens_batch. Defaults to the default tokenizer.
+
+        Returns:
+            List[FunctionResponseMessage]: Denials, then the approved responses.
+        """
+        if not self.requests:
+            return []
+        approved, denied = self._split_approved(approved_ids)
+        runtime = runtime or function_runtime
+        contents = runtime.run([(f.func_item, f.args) for f in approved])
+        return self._build_responses(denied, approved, contents, token_counter)
+
+    async def acreate_responses(
+        self,
+        approved_ids: List[str] = None,
+        runtime: FunctionRuntime = None,
+        token_counter: Optional[TokenCounter] = None,
+    ) -> List[FunctionResponseMessage]:
+        """
+        Async version of create_responses.
+        """
+        if not self.requests:
+            return []
+        approved, denied = self._split_approved(approved_ids)
+        runtime = runtime or function_runtime
+        contents = await runtime.arun([(f.func_item, f.args) for f in approved])
+        return self._build_responses(denied, approved, contents, token_counter)
@@ -8,6 +8,15 @@ from .function_item import (
 
 
 class FunctionItemGenerator(ABC):
+    """
+    Generates the FunctionItems available for a message.
+
+    Subclasses implement _generate_functions, and may also implement
+    _agenerate_functions to generate functions without blocking the event loop
+    (for example, when they are fetched from a remote service). By default the
+    async path calls _generate_functions directly.
+    """
+
     def _generate_functions(
         self, input_message: Message, history: MessageQueue, context: Dict[str, str]
     ) -> List[FunctionItem]:
@@ -15,12 +24,23 @@ class FunctionItemGenerator(ABC):
             "FunctionGenerator is an abstract class. Please use a subclass."
         )
 
+    async def _agenerate_functions(
+        self, input_message: Message, history: MessageQueue, context: Dict[str, str]
+    ) -> List[FunctionItem]:
+        return self._generate_functions(input_message, history, context)
+
     def generate_functions(
         self, input_message: Message, history: MessageQueue, context: Dict[str, str]
     ) -> List[FunctionItem]:
         functions = self._generate_functions(input_message, history, context)
         return functions
 
+    async def agenerate_functions(
+        self, input_message: Message, history: MessageQueue, context: Dict[str, str]
+    ) -> List[FunctionItem]:
+        functions = await self._agenerate_functions(input_message, history, context)
+        return functions
+
 
 class KeywordSortedMixin(FunctionItemGenerator):
     def __init__(
@@ -47,6 +67,13 @@ class KeywordSortedMixin(FunctionItemGenerator):
         functions = self._sort_functions(functions, input_message, history, context)
         return functions
 
+    async def agenerate_functions(
+        self, input_message: Message, history: MessageQueue, context: Dict[str, str]
+    ) -> List[FunctionItem]:
+        functions = await super().agenerate_functions(input_message, history, context)
+        functions = self._sort_functions(functions, input_message, history, context)
+        return functions
+
     def _sort_functions(
         self,
         functions: List[FunctionItem],
@@ -100,3 +127,8 @@ class StaticFunctionItemGenerator(FunctionItemGenerator):
         self, input_message: Message, history: MessageQueue, context: Dict[str, str]
     ) -> List[FunctionItem]:
         return self._functions
+
+    async def agenerate_functions(
+        self, input_message: Message, history: MessageQueue, context: Dict[str, str]
+    ) -> List[FunctionItem]:
+        return self._functions
@@ -0,0 +1,401 @@
+import asyncio
+from collections import deque, namedtuple
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import inspect
+import logging
+import math
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import dill as pickle
+
+from .cache import FunctionResultCache, function_cache
+from .function_item import FunctionItem
+
+FunctionStats = namedtuple(
+    "FunctionStats",
+    ["calls", "errors", "timeouts", "mean_latency", "p95_latency", "max_latency"],
+)
+
+FunctionCall = Tuple[FunctionItem, Dict[str, Any]]
+
+# Marks options of FunctionRuntime.configure that were not given
+_UNSET = object()
+
+
+def _call_pickled(payload: bytes) -> str:
+    """Run a dill-pickled method in a worker process."""
+    method, kwargs = pickle.loads(payload)
+    return str(method(**kwargs))
+
+
+def _error_content(name: str, error: BaseException) -> str:
+    return f"Error running function {name}: {error}"
+
+
+def _timeout_content(name: str, timeout: float) -> str:
+    return f"Error running function {name}: timed out after {timeout:g} seconds"
+
+
+class _Latencies:
+    def __init__(self, window: int) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.latencies = deque(maxlen=window)
+
+    def stats(self) -> FunctionStats:
+        latencies = sorted(self.latencies)
+        if not latencies:
+            return FunctionStats(self.calls, self.errors, self.timeouts, 0.0, 0.0, 0.0)
+        rank = math.ceil(0.95 * len(latencies)) - 1
+        return FunctionStats(
+            self.calls,
+            self.errors,
+            self.timeouts,
+            sum(latencies) / len(latencies),
+            latencies[rank],
+            latencies[-1],
+        )
+
+
+class FunctionRuntime:
+    """
+    Runs FunctionItem methods for every conversation in a process.
+
+    Sync methods run in a bounded, persistent thread pool, so concurrent
+    conversations share its workers instead of each starting their own.
+    FunctionItems with run_in_process run in a process pool, pickled with dill.
+    async def methods are awaited on the caller's event loop, or on a
+    background loop for sync callers.
+
+    A call that runs longer than its FunctionItem's timeout, or the runtime's
+    default_timeout, is cancelled and answered with an error message, so one
+    hung function does not block a turn. Async calls and calls still queued are
+    cancelled outright. Running threads and processes cannot be interrupted, so
+    they finish in the background and their results are discarded. Cancelling
+    arun cancels all of its calls in the same way.
+
+    Args:
+        max_workers (int): Threads for sync methods. Defaults to 32.
+        process_workers (int, optional): Processes for run_in_process methods.
+            Defaults to the number of CPUs. The pool is started on first use.
+        default_timeout (float, optional): Seconds a call may run when its
+            FunctionItem has no timeout. Defaults to no limit.
+        window (int): Recent latencies kept per function. Defaults to 1000.
+        cache (FunctionResultCache, optional): Where results of cacheable
+            FunctionItems are kept. Defaults to the shared function_cache.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 32,
+        process_workers: Optional[int] = None,
+        default_timeout: Optional[float] = None,
+        window: int = 1000,
+        cache: Optional[FunctionResultCache] = None,
+    ) -> None:
+        self.max_workers = max_workers
+        self.process_workers = process_workers
+        self.default_timeout = default_timeout
+        self.window = window
+        self.cache = cache if cache is not None else function_cache
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stats: Dict[str, _Latencies] = {}
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger("chatmancy.FunctionRuntime")
+
+    def configure(
+        self,
+        max_workers: Optional[int] = None,
+        process_workers: Optional[int] = None,
+        default_timeout: Optional[float] = _UNSET,
+    ) -> None:
+        """
+        Change the pool sizes or default timeout. Options left unset keep their
+        current value. Resized pools are replaced; calls already running in the
+        old pools finish normally.
+
+        Args:
+            max_workers (int, optional): Threads for sync methods.
+            process_workers (int, optional): Processes for run_in_process methods.
+            default_timeout (float, optional): Seconds a call may run when its
+                FunctionItem has no timeout. None removes the limit.
+        """
+        with self._lock:
+            if max_workers is not None and max_workers != self.max_workers:
+                self.max_workers = max_workers
+                if self._thread_pool is not None:
+                    self._thread_pool.shutdown(wait=False)
+                    self._thread_pool = None
+            if process_workers is not None and process_workers != self.process_workers:
+                self.process_workers = process_workers
+                if self._process_pool is not None:
+                    self._process_pool.shutdown(wait=False)
+                    self._process_pool = None
+            if default_timeout is not _UNSET:
+                self.default_timeout = default_timeout
+
+    # Pools
+
+    def _get_thread_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._thread_pool is None:
+                self._thread_pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="chatmancy-function",
+                )
+            return self._thread_pool
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(
+                    max_workers=self.process_workers
+                )
+            return self._process_pool
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        """The background loop that runs async methods for sync callers."""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._loop.run_forever,
+                    name="chatmancy-function-loop",
+                    daemon=True,
+                ).start()
+            return self._loop
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Stop the pools and background loop, cancelling queued calls. They are
+        started again if the runtime is used afterwards.
+        """
+        with self._lock:
+            pools = [self._thread_pool, self._process_pool]
+            loop = self._loop
+            self._thread_pool = self._process_pool = self._loop = None
+        for pool in pools:
+            if pool is not None:
+                pool.shutdown(wait=wait, cancel_futures=True)
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+
+    # Statistics
+
+    def _get_stats(self, name: str) -> _Latencies:
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = _Latencies(self.window)
+        return stats
+
+    def _record(self, name: str, latency: float, error: bool = False) -> None:
+        with self._lock:
+            stats = self._get_stats(name)
+            stats.calls += 1
+            stats.errors += error
+            stats.latencies.append(latency)
+
+    def _record_timeout(self, name: str) -> None:
+        self.logger.warning(f"Function {name} timed out")
+        with self._lock:
+            self._get_stats(name).timeouts += 1
+
+    def function_stats(self) -> Dict[str, FunctionStats]:
+        """
+        Report calls, errors, timeouts and mean, 95th percentile and maximum
+        latency in seconds, by function name. Thread and process calls that
+        time out are also counted as calls once they finish in the background.
+        """
+        with self._lock:
+            return {name: stats.stats() for name, stats in self._stats.items()}
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    # Calls
+
+    def _timeout(self, func_item: FunctionItem) -> Optional[float]:
+        if func_item.timeout is not None:
+            return func_item.timeout
+        return self.default_timeout
+
+    def _timed(self, name: str, method: Callable, kwargs: Dict) -> Callable:
+        def timed():
+            start = time.perf_counter()
+            try:
+                result = method(**kwargs)
+            except Exception:
+                self._record(name, time.perf_counter() - start, error=True)
+                raise
+            self._record(name, time.perf_counter() - start)
+            return str(result)
+
+        return timed
+
+    async def _atimed(self, name: str, method: Callable, kwargs: Dict) -> str:
+        start = time.perf_counter()
+        try:
+            result = await method(**kwargs)
+        except Exception:
+            self._record(name, time.perf_counter() - start, error=True)
+            raise
+        self._record(name, time.perf_counter() - start)
+        return str(result)
+
+    def _submit_blocking(self, func_item: FunctionItem, args: Dict) -> Future:
+        """Start a sync method in the thread or process pool."""
+        if not func_item.run_in_process:
+            return self._get_thread_pool().submit(
+                self._timed(func_item.name, func_item.call_method, dict(args))
+            )
+
+        kwargs = func_item._validate_call(dict(args))
+        start = time.perf_counter()
+        future = self._get_process_pool().submit(
+            _call_pickled, pickle.dumps((func_item.method, kwargs))
+        )
+
+        def record(done: Future) -> None:
+            if not done.cancelled():
+                latency = time.perf_counter() - start
+                self._record(func_item.name, latency, done.exception() is not None)
+
+        future.add_done_callback(record)
+        return future
+
+    # Caching
+
+    def _cache_key(self, func_item: FunctionItem, args: Dict) -> Optional[str]:
+        """
+        The cache key of a call to a cacheable FunctionItem, from its validated
+        arguments, or None if results are not cached.
+        """
+        if not func_item.cacheable and func_item.cache_ttl is None:
+            return None
+        kwargs = func_item._validate_call(dict(args))
+        return self.cache.make_key(func_item.name, kwargs)
+
+    def _cache_result(self, future, func_item: FunctionItem, key: str) -> None:
+        """Cache the result of a call once it succeeds."""
+
+        def store(done) -> None:
+            if not done.cancelled() and done.exception() is None:
+                self.cache.set(key, done.result(), ttl=func_item.cache_ttl)
+
+        future.add_done_callback(store)
+
+    def _submit(self, func_item: FunctionItem, args: Dict) -> Future:
+        """Start a call, or answer it from the cache, for sync callers."""
+        future = Future()
+        try:
+            key = self._cache_key(func_item, args)
+            cached = None if key is None else self.cache.get(func_item.name, key)
+            if cached is not None:
+                future.set_result(cached)
+                return future
+            if inspect.iscoroutinefunction(func_item.method):
+                future = asyncio.run_coroutine_threadsafe(
+                    self._atimed(func_item.name, func_item.acall_method, dict(args)),
+                    self._get_loop(),
+                )
+            else:
+                future = self._submit_blocking(func_item, args)
+        except Exception as e:
+            future.set_exception(e)
+            return future
+        if key is not None:
+            self._cache_result(future, func_item, key)
+        return future
+
+    def _start(self, func_item: FunctionItem, args: Dict) -> Awaitable[str]:
+        """Start a call, or answer it from the cache, on the running event loop."""
+        key = self._cache_key(func_item, args)
+        cached = None if key is None else self.cache.get(func_item.name, key)
+        if cached is not None:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(cached)
+            return future
+        if inspect.iscoroutinefunction(func_item.method):
+            future = asyncio.ensure_future(
+                self._atimed(func_item.name, func_item.acall_method, dict(args))
+            )
+        else:
+            future = asyncio.wrap_future(self._submit_blocking(func_item, args))
+        if key is not None:
+            self._cache_result(future, func_item, key)
+        return future
+
+    def run(self, calls: List[FunctionCall]) -> List[str]:
+        """
+        Run function calls concurrently and wait for them.
+
+        Args:
+            calls (List[Tuple[FunctionItem, Dict]]): FunctionItems and the
+                arguments to call them with.
+
+        Returns:
+            List[str]: The result of each call as a string, in order. Failed and
+                timed out calls return an error message.
+        """
+        started = [
+            (func_item, self._submit(func_item, args), time.monotonic())
+            for func_item, args in calls
+        ]
+        results = []
+        for func_item, future, start in started:
+            timeout = self._timeout(func_item)
+            remaining = None if timeout is None else start + timeout - time.monotonic()
+            try:
+                results.append(future.result(timeout=remaining))
+            except FutureTimeoutError:
+                future.cancel()
+                self._record_timeout(func_item.name)
+                results.append(_timeout_content(func_item.name, timeout))
+            except Exception as e:
+                results.append(_error_content(func_item.name, e))
+        return results
+
+    async def _await_call(self, func_item: FunctionItem, args: Dict) -> str:
+        timeout = self._timeout(func_item)
+        try:
+            return await asyncio.wait_for(self._start(func_item, args), timeout)
+        except asyncio.TimeoutError:
+            self._record_timeout(func_item.name)
+            return _timeout_content(func_item.name, timeout)
+        except Exception as e:
+            return _error_content(func_item.name, e)
+
+    async def arun(self, calls: List[FunctionCall]) -> List[str]:
+        """
+        Async version of run. async def methods run on the current event loop.
+        """
+        return list(
+            await asyncio.gather(
+                *(self._await_call(func_item, args) for func_item, args in calls)
+            )
+        )
+
+
+function_runtime = FunctionRuntime()
+
+
+def configure_function_runtime(
+    max_workers: Optional[int] = None,
+    process_workers: Optional[int] = None,
+    default_timeout: Optional[float] = _UNSET,
+) -> None:
+    """
+    Configure the shared function runtime. See FunctionRuntime.configure.
+    """
+    function_runtime.configure(
+        max_workers=max_workers,
+        process_workers=process_workers,
+        default_timeout=default_timeout,
+    )
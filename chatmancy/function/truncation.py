@@ -0,0 +1,160 @@
+import json
+from typing import Any, Callable, List, Optional, Tuple
+
+from ..message.tokenizer import count_tokens, get_encoding
+
+TRUNCATION_POLICIES = ("head", "tail", "head_tail", "json")
+
+Summarizer = Callable[[str, int], str]
+
+# Most pruning steps a JSON response gets before it is cut as text
+_MAX_PRUNE_STEPS = 200
+# Strings at most this long are removed rather than shortened
+_MIN_STRING_LENGTH = 16
+
+
+def _marker(dropped: int) -> str:
+    return f"[... {dropped} tokens truncated ...]"
+
+
+def _truncate_text(content: str, max_tokens: int, policy: str) -> str:
+    """Cut content to max_tokens tokens, keeping the head, tail or both."""
+    encoding = get_encoding()
+    tokens = encoding.encode(content, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return content
+
+    marker = _marker(len(tokens) - max_tokens)
+    keep = max_tokens - len(encoding.encode(marker, disallowed_special=())) - 2
+    if keep <= 0:
+        # Too small a budget for the marker
+        if policy == "tail":
+            return encoding.decode(tokens[len(tokens) - max_tokens:])
+        return encoding.decode(tokens[:max_tokens])
+    while True:
+        if policy == "tail":
+            truncated = f"{marker}\n{encoding.decode(tokens[len(tokens) - keep:])}"
+        elif policy == "head_tail":
+            head = (keep + 1) // 2
+            truncated = (
+                f"{encoding.decode(tokens[:head])}\n{marker}\n"
+                f"{encoding.decode(tokens[len(tokens) - (keep - head):])}"
+            )
+        else:
+            truncated = f"{encoding.decode(tokens[:keep])}\n{marker}"
+        # Tokens can merge differently across the cut, so check the result
+        excess = len(encoding.encode(truncated, disallowed_special=())) - max_tokens
+        if excess <= 0 or keep == 0:
+            return truncated
+        keep = max(keep - excess, 0)
+
+
+def _children(value: Any) -> List[Tuple[Any, Any]]:
+    if isinstance(value, dict):
+        return list(value.items())
+    if isinstance(value, list):
+        return list(enumerate(value))
+    return []
+
+
+def _sizes(value: Any, parent: Any = None, key: Any = None, nodes=None) -> int:
+    """
+    The length of json.dumps(value), built up from the sizes of its children
+    so each node is serialized once. Every node below value is appended to
+    nodes as (size, parent, key, value).
+    """
+    children = _children(value)
+    if not children:
+        size = len(json.dumps(value))
+    else:
+        # Brackets, plus ", " between items and '"key": ' before dict values
+        size = 2 + 2 * (len(children) - 1)
+        for child_key, child in children:
+            size += _sizes(child, value, child_key, nodes)
+            if isinstance(value, dict):
+                size += len(json.dumps(child_key)) + 2
+    if parent is not None and nodes is not None:
+        nodes.append((size, parent, key, value))
+    return size
+
+
+def _prune_step(root: dict) -> bool:
+    """
+    Shrink the largest part of a JSON value: halve its largest list, or
+    shorten its largest string, or drop its largest field.
+
+    Returns:
+        bool: Whether anything could be pruned.
+    """
+    nodes = []
+    _sizes(root, nodes=nodes)
+    nodes.sort(key=lambda node: node[0], reverse=True)
+    for size, parent, key, value in nodes:
+        if isinstance(value, list) and len(value) > 1:
+            parent[key] = value[: len(value) // 2]
+            return True
+        if isinstance(value, str) and len(value) > _MIN_STRING_LENGTH:
+            parent[key] = value[: len(value) // 2] + "..."
+            return True
+    for size, parent, key, value in nodes:
+        if parent is not root:
+            del parent[key]
+            return True
+    return False
+
+
+def _prune_json(content: str, max_tokens: int) -> str:
+    """
+    Prune a JSON response field by field until it fits, keeping it valid JSON.
+    Content that is not JSON, or cannot be pruned enough, is cut as text.
+    """
+    try:
+        root = {"value": json.loads(content)}
+    except ValueError:
+        return _truncate_text(content, max_tokens, "head")
+
+    # Intermediate results are counted directly, keeping them out of the cache
+    encoding = get_encoding()
+    for _ in range(_MAX_PRUNE_STEPS):
+        if not _prune_step(root):
+            break
+        pruned = json.dumps(root["value"])
+        if len(encoding.encode(pruned, disallowed_special=())) <= max_tokens:
+            return pruned
+    return _truncate_text(json.dumps(root["value"]), max_tokens, "head")
+
+
+def truncate_response(
+    content: str,
+    max_tokens: Optional[int],
+    policy: (str | Summarizer) = "head",
+) -> Tuple[str, int]:
+    """
+    Fit a function response into a token budget.
+
+    Args:
+        content (str): The response.
+        max_tokens (int, optional): The most tokens the response may use. None
+            leaves it unchanged.
+        policy (str | Callable[[str, int], str]): How to shorten the response.
+            "head" keeps its start, "tail" its end and "head_tail" both.
+            "json" removes list items, string characters and fields from JSON
+            responses, keeping them valid. A callable is a summarizer, given the
+            response and budget; summaries over budget are cut to their start.
+
+    Returns:
+        Tuple[str, int]: The response and its token count.
+    """
+    token_count = count_tokens(content)
+    if max_tokens is None or token_count <= max_tokens:
+        return content, token_count
+
+    if callable(policy):
+        content = _truncate_text(policy(content, max_tokens), max_tokens, "head")
+    elif policy == "json":
+        content = _prune_json(content, max_tokens)
+    elif policy in TRUNCATION_POLICIES:
+        content = _truncate_text(content, max_tokens, policy)
+    else:
+        raise ValueError(f"policy must be one of {TRUNCATION_POLICIES} or callable")
+    return content, count_tokens(content)
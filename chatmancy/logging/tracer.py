@@ -1,3 +1,5 @@
+import inspect
+
 SERVICE_NAME = "chatmancy"
 
 try:
@@ -14,15 +16,27 @@ def trace(*args, **kwargs):
     def decorator(func):
         if telemetry_installed:
 
-            def wrapped(*args, **kwargs):
-                with tracer.start_as_current_span(
+            def start_span():
+                return tracer.start_as_current_span(
                     f"{SERVICE_NAME}.{func.__name__}",
                     attributes={
                         "service.name": SERVICE_NAME,
                         "service.version": chatmancy_version,
                         "function.name": func.__name__,
                     },
-                ):
+                )
+
+            # Coroutines keep their span open until they are awaited to completion
+            if inspect.iscoroutinefunction(func):
+
+                async def async_wrapped(*args, **kwargs):
+                    with start_span():
+                        return await func(*args, **kwargs)
+
+                return async_wrapped
+
+            def wrapped(*args, **kwargs):
+                with start_span():
                     return func(*args, **kwargs)
 
             return wrapped
@@ -1,3 +1,33 @@
 from .message import Message, MessageQueue, AgentMessage, UserMessage
+from .compact import MessageColumns
+from .persistent import CompactMessageQueue, PersistentMessageQueue
+from .tokenizer import (
+    TokenizerRegistry,
+    TokenCountCache,
+    configure_token_cache,
+    count_tokens,
+    count_tokens_batch,
+    get_encoding,
+    lazy_token_counts,
+    set_lazy_token_counts,
+    token_cache_info,
+)
 
-__all__ = [Message, MessageQueue, AgentMessage, UserMessage]
+__all__ = [
+    Message,
+    MessageQueue,
+    PersistentMessageQueue,
+    CompactMessageQueue,
+    MessageColumns,
+    AgentMessage,
+    UserMessage,
+    TokenizerRegistry,
+    TokenCountCache,
+    configure_token_cache,
+    count_tokens,
+    count_tokens_batch,
+    get_encoding,
+    lazy_token_counts,
+    set_lazy_token_counts,
+    token_cache_info,
+]
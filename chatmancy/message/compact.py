@@ -0,0 +1,180 @@
+from array import array
+import sys
+import threading
+from typing import Any, Dict, Iterable, List, Tuple, Type
+import weakref
+
+from .message import Message
+from .tokenizer import count_tokens
+
+_BASE_FIELDS = ("sender", "content", "token_count")
+_NO_DEFAULT = object()
+# Stored in place of the token count of a message that is still lazy
+LAZY_TOKEN_COUNT = 0xFFFFFFFF
+
+
+class MessageColumns:
+    """
+    Columnar storage for Messages.
+
+    Message types and senders are interned into process-wide tables and stored
+    as small integer ids, token counts are kept in an array('I'), and contents
+    are kept as-is. Fields specific to a Message subclass are stored per row only
+    when they differ from their default. Messages are materialized with
+    model_construct when accessed, so no validation runs on read. Lazy token
+    counts stay lazy until token_counts_at reads them, or a materialized message
+    counts itself; either way the count is stored in the column.
+
+    The sender table is never pruned: every distinct sender is kept for the
+    life of the process. Senders are expected to be a few roles and agent
+    names, so do not use per-user or per-request values as senders.
+
+    Args:
+        messages (Iterable[Message], optional): The initial messages.
+    """
+
+    __slots__ = (
+        "types",
+        "senders",
+        "contents",
+        "token_counts",
+        "extras",
+        "lazy_messages",
+    )
+
+    _type_table: List[Type[Message]] = []
+    _type_ids: Dict[Type[Message], int] = {}
+    # Unbounded; see the class docstring
+    _sender_table: List[str] = []
+    _sender_ids: Dict[str, int] = {}
+    _extra_fields: Dict[Type[Message], Tuple[Tuple[str, Any], ...]] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, messages: Iterable[Message] = ()) -> None:
+        self.types = array("H")
+        self.senders = array("I")
+        self.contents: List[str] = []
+        self.token_counts = array("I")
+        self.extras: Dict[int, Tuple] = {}
+        # Materialized messages of lazy rows, whose counts are stored once known
+        self.lazy_messages: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+        self.extend(messages)
+
+    # Interning
+
+    @classmethod
+    def _type_id(cls, message_type: Type[Message]) -> int:
+        type_id = cls._type_ids.get(message_type)
+        if type_id is None:
+            with cls._lock:
+                type_id = cls._type_ids.get(message_type)
+                if type_id is None:
+                    type_id = len(cls._type_table)
+                    cls._type_table.append(message_type)
+                    cls._type_ids[message_type] = type_id
+                    cls._extra_fields[message_type] = tuple(
+                        (name, field.get_default(call_default_factory=True))
+                        if not field.is_required()
+                        else (name, _NO_DEFAULT)
+                        for name, field in message_type.model_fields.items()
+                        if name not in _BASE_FIELDS
+                    )
+        return type_id
+
+    @classmethod
+    def _sender_id(cls, sender: str) -> int:
+        sender_id = cls._sender_ids.get(sender)
+        if sender_id is None:
+            with cls._lock:
+                sender_id = cls._sender_ids.get(sender)
+                if sender_id is None:
+                    sender_id = len(cls._sender_table)
+                    cls._sender_table.append(sys.intern(sender))
+                    cls._sender_ids[sender] = sender_id
+        return sender_id
+
+    # Storage
+
+    def append(self, message: Message) -> None:
+        message_type = type(message)
+        row = len(self.contents)
+        self.types.append(self._type_id(message_type))
+        self.senders.append(self._sender_id(message.sender))
+        self.contents.append(message.content)
+        self.token_counts.append(
+            message.__dict__["token_count"]
+            if "token_count" in message.__dict__
+            else LAZY_TOKEN_COUNT
+        )
+
+        extra_fields = self._extra_fields[message_type]
+        if extra_fields:
+            values = tuple(
+                sys.intern(value) if isinstance(value, str) else value
+                for value in (getattr(message, name) for name, _ in extra_fields)
+            )
+            if any(v != d for v, (_, d) in zip(values, extra_fields)):
+                self.extras[row] = values
+
+    def extend(self, messages: Iterable[Message]) -> None:
+        for message in messages:
+            self.append(message)
+
+    def _token_count(self, row: int) -> int:
+        """
+        The stored token count of a row, taking it from the row's materialized
+        message if that has counted itself since.
+        """
+        token_count = self.token_counts[row]
+        if token_count == LAZY_TOKEN_COUNT and self.lazy_messages:
+            message = self.lazy_messages.get(row)
+            if message is not None and "token_count" in message.__dict__:
+                token_count = message.__dict__["token_count"]
+                self.token_counts[row] = token_count
+                del self.lazy_messages[row]
+        return token_count
+
+    def token_counts_at(self, start: int, stop: int) -> array:
+        """
+        Return the token counts of rows [start, stop), counting and storing any
+        that are still lazy.
+        """
+        token_counts = self.token_counts
+        for row in range(start, stop):
+            if self._token_count(row) == LAZY_TOKEN_COUNT:
+                token_counts[row] = count_tokens(self.contents[row])
+        return token_counts[start:stop]
+
+    def _materialize(self, row: int) -> Message:
+        message_type = self._type_table[self.types[row]]
+        values = {
+            "sender": self._sender_table[self.senders[row]],
+            "content": self.contents[row],
+        }
+        token_count = self._token_count(row)
+        if token_count != LAZY_TOKEN_COUNT:
+            values["token_count"] = token_count
+        extra = self.extras.get(row)
+        if extra is not None:
+            names = (name for name, _ in self._extra_fields[message_type])
+            values.update(zip(names, extra))
+        message = message_type.model_construct(**values)
+        if token_count == LAZY_TOKEN_COUNT:
+            self.lazy_messages[row] = message
+        return message
+
+    def __len__(self) -> int:
+        return len(self.contents)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._materialize(row) for row in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("MessageColumns index out of range")
+        return self._materialize(i)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self._materialize(row)
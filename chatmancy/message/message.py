@@ -1,14 +1,32 @@
+from bisect import bisect_left
 from collections import deque
 from copy import copy as copy_func
-from typing import Any, List, Optional, Tuple, Type
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type, Union
 
-from pydantic import BaseModel, Field, field_validator, ValidationInfo
-import tiktoken
+from pydantic import (
+    BaseModel,
+    Field,
+    field_validator,
+    model_serializer,
+    ValidationInfo,
+)
+
+from .tokenizer import (
+    DEFAULT_BATCH_THREADS,
+    count_tokens,
+    count_tokens_batch,
+    is_lazy,
+    lazy_token_counts,
+)
 
 
 class Message(BaseModel):
     """
     A class that represents a message.
+
+    If no token_count is given it is counted at construction, or, in lazy mode
+    (see lazy_token_counts), on first read of token_count and then memoized.
     """
 
     sender: str
@@ -22,9 +40,80 @@ class Message(BaseModel):
     def compute_token_count(cls, v: Any, v_info: ValidationInfo):
         if v is not None:
             return v
-        enc = tiktoken.encoding_for_model("gpt-4")
-        tk = len(enc.encode(v_info.data["content"]))
-        return tk
+        if is_lazy():
+            return None
+        return count_tokens(v_info.data["content"])
+
+    def model_post_init(self, __context: Any) -> None:
+        # A lazy count is left unset so that reading it falls through to
+        # __getattr__
+        if self.__dict__.get("token_count", 0) is None:
+            del self.__dict__["token_count"]
+
+    def __getattr__(self, item: str) -> Any:
+        if item == "token_count":
+            token_count = count_tokens(self.content)
+            self.__dict__["token_count"] = token_count
+            return token_count
+        return super().__getattr__(item)
+
+    @model_serializer(mode="wrap")
+    def _serialize(self, handler):
+        self.token_count
+        return handler(self)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, Message):
+            self.token_count
+            other.token_count
+        return super().__eq__(other)
+
+    @classmethod
+    def bulk_create(
+        cls,
+        records: Iterable[Union[Dict, "Message"]],
+        model: Optional[str] = None,
+        num_threads: int = DEFAULT_BATCH_THREADS,
+        lazy: bool = False,
+    ) -> List["Message"]:
+        """
+        Create many messages at once, counting all missing token counts in a
+        single batched encode instead of one encode per message.
+
+        Args:
+            records (Iterable[Dict | Message]): Keyword arguments for each message.
+                Existing Message objects are passed through unchanged.
+            model (str, optional): The model whose encoding should be used.
+            num_threads (int): Threads used by the encoder. Defaults to 8.
+            lazy (bool): Skip counting, leaving missing token counts to be
+                counted on first read. Defaults to False.
+
+        Returns:
+            List[Message]: The validated messages, in order.
+        """
+        records = list(records)
+        if lazy:
+            with lazy_token_counts():
+                return [
+                    record if isinstance(record, Message) else cls(**record)
+                    for record in records
+                ]
+
+        missing = [
+            i
+            for i, record in enumerate(records)
+            if not isinstance(record, Message) and record.get("token_count") is None
+        ]
+        token_counts = count_tokens_batch(
+            [records[i]["content"] for i in missing], model, num_threads
+        )
+        for i, token_count in zip(missing, token_counts):
+            records[i] = {**records[i], "token_count": token_count}
+
+        return [
+            record if isinstance(record, Message) else cls(**record)
+            for record in records
+        ]
 
 
 class UserMessage(Message):
@@ -51,38 +140,200 @@ class AgentMessage(Message):
         )
 
 
+def _validate_message(message: (Message | Dict)) -> Message:
+    if isinstance(message, Message):
+        return message
+    else:
+        try:
+            return Message(**message)
+        except Exception:
+            raise TypeError(
+                "Only Message objects can be added to MessageQueue, "
+                f" not {type(message)}"
+            )
+
+
 class MessageQueue(deque):
+    """
+    A deque of Messages.
+
+    The queue keeps a cumulative token index, built on first use and updated on
+    append, appendleft, pop and popleft in amortized O(1). This makes
+    token_count O(1) and lets get_last_n_tokens find its cut point with a
+    binary search.
+    """
+
     def __init__(self, iterable=None):
         super().__init__()
+        # _token_index[_index_start] is the left boundary and
+        # _token_index[_index_start + k + 1] the running total through message k.
+        # Entries before _index_start are free space for appendleft. None until
+        # first needed.
+        self._token_index: Optional[List[int]] = None
+        self._index_start = 0
         if iterable is not None:
             self.extend(iterable)
 
+    @classmethod
+    def from_records(
+        cls,
+        records: Iterable[Union[Dict, Message]],
+        message_cls: Type[Message] = Message,
+        model: Optional[str] = None,
+        num_threads: int = DEFAULT_BATCH_THREADS,
+        lazy: bool = False,
+    ) -> "MessageQueue":
+        """
+        Build a MessageQueue from stored records, batch counting tokens.
+        See Message.bulk_create.
+
+        Args:
+            records (Iterable[Dict | Message]): The stored messages.
+            message_cls (Type[Message]): The class used to create dict records.
+                Defaults to Message.
+            model (str, optional): The model whose encoding should be used.
+            num_threads (int): Threads used by the encoder. Defaults to 8.
+            lazy (bool): Defer token counting until first read. Defaults to False.
+
+        Returns:
+            MessageQueue: A queue of the validated messages.
+        """
+        return cls(message_cls.bulk_create(records, model, num_threads, lazy))
+
     def _validate(self, message: Message):
-        if isinstance(message, Message):
-            return message
-        else:
-            try:
-                return Message(**message)
-            except Exception:
-                raise TypeError(
-                    "Only Message objects can be added to MessageQueue, "
-                    f" not {type(message)}"
-                )
+        return _validate_message(message)
 
     def append(self, message):
         validated_message = self._validate(message)
         super().append(validated_message)
+        if self._token_index is not None:
+            index = self._token_index
+            index.append(index[-1] + validated_message.token_count)
 
     def appendleft(self, message):
         validated_message = self._validate(message)
         super().appendleft(validated_message)
+        if self._token_index is not None:
+            if self._index_start == 0:
+                # Double the free space at the front, so appendleft stays O(1)
+                # amortized
+                space = max(len(self._token_index), 8)
+                self._token_index[:0] = [0] * space
+                self._index_start = space
+            index = self._token_index
+            self._index_start -= 1
+            index[self._index_start] = (
+                index[self._index_start + 1] - validated_message.token_count
+            )
+
+    def pop(self):
+        message = super().pop()
+        if self._token_index is not None:
+            self._token_index.pop()
+        return message
+
+    def popleft(self):
+        message = super().popleft()
+        if self._token_index is not None:
+            self._index_start += 1
+            # Drop entries before the boundary once they are most of the index
+            if self._index_start * 4 > len(self._token_index) * 3:
+                del self._token_index[: self._index_start]
+                self._index_start = 0
+        return message
 
     def extend(self, messages):
+        if isinstance(messages, MessageQueue):
+            self._extend_trusted(messages)
+            return
         for message in messages:
             self.append(message)
 
+    @classmethod
+    def _from_trusted(cls, messages: Iterable[Message]) -> "MessageQueue":
+        queue = cls()
+        queue._extend_trusted(messages)
+        return queue
+
+    def _extend_trusted(self, messages: Iterable[Message]) -> None:
+        """
+        Extend with messages that are already validated, such as the contents or
+        get_last_n_* results of another queue, in a single deque extend.
+        """
+        index = self._token_index
+        if index is None:
+            super().extend(messages)
+        elif isinstance(messages, MessageQueue) and messages._token_index is not None:
+            start = messages._index_start
+            other = messages._token_index[start + 1:]
+            offset = index[-1] - messages._token_index[start]
+            super().extend(messages)
+            index.extend([total + offset for total in other])
+        else:
+            messages = list(messages)
+            super().extend(messages)
+            total = index[-1]
+            for message in messages:
+                total += message.token_count
+                index.append(total)
+
+    def extendleft(self, messages):
+        for message in messages:
+            self.appendleft(message)
+
+    def insert(self, i, message):
+        super().insert(i, self._validate(message))
+        self._token_index = None
+
+    def remove(self, message):
+        super().remove(message)
+        self._token_index = None
+
+    def clear(self):
+        super().clear()
+        self._token_index = None
+
+    def rotate(self, n=1):
+        super().rotate(n)
+        self._token_index = None
+
+    def reverse(self):
+        super().reverse()
+        self._token_index = None
+
+    def __setitem__(self, i, message):
+        super().__setitem__(i, self._validate(message))
+        self._token_index = None
+
+    def __delitem__(self, i):
+        super().__delitem__(i)
+        self._token_index = None
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+    def __imul__(self, n):
+        super().__imul__(n)
+        self._token_index = None
+        return self
+
+    def __reduce__(self):
+        return self.__class__, (list(self),)
+
+    def _get_token_index(self) -> List[int]:
+        if self._token_index is None:
+            total = 0
+            index = [total]
+            for message in self:
+                total += message.token_count
+                index.append(total)
+            self._token_index = index
+            self._index_start = 0
+        return self._token_index
+
     def __add__(self, other):
-        new_queue = MessageQueue(self)
+        new_queue = self.copy()
         new_queue.extend(other)
         return new_queue
 
@@ -95,6 +346,13 @@ class MessageQueue(deque):
         """
         return copy_func(self)
 
+    def __copy__(self):
+        new_queue = self.__class__()
+        new_queue._extend_trusted(self)
+        if self._token_index is not None:
+            new_queue._token_index = self._token_index[self._index_start:]
+        return new_queue
+
     def get_last_n_tokens(self, n, exclude_types: Tuple[Type] = ()) -> List[Message]:
         """
         Return the most recent messages, up to a total token count of n.
@@ -102,16 +360,26 @@ class MessageQueue(deque):
         # Return
         List of messages whose total token count is less than n.
         """
-        result = []
-        current_token_sum = 0
-        for message in reversed(self):
-            if isinstance(message, exclude_types):
-                continue
+        if exclude_types:
+            result = []
+            current_token_sum = 0
+            for message in reversed(self):
+                if isinstance(message, exclude_types):
+                    continue
 
-            if current_token_sum + message.token_count > n:
-                break
-            current_token_sum += message.token_count
-            result.append(message)
+                if current_token_sum + message.token_count > n:
+                    break
+                current_token_sum += message.token_count
+                result.append(message)
+            return result[::-1]  # Return messages in original order
+
+        # Find the first message whose suffix fits in n tokens
+        index = self._get_token_index()
+        start = bisect_left(index, index[-1] - n, lo=self._index_start)
+        count = len(self) - (start - self._index_start)
+        if count <= 0:
+            return []
+        result = list(islice(reversed(self), count))
         return result[::-1]  # Return messages in original order
 
     def get_last_n_messages(self, n, exclude_types: Tuple[Type] = ()) -> List[Message]:
@@ -134,7 +402,8 @@ class MessageQueue(deque):
 
     @property
     def token_count(self):
-        return sum(m.token_count for m in self)
+        index = self._get_token_index()
+        return index[-1] - index[self._index_start]
 
     def __repr__(self):
         return f"MessageQueue({len(self)} items)"
@@ -0,0 +1,379 @@
+from bisect import bisect_left
+from collections.abc import Sequence
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple, Type
+
+from .compact import MessageColumns
+from .message import Message, MessageQueue, _validate_message
+
+
+class _Chunk:
+    """
+    Append-only message storage shared between PersistentMessageQueues.
+
+    A chunk is only ever extended by the queue that owns it, and only at its
+    end, so every other queue can keep reading its own [start, stop) window
+    without copying. Token prefix sums are extended lazily.
+    """
+
+    __slots__ = ("messages", "_index", "_lock")
+
+    def __init__(self, messages: List[Message] = None) -> None:
+        self.messages: List[Message] = messages if messages is not None else []
+        self._index: List[int] = [0]
+        self._lock = threading.Lock()
+
+    def _token_counts(self, start: int, stop: int) -> Iterable[int]:
+        return (message.token_count for message in self.messages[start:stop])
+
+    def token_offset(self, i: int) -> int:
+        """
+        Return the total token count of messages [0, i).
+        """
+        index = self._index
+        if i >= len(index):
+            with self._lock:
+                total = index[-1]
+                for token_count in self._token_counts(len(index) - 1, i):
+                    total += token_count
+                    index.append(total)
+        return index[i]
+
+    def token_sum(self, start: int, stop: int) -> int:
+        return self.token_offset(stop) - self.token_offset(start)
+
+    def tail_start(self, start: int, stop: int, n: int) -> int:
+        """
+        Return the first position in [start, stop] whose suffix up to stop fits
+        in n tokens.
+        """
+        end = self.token_offset(stop)
+        self.token_offset(start)
+        return bisect_left(self._index, end - n, start, stop + 1)
+
+
+class _CompactChunk(_Chunk):
+    """
+    A chunk backed by MessageColumns instead of a list of Message objects.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, messages: List[Message] = None) -> None:
+        super().__init__(MessageColumns(messages or ()))
+
+    def _token_counts(self, start: int, stop: int) -> Iterable[int]:
+        return self.messages.token_counts_at(start, stop)
+
+
+_Span = Tuple[_Chunk, int, int]
+
+
+class PersistentMessageQueue(Sequence):
+    """
+    A copy-on-write queue of Messages.
+
+    Messages are stored in shared, append-only chunks, and a queue is a tuple of
+    (chunk, start, stop) spans over them. copy(), slicing, concatenation and the
+    get_last_n_* helpers return new queues sharing the same chunks, so they cost
+    O(spans) rather than O(messages) and never re-validate messages. Appending
+    extends the queue's own chunk in place; appending to a copy starts a new
+    chunk instead of touching shared storage.
+
+    Supports the MessageQueue API (append, appendleft, extend, pop, popleft,
+    copy, token_count, get_last_n_tokens, get_last_n_messages) and can be used
+    as a Conversation history. It is opt-in: Conversation defaults to a
+    MessageQueue, so pass a PersistentMessageQueue as its history to use one.
+
+    Args:
+        iterable (Iterable[Message | Dict], optional): The initial messages.
+    """
+
+    max_spans: int = 64
+    _chunk_type: Type[_Chunk] = _Chunk
+
+    def __init__(self, iterable: Iterable[(Message | Dict)] = None) -> None:
+        messages = [_validate_message(m) for m in iterable or ()]
+        self._spans: Tuple[_Span, ...] = ()
+        self._len = 0
+        self._owned: Optional[_Chunk] = None
+        if messages:
+            self._add_chunk(messages)
+
+    @classmethod
+    def _from_spans(cls, spans: Tuple[_Span, ...]) -> "PersistentMessageQueue":
+        queue = cls.__new__(cls)
+        queue._spans = tuple(spans)
+        queue._len = sum(stop - start for _, start, stop in spans)
+        queue._owned = None
+        if len(queue._spans) > cls.max_spans:
+            queue._flatten()
+        return queue
+
+    @classmethod
+    def _from_trusted(cls, messages: Iterable[Message]) -> "PersistentMessageQueue":
+        messages = list(messages)
+        if not messages:
+            return cls._from_spans(())
+        queue = cls._from_spans(((cls._chunk_type(messages), 0, len(messages)),))
+        queue._owned = queue._spans[0][0]
+        return queue
+
+    def _trusted_messages(self, other) -> List[Message]:
+        """
+        Messages from another queue are already validated, anything else is
+        validated here.
+        """
+        if isinstance(other, (MessageQueue, PersistentMessageQueue)):
+            return list(other)
+        return [_validate_message(m) for m in other]
+
+    # Storage
+
+    def _add_chunk(self, messages: List[Message]) -> None:
+        chunk = self._chunk_type(messages)
+        self._spans = self._spans + ((chunk, 0, len(messages)),)
+        self._len += len(messages)
+        self._owned = chunk
+        self._merge_tail()
+
+    def _merge_tail(self) -> None:
+        """
+        Merge small trailing spans so repeated forks keep O(log n) spans.
+        """
+        spans = list(self._spans)
+        while len(spans) >= 2:
+            (c1, s1, e1), (c2, s2, e2) = spans[-2], spans[-1]
+            if e1 - s1 > 2 * (e2 - s2):
+                break
+            chunk = self._chunk_type(c1.messages[s1:e1] + c2.messages[s2:e2])
+            spans[-2:] = [(chunk, 0, len(chunk.messages))]
+            self._owned = chunk
+        self._spans = tuple(spans)
+        if len(self._spans) > self.max_spans:
+            self._flatten()
+
+    def _flatten(self) -> None:
+        chunk = self._chunk_type(list(self))
+        self._spans = ((chunk, 0, len(chunk.messages)),) if chunk.messages else ()
+        self._owned = chunk
+
+    # Mutation
+
+    def append(self, message: (Message | Dict)) -> None:
+        self.extend([message])
+
+    def extend(self, messages: Iterable[(Message | Dict)]) -> None:
+        self._extend_trusted(self._trusted_messages(messages))
+
+    def _extend_trusted(self, messages: Iterable[Message]) -> None:
+        messages = list(messages)
+        if not messages:
+            return
+
+        if self._spans:
+            chunk, start, stop = self._spans[-1]
+            if chunk is self._owned and stop == len(chunk.messages):
+                chunk.messages.extend(messages)
+                self._spans = self._spans[:-1] + ((chunk, start, stop + len(messages)),)
+                self._len += len(messages)
+                return
+        self._add_chunk(messages)
+
+    def appendleft(self, message: (Message | Dict)) -> None:
+        message = _validate_message(message)
+        self._spans = ((self._chunk_type([message]), 0, 1),) + self._spans
+        self._len += 1
+        if len(self._spans) > self.max_spans:
+            self._flatten()
+
+    def pop(self) -> Message:
+        if not self._spans:
+            raise IndexError("pop from an empty PersistentMessageQueue")
+        chunk, start, stop = self._spans[-1]
+        message = chunk.messages[stop - 1]
+        if stop - 1 > start:
+            self._spans = self._spans[:-1] + ((chunk, start, stop - 1),)
+        else:
+            self._spans = self._spans[:-1]
+        self._len -= 1
+        return message
+
+    def popleft(self) -> Message:
+        if not self._spans:
+            raise IndexError("pop from an empty PersistentMessageQueue")
+        chunk, start, stop = self._spans[0]
+        message = chunk.messages[start]
+        if start + 1 < stop:
+            self._spans = ((chunk, start + 1, stop),) + self._spans[1:]
+        else:
+            self._spans = self._spans[1:]
+        self._len -= 1
+        return message
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+    # Views
+
+    def copy(self) -> "PersistentMessageQueue":
+        """
+        Create an O(1) snapshot of the queue.
+
+        # Return
+        A new PersistentMessageQueue sharing storage with the original.
+        """
+        return self._from_spans(self._spans)
+
+    def __copy__(self):
+        return self.copy()
+
+    def __add__(self, other):
+        if isinstance(other, PersistentMessageQueue):
+            return self._from_spans(self._spans + other._spans)
+        result = self.copy()
+        result.extend(other)
+        return result
+
+    def _slice(self, start: int, stop: int) -> "PersistentMessageQueue":
+        spans = []
+        offset = 0
+        for chunk, s, e in self._spans:
+            length = e - s
+            lo, hi = max(start - offset, 0), min(stop - offset, length)
+            if lo < hi:
+                spans.append((chunk, s + lo, s + hi))
+            offset += length
+            if offset >= stop:
+                break
+        return self._from_spans(tuple(spans))
+
+    def get_last_n_tokens(
+        self, n, exclude_types: Tuple[Type] = ()
+    ) -> "PersistentMessageQueue":
+        """
+        Return the most recent messages, up to a total token count of n.
+
+        # Return
+        PersistentMessageQueue view of messages whose total token count is less
+        than n.
+        """
+        if exclude_types:
+            result = []
+            current_token_sum = 0
+            for message in reversed(self):
+                if isinstance(message, exclude_types):
+                    continue
+
+                if current_token_sum + message.token_count > n:
+                    break
+                current_token_sum += message.token_count
+                result.append(message)
+            return self._from_spans(
+                ((self._chunk_type(result[::-1]), 0, len(result)),)
+            )
+
+        spans = []
+        remaining = n
+        for chunk, start, stop in reversed(self._spans):
+            span_tokens = chunk.token_sum(start, stop)
+            if span_tokens <= remaining:
+                spans.append((chunk, start, stop))
+                remaining -= span_tokens
+                continue
+            cut = chunk.tail_start(start, stop, remaining)
+            if cut < stop:
+                spans.append((chunk, cut, stop))
+            break
+        return self._from_spans(tuple(reversed(spans)))
+
+    def get_last_n_messages(
+        self, n, exclude_types: Tuple[Type] = ()
+    ) -> "PersistentMessageQueue":
+        """
+        Return the most recent n messages
+
+        # Return
+        PersistentMessageQueue view of the messages
+        """
+        if not exclude_types:
+            return self._slice(max(self._len - n, 0), self._len)
+
+        result = []
+        for message in reversed(self):
+            if isinstance(message, exclude_types):
+                continue
+
+            if len(result) >= n:
+                break
+            result.append(message)
+        return self._from_spans(
+            ((self._chunk_type(result[::-1]), 0, len(result)),)
+        )
+
+    @property
+    def token_count(self) -> int:
+        return sum(chunk.token_sum(start, stop) for chunk, start, stop in self._spans)
+
+    # Sequence
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(self._len)
+            if step != 1:
+                return list(self)[i]
+            return self._slice(start, stop)
+
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError("PersistentMessageQueue index out of range")
+        for chunk, start, stop in self._spans:
+            if i < stop - start:
+                return chunk.messages[start + i]
+            i -= stop - start
+
+    def __iter__(self):
+        for chunk, start, stop in self._spans:
+            messages = chunk.messages
+            for i in range(start, stop):
+                yield messages[i]
+
+    def __reversed__(self):
+        for chunk, start, stop in reversed(self._spans):
+            messages = chunk.messages
+            for i in range(stop - 1, start - 1, -1):
+                yield messages[i]
+
+    def __reduce__(self):
+        return self.__class__, (list(self),)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({len(self)} items)"
+
+    def __eq__(self, __value: object) -> bool:
+        if isinstance(__value, (MessageQueue, PersistentMessageQueue)):
+            return len(self) == len(__value) and list(self) == list(__value)
+        return NotImplemented
+
+    __hash__ = None
+
+
+class CompactMessageQueue(PersistentMessageQueue):
+    """
+    A PersistentMessageQueue whose chunks use columnar MessageColumns storage.
+
+    Senders and message types are interned, token counts are kept in an
+    array('I') and contents are kept as-is, so large pools of idle conversations
+    hold far less memory than one pydantic object per message. Messages are
+    materialized lazily, without validation, each time they are accessed.
+
+    Args:
+        iterable (Iterable[Message | Dict], optional): The initial messages.
+    """
+
+    _chunk_type: Type[_Chunk] = _CompactChunk
@@ -0,0 +1,331 @@
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+import hashlib
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import tiktoken
+
+DEFAULT_MODEL = "gpt-4"
+FALLBACK_ENCODING = "cl100k_base"
+DEFAULT_BATCH_THREADS = 8
+DEFAULT_CACHE_SIZE = 4096
+DEFAULT_CACHE_MIN_LENGTH = 512
+
+_lazy_default = False
+_lazy_override: ContextVar[Optional[bool]] = ContextVar(
+    "chatmancy_lazy_token_counts", default=None
+)
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+class TokenCountCache:
+    """
+    A bounded, thread-safe LRU cache of token counts.
+
+    Entries are keyed by encoding name and a hash of the content, so repeated
+    prompts (system prompts, context messages, static history) are only
+    encoded once.
+
+    Texts shorter than min_length are not cached unless a caller asks, so a
+    stream of unique, short messages does not evict the repeated prompts.
+    Short texts are cheap to encode again. Callers that count the same text
+    every turn, such as system prompts and context messages, pass cache=True.
+
+    Args:
+        maxsize (int): The maximum number of cached counts. Defaults to 4096.
+        enabled (bool): Whether the cache is used. Defaults to True.
+        min_length (int): The shortest text, in characters, cached by default.
+            Defaults to 512.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = DEFAULT_CACHE_SIZE,
+        enabled: bool = True,
+        min_length: int = DEFAULT_CACHE_MIN_LENGTH,
+    ):
+        if not isinstance(maxsize, int) or maxsize < 0:
+            raise ValueError(f"maxsize must be a non-negative int, not {maxsize}")
+        self.maxsize = maxsize
+        self.enabled = enabled
+        self.min_length = min_length
+        self.hits = 0
+        self.misses = 0
+        self._counts: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def admits(self, text: str, cache: Optional[bool] = None) -> bool:
+        """
+        Whether a text's count is cached: always if cache is True, never if it
+        is False or the cache is disabled, and otherwise if the text is at
+        least min_length characters long.
+        """
+        if not self.enabled or cache is False:
+            return False
+        return cache is True or len(text) >= self.min_length
+
+    @staticmethod
+    def make_key(encoding_name: str, text: str) -> Tuple[str, bytes]:
+        digest = hashlib.blake2b(
+            text.encode("utf-8", "surrogatepass"), digest_size=16
+        ).digest()
+        return encoding_name, digest
+
+    def get(self, key: Tuple[str, bytes]) -> Optional[int]:
+        """
+        Get a cached count, recording a hit or miss.
+
+        Returns:
+            Optional[int]: The cached count, or None if missing or disabled.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            count = self._counts.get(key)
+            if count is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._counts.move_to_end(key)
+            return count
+
+    def set(self, key: Tuple[str, bytes], count: int) -> None:
+        if not self.enabled or self.maxsize == 0:
+            return
+        with self._lock:
+            self._counts[key] = count
+            self._counts.move_to_end(key)
+            while len(self._counts) > self.maxsize:
+                self._counts.popitem(last=False)
+
+    def resize(self, maxsize: int) -> None:
+        """Change the maximum size, evicting the oldest entries if needed."""
+        if not isinstance(maxsize, int) or maxsize < 0:
+            raise ValueError(f"maxsize must be a non-negative int, not {maxsize}")
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._counts) > maxsize:
+                self._counts.popitem(last=False)
+
+    def cache_info(self) -> CacheInfo:
+        """Report hits, misses, maxsize and current size."""
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._counts))
+
+    def clear(self) -> None:
+        """Drop all entries and reset the hit and miss counters."""
+        with self._lock:
+            self._counts.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+class TokenizerRegistry:
+    """
+    Process-wide registry of tiktoken encoders.
+
+    Encoders are resolved once per model and shared between threads, so token
+    counting does not repeat the model to encoding lookup on every message.
+
+    Args:
+        default_model (str): The model used when no model is given.
+        cache (TokenCountCache, optional): The cache of token counts. Defaults to
+            a new TokenCountCache.
+    """
+
+    def __init__(
+        self, default_model: str = DEFAULT_MODEL, cache: TokenCountCache = None
+    ) -> None:
+        self.default_model = default_model
+        self.cache = cache if cache is not None else TokenCountCache()
+        self._encodings: Dict[str, tiktoken.Encoding] = {}
+        self._lock = threading.Lock()
+
+    def get_encoding(self, model: Optional[str] = None) -> tiktoken.Encoding:
+        """
+        Get the encoder for a model, resolving it on first use.
+
+        Args:
+            model (str, optional): The model name. Defaults to the registry default.
+
+        Returns:
+            tiktoken.Encoding: The shared encoder for the model.
+        """
+        model = model or self.default_model
+        encoding = self._encodings.get(model)
+        if encoding is not None:
+            return encoding
+
+        with self._lock:
+            encoding = self._encodings.get(model)
+            if encoding is None:
+                encoding = self._resolve_encoding(model)
+                self._encodings[model] = encoding
+        return encoding
+
+    @staticmethod
+    def _resolve_encoding(model: str) -> tiktoken.Encoding:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            # Unknown models (fine-tunes, new releases) use the GPT-4 family encoding
+            return tiktoken.get_encoding(FALLBACK_ENCODING)
+
+    def count_tokens(
+        self, text: str, model: Optional[str] = None, cache: Optional[bool] = None
+    ) -> int:
+        """
+        Count the tokens in a string.
+
+        Args:
+            text (str): The text to encode.
+            model (str, optional): The model whose encoding should be used.
+            cache (bool, optional): Whether to cache the count. Defaults to
+                caching texts of at least the cache's min_length.
+
+        Returns:
+            int: The number of tokens in the text.
+        """
+        encoding = self.get_encoding(model)
+        if not self.cache.admits(text, cache):
+            return len(encoding.encode(text, disallowed_special=()))
+
+        key = self.cache.make_key(encoding.name, text)
+        count = self.cache.get(key)
+        if count is None:
+            count = len(encoding.encode(text, disallowed_special=()))
+            self.cache.set(key, count)
+        return count
+
+    def count_tokens_batch(
+        self,
+        texts: List[str],
+        model: Optional[str] = None,
+        num_threads: int = DEFAULT_BATCH_THREADS,
+        cache: Optional[bool] = None,
+    ) -> List[int]:
+        """
+        Count the tokens in many strings with a single batched encode.
+
+        Args:
+            texts (List[str]): The texts to encode.
+            model (str, optional): The model whose encoding should be used.
+            num_threads (int): Threads used by the encoder. Defaults to 8.
+            cache (bool, optional): Whether to cache the counts. Defaults to
+                caching texts of at least the cache's min_length.
+
+        Returns:
+            List[int]: The number of tokens in each text, in order.
+        """
+        if not texts:
+            return []
+        encoding = self.get_encoding(model)
+
+        # Only encode texts that are not already cached
+        keys = [
+            self.cache.make_key(encoding.name, text)
+            if self.cache.admits(text, cache)
+            else None
+            for text in texts
+        ]
+        counts = [None if key is None else self.cache.get(key) for key in keys]
+        missing = [i for i, count in enumerate(counts) if count is None]
+        if missing:
+            encoded = encoding.encode_batch(
+                [texts[i] for i in missing],
+                num_threads=num_threads,
+                disallowed_special=(),
+            )
+            for i, tokens in zip(missing, encoded):
+                counts[i] = len(tokens)
+                if keys[i] is not None:
+                    self.cache.set(keys[i], counts[i])
+        return counts
+
+    def clear(self) -> None:
+        """Drop all resolved encoders."""
+        with self._lock:
+            self._encodings.clear()
+
+
+registry = TokenizerRegistry()
+
+
+def get_encoding(model: Optional[str] = None) -> tiktoken.Encoding:
+    """Get the shared encoder for a model from the default registry."""
+    return registry.get_encoding(model)
+
+
+def count_tokens(
+    text: str, model: Optional[str] = None, cache: Optional[bool] = None
+) -> int:
+    """Count the tokens in a string using the default registry."""
+    return registry.count_tokens(text, model, cache)
+
+
+def configure_token_cache(
+    maxsize: int = None, enabled: bool = None, min_length: int = None
+) -> None:
+    """
+    Configure the token count cache of the default registry.
+
+    Args:
+        maxsize (int, optional): The new maximum number of cached counts.
+        enabled (bool, optional): Enable or disable the cache.
+        min_length (int, optional): The shortest text cached by default.
+    """
+    if maxsize is not None:
+        registry.cache.resize(maxsize)
+    if enabled is not None:
+        registry.cache.enabled = enabled
+    if min_length is not None:
+        registry.cache.min_length = min_length
+
+
+def token_cache_info() -> CacheInfo:
+    """Report the default registry's token count cache statistics."""
+    return registry.cache.cache_info()
+
+
+def count_tokens_batch(
+    texts: List[str],
+    model: Optional[str] = None,
+    num_threads: int = DEFAULT_BATCH_THREADS,
+    cache: Optional[bool] = None,
+) -> List[int]:
+    """Count the tokens in many strings using the default registry."""
+    return registry.count_tokens_batch(texts, model, num_threads, cache)
+
+
+def set_lazy_token_counts(enabled: bool) -> None:
+    """
+    Set whether Messages created without a token_count count their tokens
+    lazily, on first read of token_count, instead of at construction.
+    """
+    global _lazy_default
+    _lazy_default = bool(enabled)
+
+
+def is_lazy() -> bool:
+    """Report whether Messages are currently created with lazy token counts."""
+    override = _lazy_override.get()
+    return _lazy_default if override is None else override
+
+
+@contextmanager
+def lazy_token_counts(enabled: bool = True) -> Iterator[None]:
+    """
+    Enable (or disable) lazy token counting for Messages created in this block.
+    The setting is local to the current thread or task.
+
+    Args:
+        enabled (bool): Whether token counts are deferred. Defaults to True.
+    """
+    token = _lazy_override.set(enabled)
+    try:
+        yield
+    finally:
+        _lazy_override.reset(token)
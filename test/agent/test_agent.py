@@ -1,5 +1,7 @@
+import asyncio
+
 import pytest
-from unittest.mock import Mock
+from unittest.mock import AsyncMock, Mock
 from chatmancy.agent.base import Agent, TokenSettings
 from chatmancy.function.function_item import FunctionItem
 from chatmancy.function.function_message import _FunctionRequest, FunctionRequestMessage
@@ -127,3 +129,39 @@ def test_force_function_call():
         UserMessage("Hello", 1), history=history, context={}, function_item=func_item
     )
     assert function_request == mock_req_message
+
+
+def test_aget_response_message():
+    agent = MockAgent(
+        name="test_agent",
+        desc="test agent description",
+    )
+    agent.model_handler.aget_completion = AsyncMock(
+        return_value=AgentMessage("Hello", token_count=1)
+    )
+    history = MessageQueue()
+    response = asyncio.run(
+        agent.aget_response_message(UserMessage("Hello", 1), history=history)
+    )
+    assert response == AgentMessage("Hello", token_count=1, agent_name="test_agent")
+    agent.model_handler.get_completion.assert_not_called()
+
+
+def test_aforce_function_call():
+    agent = MockAgent(
+        name="test_agent",
+        desc="test agent description",
+    )
+
+    func_item = Mock(FunctionItem, token_count=1)
+    mock_req_message = Mock(FunctionRequestMessage, token_count=1)
+    agent.model_handler.acall_function = AsyncMock(return_value=mock_req_message)
+    function_request = asyncio.run(
+        agent.acall_function(
+            UserMessage("Hello", 1),
+            history=MessageQueue(),
+            context={},
+            function_item=func_item,
+        )
+    )
+    assert function_request == mock_req_message
@@ -0,0 +1,142 @@
+import asyncio
+import time
+
+import pytest
+
+from chatmancy.agent.cache import (
+    CachingModelHandler,
+    MemoryResponseStore,
+    SqliteResponseStore,
+)
+from chatmancy.agent.gpt.model import GPTModelHandler
+from chatmancy.agent.model import ModelHandler, request_hash
+from chatmancy.function import FunctionItem, FunctionRequestMessage
+from chatmancy.message import AgentMessage, MessageQueue, UserMessage
+
+
+class CountingModelHandler(ModelHandler):
+    def __init__(self, **kwargs):
+        super().__init__(max_tokens=100, **kwargs)
+        self.calls = 0
+
+    def get_completion(self, history, functions=None):
+        self.calls += 1
+        return AgentMessage(content=f"answer {self.calls}", token_count=7)
+
+    def call_function(self, history, function_item):
+        self.calls += 1
+        return FunctionRequestMessage(
+            requests=[
+                {"name": function_item.name, "args": {"x": [1]}, "id": "call_1"}
+            ],
+            token_count=5,
+        )
+
+
+@pytest.fixture
+def history():
+    return MessageQueue([UserMessage(content="What are your hours?", token_count=5)])
+
+
+@pytest.fixture
+def function_item():
+    return FunctionItem(
+        method=lambda x: x,
+        name="test_function",
+        description="test_function",
+        params={"x": {"type": "string", "description": "x"}},
+        token_count=10,
+    )
+
+
+def test_request_hash_ignores_key_order():
+    assert request_hash({"a": 1, "b": [1, 2]}) == request_hash({"b": [1, 2], "a": 1})
+    assert request_hash({"a": 1}) != request_hash({"a": 2})
+
+
+def test_caching_handler_returns_copies_with_token_counts(history):
+    handler = CachingModelHandler(CountingModelHandler())
+
+    first = handler.get_completion(history)
+    second = handler.get_completion(history.copy())
+
+    assert handler.handler.calls == 1
+    assert second == first
+    assert second is not first
+    assert second.token_count == 7
+    info = handler.cache_info()
+    assert (info.hits, info.misses, info.hit_rate, info.currsize) == (1, 1, 0.5, 1)
+
+
+def test_caching_handler_keys_on_history_and_functions(history, function_item):
+    handler = CachingModelHandler(CountingModelHandler())
+
+    handler.get_completion(history)
+    handler.get_completion(history, [function_item])
+    history.append(UserMessage(content="And on Sunday?", token_count=4))
+    handler.get_completion(history)
+
+    assert handler.handler.calls == 3
+    assert handler.cache_info().hits == 0
+
+
+def test_caching_handler_caches_function_calls(history, function_item):
+    handler = CachingModelHandler(CountingModelHandler())
+
+    first = handler.call_function(history, function_item)
+    first.requests[0].args["x"].append(2)
+    second = handler.call_function(history, function_item)
+
+    assert handler.handler.calls == 1
+    assert isinstance(second, FunctionRequestMessage)
+    assert second.requests[0].args == {"x": [1]}
+    assert second.token_count == 5
+
+
+def test_caching_handler_async_and_stream(history):
+    handler = CachingModelHandler(CountingModelHandler())
+
+    first = asyncio.run(handler.aget_completion(history))
+    items = list(handler.get_completion_stream(history))
+
+    assert items == [first.content, first]
+    assert handler.handler.calls == 1
+
+
+def test_memory_store_lru_and_ttl():
+    store = MemoryResponseStore(maxsize=2, ttl=0.05)
+    store.set("a", {"v": 1})
+    store.set("b", {"v": 2})
+    store.get("a")
+    store.set("c", {"v": 3})
+
+    assert store.get("b") is None
+    assert store.get("a") == {"v": 1}
+    time.sleep(0.06)
+    assert store.get("a") is None
+
+
+def test_sqlite_store_persists(tmp_path, history):
+    path = str(tmp_path / "responses.db")
+    handler = CachingModelHandler(CountingModelHandler(), SqliteResponseStore(path))
+    first = handler.get_completion(history)
+    handler.store.close()
+
+    handler = CachingModelHandler(CountingModelHandler(), SqliteResponseStore(path))
+    second = handler.get_completion(history)
+
+    assert handler.handler.calls == 0
+    assert second == first
+    assert len(handler.store) == 1
+
+
+def test_gpt_request_includes_tool_choice(history, function_item):
+    handler = GPTModelHandler(model="gpt-4", openai_client=object())
+
+    request = handler.function_call_request(history, function_item)
+
+    assert request["model"] == "gpt-4"
+    assert request["tool_choice"]["function"]["name"] == "test_function"
+    assert request_hash(request) != request_hash(
+        handler.completion_request(history, [function_item])
+    )
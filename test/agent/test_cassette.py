@@ -0,0 +1,208 @@
+import asyncio
+import json
+from unittest.mock import Mock
+
+from openai.types.chat import ChatCompletion
+import pytest
+
+from chatmancy.agent import FakeAgent
+from chatmancy.agent.gpt.cassette import (
+    CassetteWriter,
+    RecordingModelHandler,
+    ReplayMissError,
+    ReplayModelHandler,
+    load_sessions,
+    read_cassette,
+    replay_sessions,
+)
+from chatmancy.agent.gpt.model import GPTModelHandler
+from chatmancy.agent.model import request_hash
+from chatmancy.conversation import Conversation
+from chatmancy.function import FunctionItem, FunctionRequestMessage
+from chatmancy.message import AgentMessage, MessageQueue, UserMessage
+
+
+def _completion(content=None, tool_calls=None):
+    return ChatCompletion.model_validate(
+        {
+            "id": "chatcmpl-1",
+            "object": "chat.completion",
+            "created": 1700000000,
+            "model": "gpt-4",
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "tool_calls" if tool_calls else "stop",
+                    "message": {
+                        "role": "assistant",
+                        "content": content,
+                        "tool_calls": tool_calls,
+                    },
+                }
+            ],
+            "usage": {"prompt_tokens": 5, "completion_tokens": 3, "total_tokens": 8},
+        }
+    )
+
+
+def _gpt_handler(*completions):
+    client = Mock()
+    client.chat.completions.create.side_effect = list(completions)
+    return GPTModelHandler(model="gpt-4", openai_client=client)
+
+
+@pytest.fixture
+def history():
+    return MessageQueue([UserMessage(content="What are your hours?", token_count=5)])
+
+
+@pytest.fixture
+def function_item():
+    return FunctionItem(
+        method=lambda day: day,
+        name="get_hours",
+        description="Get opening hours",
+        params={"day": {"type": "string", "description": "The day"}},
+        token_count=10,
+    )
+
+
+def test_recording_round_trips_through_replay(tmp_path, history, function_item):
+    path = tmp_path / "cassette.jsonl"
+    tool_call = {
+        "id": "call_1",
+        "type": "function",
+        "function": {"name": "get_hours", "arguments": '{"day": "monday"}'},
+    }
+    handler = _gpt_handler(_completion("Nine to five."), _completion(None, [tool_call]))
+    with CassetteWriter(path) as writer:
+        recorder = RecordingModelHandler(handler, writer, session="s1")
+        answer = recorder.get_completion(history)
+        request = recorder.call_function(history, function_item)
+
+    entries = list(read_cassette(path))
+    assert [e["session"] for e in entries] == ["s1", "s1"]
+    assert entries[0]["key"] == request_hash(handler.completion_request(history))
+    assert entries[1]["request"]["tool_choice"]["function"]["name"] == "get_hours"
+
+    replay = ReplayModelHandler(path)
+    replayed = replay.get_completion(history)
+    assert isinstance(replayed, AgentMessage)
+    assert replayed.content == answer.content == "Nine to five."
+    replayed_request = replay.call_function(history, function_item)
+    assert isinstance(replayed_request, FunctionRequestMessage)
+    assert replayed_request.requests[0].args == request.requests[0].args
+    assert replay.hits == 2
+
+
+def test_cassette_writes_shared_messages_once(tmp_path, history):
+    path = tmp_path / "cassette.jsonl"
+    handler = _gpt_handler(_completion("one"), _completion("two"))
+    recorder = RecordingModelHandler(handler, str(path))
+    recorder.get_completion(history)
+    recorder.get_completion(history)
+    recorder.writer.close()
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    blobs = [r for r in records if r["t"] == "b"]
+    assert len(blobs) == 1
+    assert [r["c"]["choices"][0]["message"]["content"] for r in records[1:]] == [
+        "one",
+        "two",
+    ]
+
+    # Duplicate requests are answered in recorded order
+    replay = ReplayModelHandler(path)
+    assert replay.get_completion(history).content == "one"
+    assert replay.get_completion(history).content == "two"
+
+
+def test_recorder_closes_only_its_own_writer(tmp_path, history):
+    path = tmp_path / "cassette.jsonl"
+    with RecordingModelHandler(_gpt_handler(_completion("one")), path) as recorder:
+        recorder.get_completion(history)
+    assert recorder.writer._file.closed
+    assert len(list(read_cassette(path))) == 1
+
+    with CassetteWriter(path) as writer:
+        with RecordingModelHandler(_gpt_handler(_completion("two")), writer):
+            pass
+        assert not writer._file.closed
+
+
+def test_writer_appends_to_existing_cassette(tmp_path, history):
+    path = tmp_path / "cassette.jsonl"
+    for content in ("one", "two"):
+        with CassetteWriter(path) as writer:
+            recorder = RecordingModelHandler(_gpt_handler(_completion(content)), writer)
+            recorder.get_completion(history)
+
+    entries = list(read_cassette(path))
+    assert [e["response"]["choices"][0]["message"]["content"] for e in entries] == [
+        "one",
+        "two",
+    ]
+    assert sum(1 for line in path.read_text().splitlines() if '"t":"b"' in line) == 1
+
+
+def test_replay_miss_raises(tmp_path, history):
+    path = tmp_path / "cassette.jsonl"
+    CassetteWriter(path).close()
+    replay = ReplayModelHandler(path)
+
+    with pytest.raises(ReplayMissError):
+        replay.get_completion(history)
+    assert replay.misses == 1
+
+
+def test_replay_reproduces_latency(tmp_path, history):
+    request = GPTModelHandler(
+        model="gpt-4", openai_client=object()
+    ).completion_request(history)
+    entries = [
+        {
+            "key": request_hash(request),
+            "request": request,
+            "response": _completion("late").model_dump(mode="json"),
+            "latency": 0.2,
+            "session": None,
+        }
+    ]
+    replay = ReplayModelHandler(entries, replay_latency=True, latency_scale=0.5)
+    loop = asyncio.new_event_loop()
+    try:
+        start = loop.time()
+        response = loop.run_until_complete(replay.aget_completion(history))
+        elapsed = loop.time() - start
+    finally:
+        loop.close()
+
+    assert response.content == "late"
+    assert 0.09 <= elapsed < 0.2
+
+
+def test_replay_recorded_sessions(tmp_path):
+    path = tmp_path / "cassette.jsonl"
+    writer = CassetteWriter(path)
+    for session in range(3):
+        handler = _gpt_handler(_completion("First answer"), _completion("Second"))
+        agent = FakeAgent(
+            model_handler=RecordingModelHandler(handler, writer, session=str(session))
+        )
+        conversation = Conversation(agent)
+        conversation.send_message(f"Question {session}")
+        conversation.send_message("Follow up")
+    writer.close()
+
+    sessions = load_sessions(path)
+    assert [t["content"] for t in sessions["1"]] == ["Question 1", "Follow up"]
+
+    report = replay_sessions(
+        path,
+        lambda handler: Conversation(FakeAgent(model_handler=handler)),
+        concurrency=2,
+    )
+    assert report.sessions == 3
+    assert report.turns == 6
+    assert report.errors == 0
+    assert report.turn_p99 >= report.turn_p50
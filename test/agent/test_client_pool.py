@@ -0,0 +1,113 @@
+import asyncio
+from unittest.mock import Mock
+
+import httpx
+
+from chatmancy.agent.gpt.client import OpenAIClientPool
+from chatmancy.agent.gpt.model import AsyncGPTModelHandler, GPTModelHandler
+
+
+def test_pool_shares_clients_with_same_options():
+    pool = OpenAIClientPool()
+    factory = Mock(side_effect=lambda **kwargs: Mock())
+
+    a = pool.get_client(factory, api_key="key", base_url="http://a")
+    b = pool.get_client(factory, api_key="key", base_url="http://a")
+    c = pool.get_client(factory, api_key="other", base_url="http://a")
+    d = pool.get_client(factory, api_key="key", base_url="http://b")
+
+    assert a is b
+    assert a is not c and a is not d
+    assert factory.call_count == 3
+    assert len(pool) == 3
+
+
+def test_pool_does_not_share_custom_http_clients():
+    pool = OpenAIClientPool()
+    factory = Mock(side_effect=lambda **kwargs: Mock())
+    http_client = Mock()
+
+    a = pool.get_client(factory, api_key="key", http_client=http_client)
+    b = pool.get_client(factory, api_key="key", http_client=http_client)
+
+    assert a is not b
+    assert len(pool) == 0
+
+
+def test_pool_applies_configured_limits():
+    pool = OpenAIClientPool()
+    pool.configure(max_connections=10, keepalive_expiry=30)
+    factory = Mock()
+
+    pool.get_client(factory, httpx.Client, api_key="key")
+
+    http_client = factory.call_args[1]["http_client"]
+    assert isinstance(http_client, httpx.Client)
+    assert pool.limits.max_connections == 10
+    assert pool.limits.max_keepalive_connections == 20
+    assert pool.limits.keepalive_expiry == 30
+
+
+def test_handlers_share_pooled_client(monkeypatch):
+    monkeypatch.setattr(
+        "chatmancy.agent.gpt.model.OpenAI", Mock(side_effect=lambda **kw: Mock())
+    )
+    a = GPTModelHandler(model="gpt-4", api_key="key")
+    b = GPTModelHandler(model="gpt-3.5-turbo", api_key="key")
+    assert a._openai_client is b._openai_client
+
+
+def test_handler_uses_injected_client(monkeypatch):
+    factory = Mock()
+    monkeypatch.setattr("chatmancy.agent.gpt.model.OpenAI", factory)
+    client = Mock()
+    handler = GPTModelHandler(model="gpt-4", openai_client=client)
+    assert handler._openai_client is client
+    factory.assert_not_called()
+
+
+def test_handler_clients_leave_retries_to_scheduler(monkeypatch):
+    factory = Mock(side_effect=lambda **kw: Mock())
+    monkeypatch.setattr("chatmancy.agent.gpt.model.OpenAI", factory)
+
+    default = GPTModelHandler(model="gpt-4", api_key="key")
+    retrying = GPTModelHandler(model="gpt-4", api_key="key", max_retries=2)
+
+    assert factory.call_args_list[0].kwargs["max_retries"] == 0
+    assert factory.call_args_list[1].kwargs["max_retries"] == 2
+    assert default._openai_client is not retrying._openai_client
+
+
+def test_pool_shares_async_clients_per_event_loop():
+    pool = OpenAIClientPool()
+    factory = Mock(side_effect=lambda **kwargs: Mock())
+
+    async def get():
+        loop = asyncio.get_running_loop()
+        return (
+            pool.get_client(factory, api_key="key", loop=loop),
+            pool.get_client(factory, api_key="key", loop=loop),
+        )
+
+    first, again = asyncio.run(get())
+    second, _ = asyncio.run(get())
+
+    assert first is again
+    assert first is not second
+    assert factory.call_count == 2
+
+
+def test_async_handler_gets_a_client_for_each_loop(monkeypatch):
+    factory = Mock(side_effect=lambda **kw: Mock())
+    monkeypatch.setattr("chatmancy.agent.gpt.model.AsyncOpenAI", factory)
+    handler = AsyncGPTModelHandler(model="gpt-4", api_key="key")
+
+    async def get():
+        return handler._get_async_client(), handler._get_async_client()
+
+    first, again = asyncio.run(get())
+    second, _ = asyncio.run(get())
+
+    assert first is again
+    assert first is not second
+    assert factory.call_args.kwargs["max_retries"] == 0
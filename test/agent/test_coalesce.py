@@ -0,0 +1,106 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+import pytest
+
+from chatmancy.agent.coalesce import CoalescingModelHandler
+from chatmancy.agent.model import ModelHandler
+from chatmancy.function import FunctionRequestMessage
+from chatmancy.message import AgentMessage, MessageQueue, UserMessage
+
+
+class SlowModelHandler(ModelHandler):
+    def __init__(self, delay=0.1, error=None):
+        super().__init__(max_tokens=100)
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def get_completion(self, history, functions=None):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return AgentMessage(content=history[-1].content, token_count=3)
+
+    def call_function(self, history, function_item):
+        return FunctionRequestMessage(requests=[], token_count=0)
+
+    async def aget_completion(self, history, functions=None):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return AgentMessage(content=history[-1].content, token_count=3)
+
+
+def _history(content):
+    return MessageQueue([UserMessage(content=content, token_count=2)])
+
+
+def test_concurrent_identical_requests_share_one_call():
+    handler = CoalescingModelHandler(SlowModelHandler())
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        responses = list(
+            pool.map(lambda _: handler.get_completion(_history("hi")), range(8))
+        )
+
+    assert handler.handler.calls == 1
+    assert handler.coalesced == 7
+    assert all(r == responses[0] for r in responses)
+    assert len({id(r) for r in responses}) == 8
+    assert responses[0].token_count == 3
+
+
+def test_different_requests_are_not_coalesced():
+    handler = CoalescingModelHandler(SlowModelHandler(delay=0.05))
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(
+            pool.map(lambda i: handler.get_completion(_history(f"hi {i}")), range(4))
+        )
+
+    assert handler.handler.calls == 4
+    assert handler.coalesced == 0
+
+
+def test_sequential_requests_call_again():
+    handler = CoalescingModelHandler(SlowModelHandler(delay=0))
+
+    handler.get_completion(_history("hi"))
+    handler.get_completion(_history("hi"))
+
+    assert handler.handler.calls == 2
+
+
+def test_errors_are_shared():
+    handler = CoalescingModelHandler(SlowModelHandler(error=ValueError("boom")))
+
+    def call(_):
+        with pytest.raises(ValueError):
+            handler.get_completion(_history("hi"))
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(call, range(4)))
+
+    assert handler.handler.calls == 1
+    assert not handler._flights
+
+
+def test_async_identical_requests_share_one_call():
+    handler = CoalescingModelHandler(SlowModelHandler())
+
+    async def run():
+        return await asyncio.gather(
+            *(handler.aget_completion(_history("hi")) for _ in range(5))
+        )
+
+    responses = asyncio.run(run())
+
+    assert handler.handler.calls == 1
+    assert handler.coalesced == 4
+    assert len({id(r) for r in responses}) == 5
+    assert not handler._async_flights
@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+import pytest
+
+from chatmancy.agent.fake import (
+    FakeAgent,
+    FakeModelHandler,
+    FakeResponse,
+    lognormal_latency,
+)
+from chatmancy.conversation import Conversation
+from chatmancy.function import FunctionItem, FunctionRequestMessage
+from chatmancy.message import AgentMessage, MessageQueue, UserMessage
+
+
+@pytest.fixture
+def function_item():
+    return FunctionItem(
+        method=lambda city: f"Sunny in {city}",
+        name="get_weather",
+        description="Get the weather",
+        params={"city": {"type": "string", "description": "The city"}},
+        token_count=10,
+    )
+
+
+def test_fake_handler_follows_script_and_cycles():
+    handler = FakeModelHandler(["first", {"content": "second"}])
+    history = MessageQueue([UserMessage(content="hi", token_count=1)])
+
+    contents = [handler.get_completion(history).content for _ in range(3)]
+
+    assert contents == ["first", "second", "first"]
+    assert handler.calls == 3
+
+
+def test_fake_handler_records_usage():
+    handler = FakeModelHandler([FakeResponse(content="answer", completion_tokens=7)])
+    history = MessageQueue([UserMessage(content="hi", token_count=3)])
+
+    response = handler.get_completion(history)
+
+    assert response.token_count == 7
+    assert handler.usage == [
+        {"prompt_tokens": 3, "completion_tokens": 7, "total_tokens": 10}
+    ]
+
+
+def test_fake_handler_tool_calls(function_item):
+    handler = FakeModelHandler(
+        [{"tool_calls": [{"name": "get_weather", "args": {"city": "Paris"}}]}]
+    )
+
+    response = handler.get_completion(MessageQueue(), [function_item])
+    forced = handler.call_function(MessageQueue(), function_item)
+
+    assert isinstance(response, FunctionRequestMessage)
+    assert response.requests[0].args == {"city": "Paris"}
+    assert forced.requests[0].name == "get_weather"
+    assert response.requests[0].id != forced.requests[0].id
+
+
+def test_fake_handler_latency_is_seeded():
+    def sample(seed):
+        handler = FakeModelHandler(latency=lognormal_latency(0.01), seed=seed)
+        return [handler._sample_latency() for _ in range(5)]
+
+    assert sample(1) == sample(1)
+    assert sample(1) != sample(2)
+
+
+def test_fake_handler_async_latency():
+    handler = FakeModelHandler(latency=(0.05, 0.06))
+
+    start = time.perf_counter()
+    response = asyncio.run(handler.aget_completion(MessageQueue()))
+
+    assert time.perf_counter() - start >= 0.05
+    assert isinstance(response, AgentMessage)
+
+
+def test_fake_agent_in_conversation(function_item):
+    handler = FakeModelHandler(
+        [
+            {"tool_calls": [{"name": "get_weather", "args": {"city": "Paris"}}]},
+            "It is sunny in Paris.",
+        ]
+    )
+    conversation = Conversation(
+        FakeAgent(model_handler=handler),
+        history=MessageQueue([AgentMessage(content="Hello!", token_count=2)]),
+    )
+    conversation._create_functions = lambda *args: [function_item]
+
+    response = conversation.send_message(
+        UserMessage(content="Weather in Paris?", token_count=5)
+    )
+
+    assert response.content == "It is sunny in Paris."
+    assert handler.calls == 2
+    assert "Sunny in Paris" in [m.content for m in conversation.user_message_history]
@@ -1,5 +1,7 @@
+import asyncio
+
 import pytest
-from unittest.mock import Mock
+from unittest.mock import AsyncMock, Mock
 from chatmancy.function.function_item import FunctionItem
 from chatmancy.function.function_message import (
     _FunctionRequest,
@@ -10,8 +12,9 @@ from chatmancy.function.function_message import (
 from chatmancy.message import Message
 from chatmancy.agent.gpt import GPTAgent
 from chatmancy.agent.gpt.history import GPTHistoryManager
+from chatmancy.agent.gpt.model import AsyncGPTModelHandler, GPTModelHandler
 
-from openai.types.chat import ChatCompletion
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
 
 from chatmancy.message.message import AgentMessage, MessageQueue, UserMessage
 
@@ -343,3 +346,107 @@ def test_function_call(mock_openai_client):
         "type": "function",
         "function": {"name": "test_function"},
     }
+
+
+def test_agent_async_client(monkeypatch):
+    async_client = Mock()
+    monkeypatch.setattr(
+        "chatmancy.agent.gpt.model.AsyncOpenAI", Mock(return_value=async_client)
+    )
+    async_client.chat.completions.create = AsyncMock(
+        return_value=Mock(
+            spec=ChatCompletion,
+            choices=[Mock(message=Mock(content="Async response.", tool_calls=None))],
+            usage=Mock(completion_tokens=10),
+        )
+    )
+    agent = GPTAgent(
+        name="test_agent",
+        desc="This is a test agent.",
+        model="gpt-3.5-turbo",
+        async_client=True,
+    )
+    assert isinstance(agent.model_handler, AsyncGPTModelHandler)
+
+    response = asyncio.run(
+        agent.aget_response_message(
+            UserMessage(content="Hello", token_count=1), history=MessageQueue()
+        )
+    )
+    assert response.content == "Async response."
+    assert response.agent_name == "test_agent"
+    assert "messages" in async_client.chat.completions.create.call_args[1]
+    agent.model_handler._openai_client.chat.completions.create.assert_not_called()
+
+
+def _chunk(content=None, tool_calls=None, usage=None):
+    return ChatCompletionChunk.model_validate(
+        {
+            "id": "chunk",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "gpt-3.5-turbo",
+            "choices": (
+                [
+                    {
+                        "index": 0,
+                        "delta": {"content": content, "tool_calls": tool_calls},
+                        "finish_reason": None,
+                    }
+                ]
+                if usage is None
+                else []
+            ),
+            "usage": usage,
+        }
+    )
+
+
+USAGE = {"completion_tokens": 7, "prompt_tokens": 3, "total_tokens": 10}
+
+
+def test_model_handler_stream_content():
+    handler = GPTModelHandler(model="gpt-3.5-turbo", stream_usage=True)
+    handler._openai_client.chat.completions.create.return_value = iter(
+        [_chunk("Hel"), _chunk("lo!"), _chunk(usage=USAGE)]
+    )
+
+    items = list(handler.get_completion_stream(MessageQueue()))
+
+    assert items[:2] == ["Hel", "lo!"]
+    assert items[-1] == AgentMessage(content="Hello!", token_count=7)
+    call_args = handler._openai_client.chat.completions.create.call_args[1]
+    assert call_args["stream"] is True
+    assert call_args["stream_options"] == {"include_usage": True}
+
+
+def test_model_handler_stream_tool_calls():
+    handler = GPTModelHandler(model="gpt-3.5-turbo", stream_usage=True)
+    handler._openai_client.chat.completions.create.return_value = iter(
+        [
+            _chunk(
+                tool_calls=[
+                    {"index": 0, "id": "call_a", "function": {"name": "f_a"}},
+                ]
+            ),
+            _chunk(tool_calls=[{"index": 0, "function": {"arguments": '{"x": '}}]),
+            _chunk(
+                tool_calls=[
+                    {"index": 1, "id": "call_b", "function": {"name": "f_b"}},
+                    {"index": 0, "function": {"arguments": "1}"}},
+                ]
+            ),
+            _chunk(usage=USAGE),
+        ]
+    )
+
+    items = list(handler.get_completion_stream(MessageQueue()))
+
+    assert len(items) == 1
+    response = items[0]
+    assert isinstance(response, FunctionRequestMessage)
+    assert [(r.id, r.name, r.args) for r in response.requests] == [
+        ("call_a", "f_a", {"x": 1}),
+        ("call_b", "f_b", {}),
+    ]
+    assert response.token_count == 7
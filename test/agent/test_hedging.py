@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from chatmancy.agent.hedging import HedgingModelHandler
+from chatmancy.agent.model import ModelHandler
+from chatmancy.function import FunctionRequestMessage
+from chatmancy.message import AgentMessage, MessageQueue
+
+
+class ScriptedLatencyHandler(ModelHandler):
+    """Sleeps for the next scripted latency on each call."""
+
+    def __init__(self, latencies):
+        super().__init__(max_tokens=100)
+        self.latencies = list(latencies)
+        self.calls = 0
+        self.cancelled = 0
+        self._lock = threading.Lock()
+
+    def _next(self):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+            latency = self.latencies.pop(0) if self.latencies else 0.0
+        return call, latency
+
+    def get_completion(self, history, functions=None):
+        call, latency = self._next()
+        time.sleep(latency)
+        return AgentMessage(content=f"call {call}", token_count=2)
+
+    def call_function(self, history, function_item):
+        return FunctionRequestMessage(requests=[], token_count=0)
+
+    async def aget_completion(self, history, functions=None):
+        call, latency = self._next()
+        try:
+            await asyncio.sleep(latency)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return AgentMessage(content=f"call {call}", token_count=2)
+
+
+def test_fast_requests_are_not_hedged():
+    handler = HedgingModelHandler(
+        ScriptedLatencyHandler([0.0]), initial_delay=0.5, max_hedge_rate=1.0
+    )
+
+    response = handler.get_completion(MessageQueue())
+
+    assert response.content == "call 1"
+    assert handler.handler.calls == 1
+    assert handler.hedge_info().hedges == 0
+
+
+def test_slow_request_is_hedged_and_hedge_wins():
+    handler = HedgingModelHandler(
+        ScriptedLatencyHandler([1.0, 0.0]), initial_delay=0.05, max_hedge_rate=1.0
+    )
+
+    start = time.perf_counter()
+    response = handler.get_completion(MessageQueue())
+
+    assert time.perf_counter() - start < 0.5
+    assert response.content == "call 2"
+    info = handler.hedge_info()
+    assert (info.requests, info.hedges, info.hedge_wins) == (1, 1, 1)
+    assert info.hedge_rate == 1.0
+    assert info.win_rate == 1.0
+
+
+def test_hedge_latency_is_measured_from_request_start():
+    handler = HedgingModelHandler(
+        ScriptedLatencyHandler([1.0, 0.0]), initial_delay=0.1, max_hedge_rate=1.0
+    )
+
+    handler.get_completion(MessageQueue())
+
+    assert list(handler._latencies)[0] >= 0.1
+
+
+def test_requests_are_not_limited_by_workers():
+    handler = HedgingModelHandler(
+        ScriptedLatencyHandler([0.2] * 8),
+        initial_delay=1.0,
+        max_hedge_rate=0.0,
+        max_workers=1,
+    )
+    threads = [
+        threading.Thread(target=handler.get_completion, args=(MessageQueue(),))
+        for _ in range(8)
+    ]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert time.perf_counter() - start < 1.0
+    assert handler.hedge_info().requests == 8
+
+
+def test_hedge_rate_is_bounded():
+    handler = HedgingModelHandler(
+        ScriptedLatencyHandler([0.1] * 20), initial_delay=0.01, max_hedge_rate=0.5
+    )
+
+    for _ in range(4):
+        handler.get_completion(MessageQueue())
+
+    info = handler.hedge_info()
+    assert info.requests == 4
+    assert info.hedges == 2
+    assert handler.handler.calls <= 2 * info.requests
+
+
+def test_delay_uses_latency_percentile():
+    handler = HedgingModelHandler(
+        ScriptedLatencyHandler([]), percentile=50, min_samples=4
+    )
+    for latency in [0.1, 0.2, 0.3, 0.4]:
+        handler._record(latency)
+
+    assert handler.hedge_delay() == pytest.approx(0.2)
+
+
+def test_async_hedge_cancels_loser():
+    handler = HedgingModelHandler(
+        ScriptedLatencyHandler([1.0, 0.0]), initial_delay=0.05, max_hedge_rate=1.0
+    )
+
+    async def run():
+        response = await handler.aget_completion(MessageQueue())
+        await asyncio.sleep(0)
+        return response
+
+    response = asyncio.run(run())
+
+    assert response.content == "call 2"
+    assert handler.handler.cancelled == 1
+    assert handler.hedge_info().hedge_wins == 1
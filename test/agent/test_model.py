@@ -1,3 +1,5 @@
+import asyncio
+
 import pytest
 
 from chatmancy.agent.model import ModelHandler
@@ -50,3 +52,13 @@ def test_call_function(model_handler):
     )
     response = model_handler.call_function(history, function_item)
     assert isinstance(response, FunctionRequestMessage)
+
+
+def test_aget_completion_defaults_to_sync(model_handler):
+    completion = asyncio.run(model_handler.aget_completion(MessageQueue(), None))
+    assert completion == AgentMessage(content="test")
+
+
+def test_get_completion_stream_defaults_to_full_completion(model_handler):
+    items = list(model_handler.get_completion_stream(MessageQueue(), None))
+    assert items == ["test", AgentMessage(content="test")]
@@ -0,0 +1,147 @@
+import asyncio
+import threading
+import time
+
+import httpx
+from openai import APIConnectionError, APITimeoutError
+import pytest
+
+from chatmancy.agent.scheduler import (
+    Priority,
+    RateLimits,
+    RequestScheduler,
+    is_retryable,
+)
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+@pytest.fixture
+def scheduler():
+    return RequestScheduler(max_attempts=3, max_backoff=0.01)
+
+
+def test_is_retryable():
+    assert is_retryable(StatusError(429))
+    assert is_retryable(StatusError(503))
+    assert is_retryable(StatusError(408))
+    assert is_retryable(StatusError(409))
+    assert not is_retryable(StatusError(400))
+    assert not is_retryable(ValueError("boom"))
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    assert is_retryable(APIConnectionError(request=request))
+    assert is_retryable(APITimeoutError(request=request))
+
+
+def test_submit_retries_connection_errors(scheduler):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    attempts = []
+
+    def call():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise APIConnectionError(request=request)
+        return "ok"
+
+    assert scheduler.submit("gpt-4", 10, call) == "ok"
+    assert len(attempts) == 2
+    assert scheduler.retries == 1
+
+
+def test_submit_retries_rate_limits(scheduler):
+    attempts = []
+
+    def call():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise StatusError(429)
+        return "ok"
+
+    assert scheduler.submit("gpt-4", 10, call) == "ok"
+    assert len(attempts) == 3
+    assert scheduler.retries == 2
+
+
+def test_submit_does_not_retry_client_errors(scheduler):
+    attempts = []
+
+    def call():
+        attempts.append(1)
+        raise StatusError(400)
+
+    with pytest.raises(StatusError):
+        scheduler.submit("gpt-4", 10, call)
+    assert len(attempts) == 1
+
+
+def test_submit_gives_up_after_max_attempts(scheduler):
+    def call():
+        raise StatusError(500)
+
+    with pytest.raises(StatusError):
+        scheduler.submit("gpt-4", 10, call)
+    assert scheduler.retries == 2
+
+
+def test_token_budget_delays_calls():
+    # 600 tokens per minute refills 10 tokens per second
+    scheduler = RequestScheduler(limits={"gpt-4": RateLimits(tpm=600)})
+
+    start = time.perf_counter()
+    scheduler.submit("gpt-4", 600, lambda: None)
+    scheduler.submit("gpt-4", 2, lambda: None)
+
+    assert 0.15 < time.perf_counter() - start < 1.0
+
+
+def test_limits_are_per_model():
+    scheduler = RequestScheduler()
+    scheduler.set_limits("gpt-4", rpm=1)
+    scheduler.submit("gpt-4", 0, lambda: None)
+
+    start = time.perf_counter()
+    scheduler.submit("gpt-3.5-turbo", 0, lambda: None)
+
+    assert time.perf_counter() - start < 0.1
+
+
+def test_interactive_calls_go_first():
+    scheduler = RequestScheduler(limits={"gpt-4": RateLimits(rpm=600)})
+    # Use up the budget so the next calls have to wait
+    scheduler.acquire("gpt-4", 0)
+    scheduler._buckets[("gpt-4", "requests")].level = 0
+    order = []
+
+    def submit(name, priority):
+        scheduler.submit("gpt-4", 0, lambda: order.append(name), priority=priority)
+
+    background = threading.Thread(
+        target=submit, args=("background", Priority.BACKGROUND)
+    )
+    background.start()
+    time.sleep(0.02)
+    interactive = threading.Thread(
+        target=submit, args=("interactive", Priority.INTERACTIVE)
+    )
+    interactive.start()
+    background.join()
+    interactive.join()
+
+    assert order == ["interactive", "background"]
+
+
+def test_asubmit_retries(scheduler):
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        if len(attempts) < 2:
+            raise StatusError(502)
+        return "ok"
+
+    assert asyncio.run(scheduler.asubmit("gpt-4", 10, call)) == "ok"
+    assert len(attempts) == 2
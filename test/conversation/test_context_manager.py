@@ -1,3 +1,5 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import Mock, patch
 
 import pytest
@@ -5,8 +7,17 @@ from chatmancy.agent.gpt.agent import GPTAgent
 
 from chatmancy.conversation import (
     AgentContextManager,
+    ContextManager,
+    MultiItemAgentContextManager,
 )
 from chatmancy.conversation.context_manager import ContextItem
+from chatmancy.conversation.gating import (
+    AnyGate,
+    ClassifierGate,
+    GateInfo,
+    KeywordGate,
+    LengthGate,
+)
 from chatmancy.function.function_message import (
     _FunctionRequest,
     FunctionRequestMessage,
@@ -66,3 +77,188 @@ def test_agent_context_manager_get_context_updates(mock_agent):
 
     # Assert that the context_updates dictionary contains the expected values
     assert context_updates == {"item1": "value1"}
+
+
+def test_agent_context_manager_aget_context_updates(mock_agent):
+    ci = ContextItem(name="item1", description="item1", valid_values=["1a", "1b"])
+    context_manager = AgentContextManager(name="TestContextManager", context_item=ci)
+
+    mock_agent.acall_function.return_value = FunctionRequestMessage(
+        requests=[
+            _FunctionRequest(
+                name=context_manager.function_item.name,
+                args={"item1": "1a", "other": "ignored"},
+                id="1234",
+            )
+        ]
+    )
+
+    context_updates = asyncio.run(
+        context_manager.aget_context_updates(sample_history, sample_context)
+    )
+
+    mock_agent.acall_function.assert_awaited_once()
+    mock_agent.call_function.assert_not_called()
+    assert context_updates == {"item1": "1a"}
+
+
+def test_context_manager_async_defaults_to_sync():
+    class StaticContextManager(ContextManager):
+        def _get_context_updates(self, history, current_context):
+            return {"topic": "apples", "unregistered": "value"}
+
+    context_manager = StaticContextManager("static", keys=["topic"])
+    context_updates = asyncio.run(
+        context_manager.aget_context_updates(sample_history, sample_context)
+    )
+    assert context_updates == {"topic": "apples"}
+
+
+def test_context_manager_requires_get_context_updates():
+    class EmptyContextManager(ContextManager):
+        pass
+
+    with pytest.raises(TypeError):
+        EmptyContextManager("empty")
+
+
+def test_multi_item_context_manager_single_call(mock_agent):
+    items = [
+        ContextItem(name="restaurant", description="The restaurant"),
+        {"name": "city", "description": "The city", "valid_values": ["Paris", "Rome"]},
+        ContextItem(name="date", description="The date"),
+    ]
+    context_manager = MultiItemAgentContextManager(name="Trip", context_items=items)
+
+    function_item = context_manager.function_item
+    assert function_item.name == "update_context"
+    assert set(function_item.params) == {"restaurant", "city", "date"}
+    assert function_item.params["city"].enum == ["Paris", "Rome"]
+    assert function_item.required == []
+    assert context_manager.registered_keys == ["restaurant", "city", "date"]
+
+    mock_agent.call_function.return_value = FunctionRequestMessage(
+        requests=[
+            _FunctionRequest(
+                name="update_context",
+                args={"restaurant": "Chez Nous", "city": "Paris", "other": "x"},
+                id="1234",
+            )
+        ]
+    )
+
+    context_updates = context_manager.get_context_updates(
+        sample_history, sample_context
+    )
+
+    mock_agent.call_function.assert_called_once()
+    assert context_updates == {"restaurant": "Chez Nous", "city": "Paris"}
+
+
+def test_multi_item_context_manager_validates_items(mock_agent):
+    with pytest.raises(ValueError):
+        MultiItemAgentContextManager(name="Empty", context_items=[])
+    with pytest.raises(ValueError):
+        MultiItemAgentContextManager(
+            name="Duplicate",
+            context_items=[
+                ContextItem(name="city", description="The city"),
+                ContextItem(name="city", description="Another city"),
+            ],
+        )
+
+
+class CountingContextManager(ContextManager):
+    def __init__(self, **kwargs):
+        super().__init__("counting", keys=["city"], **kwargs)
+        self.calls = 0
+
+    def _get_context_updates(self, history, current_context):
+        self.calls += 1
+        return {"city": f"city{self.calls}"}
+
+
+def test_context_manager_gate_reuses_previous_updates():
+    context_manager = CountingContextManager(
+        gate=KeywordGate.from_context_items(
+            [ContextItem(name="city", description="", valid_values=["Paris"])]
+        )
+    )
+    history = [UserMessage("Let's go to Paris", token_count=1)]
+
+    # The first update always runs
+    assert context_manager.get_context_updates(history, {}) == {"city": "city1"}
+
+    history.append(UserMessage("thanks!", token_count=1))
+    assert context_manager.get_context_updates(history, {}) == {"city": "city1"}
+
+    history.append(UserMessage("Actually, not paris", token_count=1))
+    assert context_manager.get_context_updates(history, {}) == {"city": "city2"}
+
+    assert context_manager.calls == 2
+    assert context_manager.gate_info() == GateInfo(hits=2, skips=1)
+
+
+def test_context_manager_length_and_classifier_gates():
+    classifier = Mock(return_value=False)
+    context_manager = CountingContextManager(
+        gate=AnyGate(LengthGate(min_chars=20), ClassifierGate(classifier))
+    )
+    history = [UserMessage("Hello", token_count=1)]
+    context_manager.get_context_updates(history, {})
+
+    # Short messages accumulate until they are long enough
+    history.append(UserMessage("ok", token_count=1))
+    context_manager.get_context_updates(history, {})
+    history.append(UserMessage("a somewhat longer message", token_count=1))
+    context_manager.get_context_updates(history, {})
+
+    assert context_manager.calls == 2
+    assert classifier.call_args_list[0][0][0] == [history[1]]
+
+
+def test_context_manager_async_gate():
+    context_manager = CountingContextManager(gate=LengthGate(min_chars=100))
+    history = [UserMessage("Hello", token_count=1)]
+    asyncio.run(context_manager.aget_context_updates(history, {}))
+    updates = asyncio.run(context_manager.aget_context_updates(history, {}))
+    assert updates == {"city": "city1"}
+    assert context_manager.gate_info() == GateInfo(hits=1, skips=1)
+
+
+def test_context_manager_gate_state_is_per_session():
+    context_manager = CountingContextManager(gate=LengthGate(min_chars=100))
+    first, second = Mock(), Mock()
+    history = [UserMessage("Hello", token_count=1)]
+
+    assert context_manager.get_context_updates(history, {}, session=first) == {
+        "city": "city1"
+    }
+    # A new session always runs, even with a history of the same length
+    assert context_manager.get_context_updates(history, {}, session=second) == {
+        "city": "city2"
+    }
+    assert context_manager.get_context_updates(history, {}, session=first) == {
+        "city": "city1"
+    }
+    assert context_manager.gate_info() == GateInfo(hits=2, skips=1)
+
+
+def test_context_manager_gate_is_thread_safe():
+    context_manager = CountingContextManager(gate=LengthGate(min_chars=100))
+    sessions = [Mock() for _ in range(8)]
+    history = [UserMessage("Hello", token_count=1)]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(
+            pool.map(
+                lambda i: context_manager.get_context_updates(
+                    history, {}, session=sessions[i % 8]
+                ),
+                range(64),
+            )
+        )
+
+    info = context_manager.gate_info()
+    assert info.hits + info.skips == 64
+    assert info.hits >= 8
@@ -1,15 +1,25 @@
+import asyncio
+import threading
+import time
+
 import pytest
 from unittest.mock import Mock
 
-from chatmancy.conversation import Conversation
+from chatmancy.conversation import (
+    Conversation,
+    ContextManager,
+    configure_context_executor,
+)
 from chatmancy.function.function_item import FunctionItem
 from chatmancy.function.function_message import (
     _FunctionRequest,
     FunctionRequestMessage,
+    FunctionResponseMessage,
 )
 from chatmancy.function.generator import FunctionItemGenerator
+from chatmancy.message import PersistentMessageQueue, count_tokens
 from chatmancy.message.message import AgentMessage, MessageQueue, UserMessage
-from chatmancy.agent import Agent
+from chatmancy.agent import Agent, FakeAgent, FakeModelHandler
 
 
 @pytest.fixture
@@ -23,6 +33,14 @@ def function_item():
     )
 
 
+def _mock_agent():
+    agent = Mock(Agent)
+    agent.count_tokens_batch.side_effect = lambda texts: [
+        count_tokens(text) for text in texts
+    ]
+    return agent
+
+
 def test_conversation_constructor_validation():
     args = {
         "main_agent": Mock(Agent),
@@ -88,6 +106,25 @@ def test_conversation_send_message():
     assert response == response_message
 
 
+def test_conversation_history_defaults_to_message_queue():
+    main_agent = Mock(Agent)
+    main_agent.get_response_message.return_value = AgentMessage(content="Hi")
+
+    default = Conversation(main_agent)
+    persistent = Conversation(
+        main_agent,
+        history=PersistentMessageQueue([AgentMessage(content="Hello!")]),
+    )
+    default.send_message("Hello, bot!")
+    persistent.send_message("Hello, bot!")
+
+    assert isinstance(default.user_message_history, MessageQueue)
+    assert isinstance(persistent.user_message_history, PersistentMessageQueue)
+    assert [m.content for m in persistent.user_message_history] == [
+        m.content for m in default.user_message_history
+    ]
+
+
 def test_conversation_send_str_message():
     # Create a mock main agent
     main_agent = Mock(Agent)
@@ -156,7 +193,7 @@ def test_conversation_create_functions(function_item):
 @pytest.mark.parametrize("auto_call", [True, False])
 def test_handle_function_request_message(auto_call):
     # Create a Conversation instance with the main agent
-    conversation = Conversation(Mock(Agent))
+    conversation = Conversation(_mock_agent())
 
     # Mock a  FunctionRequestMessage and item
     function_request_1 = _FunctionRequest(
@@ -176,6 +213,12 @@ def test_handle_function_request_message(auto_call):
         FunctionItem,
         auto_call=auto_call,
         call_method=lambda x: x,
+        method=lambda x: x,
+        timeout=None,
+        run_in_process=False,
+        cacheable=False,
+        cache_ttl=None,
+        max_response_tokens=None,
     )
     function_item.name = "test_function"
 
@@ -213,12 +256,18 @@ def test_auto_call_agent_requests():
     function_item = Mock(
         FunctionItem,
         auto_call=True,
+        method=lambda x: x,
+        timeout=None,
+        run_in_process=False,
+        cacheable=False,
+        cache_ttl=None,
+        max_response_tokens=None,
     )
     function_item.name = "test_function"
     function_item.call_method.return_value = "1"
 
     # Create a mock main agent
-    main_agent = Mock(Agent)
+    main_agent = _mock_agent()
     function_item_generator = Mock(FunctionItemGenerator)
     function_item_generator.generate_functions.return_value = [function_item]
     conversation = Conversation(
@@ -236,3 +285,513 @@ def test_auto_call_agent_requests():
     # Assert that the main agent's get_response_message method was called
     assert response == AgentMessage(content="I ran it!")
     function_item.call_method.assert_called_once_with(x=1)
+
+
+def test_conversation_asend_message_with_function_call():
+    function_request_message = FunctionRequestMessage(
+        requests=[
+            _FunctionRequest(name="test_function", args={"x": 1}, id="test1")
+        ]
+    )
+    function_item = Mock(
+        FunctionItem,
+        auto_call=True,
+        method=lambda x: x,
+        timeout=None,
+        run_in_process=False,
+        cacheable=False,
+        cache_ttl=None,
+        max_response_tokens=None,
+    )
+    function_item.name = "test_function"
+    function_item.call_method.return_value = "1"
+
+    main_agent = _mock_agent()
+    function_item_generator = Mock(FunctionItemGenerator)
+    function_item_generator.agenerate_functions.return_value = [function_item]
+    context_manager = Mock(ContextManager)
+    context_manager.aget_context_updates.return_value = {"key": "value"}
+    conversation = Conversation(
+        main_agent,
+        context_managers=[context_manager],
+        function_generators=[function_item_generator],
+    )
+
+    main_agent.aget_response_message.return_value = function_request_message
+    main_agent.agive_function_response.return_value = AgentMessage(
+        content="I ran it!"
+    )
+
+    response = asyncio.run(conversation.asend_message("Run a function"))
+
+    assert response == AgentMessage(content="I ran it!")
+    assert conversation.context == {"key": "value"}
+    function_item.call_method.assert_called_once_with(x=1)
+    main_agent.get_response_message.assert_not_called()
+    context_manager.get_context_updates.assert_not_called()
+
+
+def test_conversation_send_message_stream():
+    main_agent = Mock(Agent)
+    conversation = Conversation(main_agent)
+    response_message = AgentMessage(content="Hello, human!", token_count=4)
+    main_agent.get_response_message_stream.return_value = iter(
+        ["Hello, ", "human!", response_message]
+    )
+
+    items = list(conversation.send_message_stream("Hello, bot!"))
+
+    assert items == ["Hello, ", "human!", response_message]
+    assert conversation.user_message_history[-1] == response_message
+    main_agent.get_response_message.assert_not_called()
+
+
+def _context_manager(name, updates=None, delay=0.0, error=None):
+    def get_context_updates(history, current_context, session=None):
+        time.sleep(delay)
+        if error is not None:
+            raise error
+        return updates
+
+    context_manager = Mock(ContextManager)
+    context_manager.name = name
+    context_manager.get_context_updates.side_effect = get_context_updates
+    return context_manager
+
+
+def test_conversation_update_context_runs_managers_concurrently():
+    conversation = Conversation(Mock(Agent))
+    conversation.context_managers = [
+        _context_manager(f"cm{i}", {f"key{i}": "value"}, delay=0.2) for i in range(4)
+    ]
+
+    start = time.perf_counter()
+    conversation._update_context()
+
+    assert time.perf_counter() - start < 0.6
+    assert conversation.context == {f"key{i}": "value" for i in range(4)}
+
+
+def test_conversation_update_context_reuses_shared_threads():
+    threads = set()
+
+    def get_context_updates(history, current_context, session=None):
+        threads.add(threading.current_thread().name)
+        return {}
+
+    context_manager = Mock(ContextManager)
+    context_manager.name = "cm"
+    context_manager.get_context_updates.side_effect = get_context_updates
+    conversation = Conversation(Mock(Agent), context_managers=[context_manager])
+    for _ in range(5):
+        conversation._update_context()
+
+    assert threads
+    assert all(name.startswith("chatmancy-context") for name in threads)
+
+
+def test_conversation_update_context_isolates_failures_and_timeouts():
+    conversation = Conversation(Mock(Agent), context_timeout=0.1)
+    conversation.context_managers = [
+        _context_manager("slow", {"slow": "value"}, delay=1.0),
+        _context_manager("broken", error=ValueError("boom")),
+        _context_manager("ok", {"ok": "value"}),
+    ]
+
+    start = time.perf_counter()
+    conversation._update_context()
+
+    assert time.perf_counter() - start < 0.5
+    assert conversation.context == {"ok": "value"}
+
+
+def test_conversation_update_context_does_not_restart_timed_out_managers():
+    release = threading.Event()
+    calls = []
+
+    def get_context_updates(history, current_context, session=None):
+        calls.append(1)
+        release.wait(2.0)
+        return {"topic": "bananas"}
+
+    context_manager = Mock(ContextManager)
+    context_manager.name = "stuck"
+    context_manager.get_context_updates.side_effect = get_context_updates
+    conversation = Conversation(
+        Mock(Agent), context_managers=[context_manager], context_timeout=0.05
+    )
+
+    for _ in range(3):
+        conversation._update_context()
+    assert len(calls) == 1
+    assert conversation.context == {}
+
+    # Once the call returns its result is used, and the next turn starts anew
+    release.set()
+    conversation._update_context()
+    assert conversation.context == {"topic": "bananas"}
+    conversation._update_context()
+    assert len(calls) == 2
+
+
+def test_conversation_update_context_merge_is_ordered():
+    conversation = Conversation(Mock(Agent))
+    conversation.context_managers = [
+        _context_manager("first", {"topic": "apples"}, delay=0.1),
+        _context_manager("second", {"topic": "bananas"}),
+    ]
+
+    conversation._update_context()
+
+    assert conversation.context == {"topic": "bananas"}
+
+
+def test_conversation_aupdate_context_isolates_timeouts():
+    async def slow_updates(history, current_context, session=None):
+        await asyncio.sleep(1.0)
+        return {"slow": "value"}
+
+    slow = Mock(ContextManager)
+    slow.name = "slow"
+    slow.aget_context_updates.side_effect = slow_updates
+    ok = Mock(ContextManager)
+    ok.name = "ok"
+    ok.aget_context_updates.return_value = {"ok": "value"}
+
+    conversation = Conversation(
+        Mock(Agent), context_managers=[slow, ok], context_timeout=0.1
+    )
+    asyncio.run(conversation._aupdate_context())
+
+    assert conversation.context == {"ok": "value"}
+
+
+def test_conversation_invalid_context_mode():
+    with pytest.raises(ValueError):
+        Conversation(Mock(Agent), context_mode="eventually")
+
+
+def _speculative_conversation(updates, regenerate=True):
+    main_agent = Mock(Agent)
+    main_agent.get_response_message.side_effect = lambda *args, **kwargs: (
+        AgentMessage(content=f"context: {kwargs['context']}")
+    )
+    conversation = Conversation(
+        main_agent,
+        context_managers=[_context_manager("cm", updates, delay=0.1)],
+        context={"topic": "apples"},
+        context_mode="speculative",
+        regenerate_on_context_change=regenerate,
+    )
+    return conversation, main_agent
+
+
+def test_conversation_speculative_keeps_response_when_context_unchanged():
+    conversation, main_agent = _speculative_conversation({"topic": "apples"})
+
+    response = conversation.send_message("Hello, bot!")
+
+    main_agent.get_response_message.assert_called_once()
+    assert "apples" in response.content
+    assert conversation.last_context_changes == {}
+
+
+def test_conversation_speculative_regenerates_when_context_changes():
+    conversation, main_agent = _speculative_conversation({"topic": "bananas"})
+
+    response = conversation.send_message("Hello, bot!")
+
+    assert main_agent.get_response_message.call_count == 2
+    assert "bananas" in response.content
+    assert conversation.last_context_changes == {"topic": "bananas"}
+    assert len(conversation.user_message_history) == 3
+
+
+def test_conversation_speculative_without_regeneration_records_changes():
+    conversation, main_agent = _speculative_conversation(
+        {"topic": "bananas"}, regenerate=False
+    )
+
+    response = conversation.send_message("Hello, bot!")
+
+    main_agent.get_response_message.assert_called_once()
+    assert "apples" in response.content
+    assert conversation.context == {"topic": "bananas"}
+    assert conversation.last_context_changes == {"topic": "bananas"}
+
+
+def test_conversation_deferred_context_applies_next_turn():
+    main_agent = Mock(Agent)
+    main_agent.get_response_message.side_effect = lambda *args, **kwargs: (
+        AgentMessage(content=f"context: {kwargs['context']}")
+    )
+    conversation = Conversation(
+        main_agent,
+        context_managers=[_context_manager("cm", {"topic": "bananas"})],
+        context_mode="deferred",
+    )
+
+    first = conversation.send_message("Hello, bot!")
+    assert "bananas" not in first.content
+
+    second = conversation.send_message("Hello again!")
+    assert "bananas" in second.content
+    assert conversation.last_context_changes == {"topic": "bananas"}
+
+
+def test_conversation_deferred_context_shares_bounded_threads():
+    main_agent = Mock(Agent)
+    main_agent.get_response_message.return_value = AgentMessage(content="Hi")
+    configure_context_executor(2)
+    existing = set(threading.enumerate())
+    try:
+        conversations = [
+            Conversation(
+                main_agent,
+                context_managers=[_context_manager("cm", {"topic": "bananas"})],
+                context_mode="deferred",
+            )
+            for _ in range(10)
+        ]
+        for conversation in conversations:
+            conversation.send_message("Hello, bot!")
+        for conversation in conversations:
+            conversation.send_message("Hello again!")
+
+        assert all(c.context == {"topic": "bananas"} for c in conversations)
+        context_threads = [
+            t
+            for t in set(threading.enumerate()) - existing
+            if t.name.startswith("chatmancy-context")
+        ]
+        assert len(context_threads) <= 2
+    finally:
+        configure_context_executor(32)
+
+
+def test_configure_context_executor_validation():
+    with pytest.raises(ValueError):
+        configure_context_executor(0)
+
+
+def test_conversation_asend_message_deferred_context_applies_next_turn():
+    main_agent = Mock(Agent)
+    main_agent.aget_response_message.side_effect = lambda *args, **kwargs: (
+        AgentMessage(content=f"context: {kwargs['context']}")
+    )
+    context_manager = Mock(ContextManager)
+    context_manager.name = "cm"
+    context_manager.aget_context_updates.return_value = {"topic": "bananas"}
+    conversation = Conversation(
+        main_agent, context_managers=[context_manager], context_mode="deferred"
+    )
+
+    async def run():
+        first = await conversation.asend_message("Hello, bot!")
+        second = await conversation.asend_message("Hello again!")
+        await conversation._aapply_deferred_context()
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert "bananas" not in first.content
+    assert "bananas" in second.content
+
+
+def test_conversation_running_deferred_context_is_kept():
+    context_manager = Mock(ContextManager)
+    context_manager.name = "cm"
+    conversation = Conversation(
+        Mock(Agent), context_managers=[context_manager], context_mode="deferred"
+    )
+    # An update started by asend_message on a loop that is still running it
+    loop = asyncio.new_event_loop()
+    pending = loop.create_future()
+    conversation._pending_context = pending
+
+    conversation._apply_deferred_context()
+    conversation._start_deferred_context()
+
+    assert conversation._pending_context is pending
+    context_manager.get_context_updates.assert_not_called()
+
+    pending.set_result({"topic": "bananas"})
+    conversation._apply_deferred_context()
+    loop.close()
+
+    assert conversation.context == {"topic": "bananas"}
+
+
+def _tool_loop_conversation(agent_responses, **kwargs):
+    calls = []
+    lookup = FunctionItem(
+        method=lambda city: calls.append(city) or f"Sunny in {city}",
+        name="lookup",
+        description="Look up the weather",
+        params={"city": {"type": "string", "description": "The city"}},
+        token_count=10,
+    )
+
+    def request(call_id, *cities):
+        return FunctionRequestMessage(
+            requests=[
+                {"name": "lookup", "args": {"city": c}, "id": f"{call_id}_{c}"}
+                for c in cities
+            ],
+            token_count=5,
+        )
+
+    main_agent = _mock_agent()
+    main_agent.get_response_message.return_value = request("first", "Paris", "Rome")
+    main_agent.give_function_response.side_effect = [
+        request(f"round{i}", "Oslo") if response is None else response
+        for i, response in enumerate(agent_responses)
+    ]
+    function_item_generator = Mock(FunctionItemGenerator)
+    function_item_generator.generate_functions.return_value = [lookup]
+    conversation = Conversation(
+        main_agent, function_generators=[function_item_generator], **kwargs
+    )
+    return conversation, main_agent, calls
+
+
+def test_conversation_tool_loop_runs_until_agent_answers():
+    answer = AgentMessage(content="Sunny everywhere", token_count=3)
+    conversation, main_agent, calls = _tool_loop_conversation(
+        [None, answer], max_tool_rounds=5
+    )
+
+    response = conversation.send_message(UserMessage(content="Weather?"))
+
+    assert response == answer
+    assert sorted(calls[:2]) == ["Paris", "Rome"]
+    assert calls[2:] == ["Oslo"]
+    assert [r.functions for r in conversation.last_tool_rounds] == [
+        ["lookup", "lookup"],
+        ["lookup"],
+    ]
+    assert all(r.function_time >= 0 for r in conversation.last_tool_rounds)
+    # The second round's request is recorded before its results
+    history = list(conversation.user_message_history)
+    assert [type(m).__name__ for m in history[-4:]] == [
+        "FunctionResponseMessage",
+        "FunctionResponseMessage",
+        "FunctionRequestMessage",
+        "FunctionResponseMessage",
+    ]
+    _, kwargs = main_agent.give_function_response.call_args_list[0]
+    assert [f.name for f in kwargs["functions"]] == ["lookup"]
+
+
+def test_conversation_tool_loop_last_round_gets_no_functions():
+    answer = AgentMessage(content="Sunny", token_count=1)
+    conversation, main_agent, calls = _tool_loop_conversation(
+        [None, answer], max_tool_rounds=2
+    )
+
+    assert conversation.send_message(UserMessage(content="Weather?")) == answer
+    first, second = main_agent.give_function_response.call_args_list
+    assert first.kwargs["functions"] is not None
+    assert second.kwargs["functions"] is None
+
+
+def test_conversation_tool_loop_defaults_to_one_round():
+    answer = AgentMessage(content="Sunny", token_count=1)
+    conversation, main_agent, _ = _tool_loop_conversation([answer])
+
+    assert conversation.send_message(UserMessage(content="Weather?")) == answer
+    assert main_agent.give_function_response.call_args.kwargs["functions"] is None
+    assert len(conversation.last_tool_rounds) == 1
+
+
+def test_conversation_tool_loop_stops_at_token_budget():
+    answer = AgentMessage(content="Sunny", token_count=1)
+    # The first round's results fit, but not with the agent's next request
+    first_round_tokens = (
+        count_tokens("Sunny in Paris") + count_tokens("Sunny in Rome") + 5
+    )
+    conversation, main_agent, _ = _tool_loop_conversation(
+        [None, answer], max_tool_rounds=5, max_tool_tokens=first_round_tokens
+    )
+
+    conversation.send_message(UserMessage(content="Weather?"))
+    first, second = main_agent.give_function_response.call_args_list
+    assert first.kwargs["functions"] is not None
+    assert second.kwargs["functions"] is None
+    # Function responses are counted along with the agent's request
+    responses = [
+        m
+        for m in conversation.user_message_history
+        if isinstance(m, FunctionResponseMessage)
+    ]
+    assert conversation.last_tool_rounds[0].tokens == 5 + sum(
+        m.token_count for m in responses[:2]
+    )
+    assert all(m.token_count > 0 for m in responses)
+
+
+def test_conversation_atool_loop_runs_until_agent_answers():
+    answer = AgentMessage(content="Sunny everywhere", token_count=3)
+    conversation, main_agent, calls = _tool_loop_conversation(
+        [None, answer], max_tool_rounds=5
+    )
+    main_agent.aget_response_message.return_value = (
+        main_agent.get_response_message.return_value
+    )
+    main_agent.agive_function_response.side_effect = (
+        main_agent.give_function_response.side_effect
+    )
+    conversation.function_generators[0].agenerate_functions.return_value = (
+        conversation.function_generators[0].generate_functions.return_value
+    )
+
+    response = asyncio.run(conversation.asend_message(UserMessage(content="Hi")))
+
+    assert response == answer
+    assert len(calls) == 3
+    assert len(conversation.last_tool_rounds) == 2
+
+
+def test_conversation_tool_loop_trims_functions_every_round():
+    def item(name):
+        return FunctionItem(
+            method=lambda: name,
+            name=name,
+            description=name,
+            params={},
+            token_count=10,
+        )
+
+    model_handler = FakeModelHandler(
+        [
+            {"tool_calls": [{"name": "lookup"}]},
+            {"tool_calls": [{"name": "lookup"}]},
+            "Done",
+        ]
+    )
+    model_handler.get_completion = Mock(wraps=model_handler.get_completion)
+    agent = FakeAgent(
+        model_handler=model_handler, token_settings={"max_function_tokens": 10}
+    )
+    function_item_generator = Mock(FunctionItemGenerator)
+    function_item_generator.generate_functions.return_value = [
+        item("lookup"),
+        item("other"),
+    ]
+    conversation = Conversation(
+        agent, function_generators=[function_item_generator], max_tool_rounds=2
+    )
+
+    response = conversation.send_message(UserMessage(content="Look it up"))
+
+    assert response.content == "Done"
+    functions = [
+        call.kwargs["functions"] for call in model_handler.get_completion.call_args_list
+    ]
+    assert [[f.name for f in fs] for fs in functions[:2]] == [["lookup"], ["lookup"]]
+    assert functions[2] is None
+
+
+def test_conversation_invalid_max_tool_rounds():
+    with pytest.raises(ValueError):
+        Conversation(Mock(Agent), max_tool_rounds=0)
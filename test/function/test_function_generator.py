@@ -1,3 +1,5 @@
+import asyncio
+
 import pytest
 from chatmancy.message import Message, UserMessage, MessageQueue
 from chatmancy.function.generator import (
@@ -171,3 +173,35 @@ def test_subclassing():
 
     generator = TestGenerator()
     generator.generate_functions(None, None, None)
+
+
+def test_agenerate_sorted_functions():
+    functions = [
+        create_function_item("func_a", tags={"apple"}),
+        create_function_item("func_ab", tags={"apple", "banana"}),
+    ]
+
+    class TestGenerator(KeywordSortedMixin, StaticFunctionItemGenerator):
+        def __init__(self, functions: List[FunctionItem], **kwargs) -> None:
+            super().__init__(functions=functions, **kwargs)
+
+    generator = TestGenerator(functions)
+    input_message = UserMessage(content="I like apples and bananas!")
+
+    sorted_functions = asyncio.run(
+        generator.agenerate_functions(input_message, MessageQueue(), {})
+    )
+
+    assert [f.name for f in sorted_functions] == ["func_ab", "func_a"]
+
+
+def test_async_subclassing():
+    class TestGenerator(FunctionItemGenerator):
+        async def _agenerate_functions(
+            self, input_message: Message, history: MessageQueue, context: Dict[str, str]
+        ) -> List[FunctionItem]:
+            return [create_function_item("remote", tags=set())]
+
+    generator = TestGenerator()
+    functions = asyncio.run(generator.agenerate_functions(None, None, None))
+    assert functions[0].name == "remote"
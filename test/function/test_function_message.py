@@ -152,6 +152,36 @@ def test_create_response_mixed_approval(function_item_add):
             assert response.content == "Function send_email denied."
 
 
+def test_create_response_with_token_counter():
+    function_item = FunctionItem(
+        name="echo",
+        description="Echo the text",
+        params={"text": {"type": "string", "description": "The text"}},
+        method=lambda text: text,
+        token_count=10,
+    )
+    message = FunctionRequestMessage(
+        requests=[
+            _FunctionRequest(
+                name="echo",
+                args={"text": "<|endoftext|>"},
+                func_item=function_item,
+                id="1",
+            )
+        ]
+    )
+    batches = []
+
+    def token_counter(texts):
+        batches.append(texts)
+        return [len(text) for text in texts]
+
+    (response,) = message.create_responses(token_counter=token_counter)
+    assert response.content == "<|endoftext|>"
+    assert response.token_count == len("<|endoftext|>")
+    assert batches == [["<|endoftext|>"]]
+
+
 def test_create_response_empty():
     message = FunctionRequestMessage(requests=[])
     responses = message.create_responses()
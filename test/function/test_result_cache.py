@@ -0,0 +1,142 @@
+import asyncio
+import time
+
+import pytest
+
+from chatmancy.function import (
+    FunctionItem,
+    FunctionRequestMessage,
+    FunctionResultCache,
+    FunctionRuntime,
+)
+from chatmancy.function.function_message import _FunctionRequest
+
+
+@pytest.fixture
+def calls():
+    return []
+
+
+@pytest.fixture
+def lookup(calls):
+    return FunctionItem(
+        method=lambda city, days=1: calls.append((city, days)) or f"{city}: sunny",
+        name="lookup",
+        description="Look up the weather",
+        params={
+            "city": {"type": "string", "description": "The city"},
+            "days": {"type": "number", "description": "Days ahead"},
+        },
+        required=["city"],
+        cacheable=True,
+        token_count=10,
+    )
+
+
+@pytest.fixture
+def runtime():
+    runtime = FunctionRuntime(max_workers=2, cache=FunctionResultCache())
+    yield runtime
+    runtime.shutdown(wait=False)
+
+
+def test_cache_key_uses_canonical_args():
+    key = FunctionResultCache.make_key("lookup", {"city": "Paris", "days": 2.0})
+    assert key == FunctionResultCache.make_key("lookup", {"days": 2.0, "city": "Paris"})
+    assert key != FunctionResultCache.make_key("other", {"city": "Paris", "days": 2.0})
+
+
+def test_cacheable_results_run_once(runtime, lookup, calls):
+    first = runtime.run([(lookup, {"city": "Paris", "days": "2"})])
+    second = runtime.run([(lookup, {"days": 2.0, "city": "Paris"})])
+
+    assert first == second == ["Paris: sunny"]
+    assert calls == [("Paris", 2.0)]
+    info = runtime.cache.cache_info()["lookup"]
+    assert (info.hits, info.misses, info.hit_rate) == (1, 1, 0.5)
+
+
+def test_uncacheable_results_always_run(runtime, lookup, calls):
+    lookup.cacheable = False
+    runtime.run([(lookup, {"city": "Paris"})])
+    runtime.run([(lookup, {"city": "Paris"})])
+
+    assert len(calls) == 2
+    assert runtime.cache.cache_info() == {}
+
+
+def test_errors_are_not_cached(runtime):
+    attempts = []
+
+    def flaky(city):
+        attempts.append(city)
+        if len(attempts) == 1:
+            raise RuntimeError("unavailable")
+        return "ok"
+
+    item = FunctionItem(
+        method=flaky,
+        name="flaky",
+        description="flaky",
+        params={"city": {"type": "string", "description": "The city"}},
+        cacheable=True,
+        token_count=10,
+    )
+    assert runtime.run([(item, {"city": "Paris"})])[0].startswith("Error")
+    assert runtime.run([(item, {"city": "Paris"})]) == ["ok"]
+    assert runtime.run([(item, {"city": "Paris"})]) == ["ok"]
+    assert len(attempts) == 2
+
+
+def test_cache_ttl_expires_results(runtime, lookup, calls):
+    lookup.cacheable = False
+    lookup.cache_ttl = 0.05
+    runtime.run([(lookup, {"city": "Paris"})])
+    runtime.run([(lookup, {"city": "Paris"})])
+    time.sleep(0.06)
+    runtime.run([(lookup, {"city": "Paris"})])
+
+    assert len(calls) == 2
+
+
+def test_cache_is_lru():
+    cache = FunctionResultCache(maxsize=2)
+    for key in ("a", "b"):
+        cache.set(key, key)
+    cache.get("f", "a")
+    cache.set("c", "c")
+
+    assert cache.get("f", "b") is None
+    assert cache.get("f", "a") == "a"
+    assert len(cache) == 2
+
+
+def test_cache_shares_results_through_database(tmp_path):
+    path = str(tmp_path / "results.db")
+    writer = FunctionResultCache(path=path)
+    writer.set("key", "shared", ttl=60)
+    reader = FunctionResultCache(path=path)
+
+    assert reader.get("lookup", "key") == "shared"
+    writer.close()
+    reader.close()
+
+
+def test_async_calls_use_cache(runtime, lookup, calls):
+    async def run():
+        await runtime.arun([(lookup, {"city": "Rome"})])
+        return await runtime.arun([(lookup, {"city": "Rome"})])
+
+    assert asyncio.run(run()) == ["Rome: sunny"]
+    assert len(calls) == 1
+
+
+def test_function_to_response_uses_cache(runtime, lookup, calls):
+    request = _FunctionRequest(
+        name="lookup", args={"city": "Oslo"}, func_item=lookup, id="1"
+    )
+    FunctionRequestMessage._function_to_response(request, runtime=runtime)
+    response = FunctionRequestMessage._function_to_response(request, runtime=runtime)
+
+    assert response.content == "Oslo: sunny"
+    assert len(calls) == 1
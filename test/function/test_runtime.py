@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from chatmancy.function import FunctionItem, FunctionRequestMessage, FunctionRuntime
+from chatmancy.function.function_message import _FunctionRequest
+
+
+def _function_item(method, name="test_function", **kwargs):
+    return FunctionItem(
+        method=method,
+        name=name,
+        description=name,
+        params={"x": {"type": "number", "description": "x"}},
+        token_count=10,
+        **kwargs,
+    )
+
+
+@pytest.fixture
+def runtime():
+    runtime = FunctionRuntime(max_workers=4)
+    yield runtime
+    runtime.shutdown(wait=False)
+
+
+def test_run_returns_results_in_order(runtime):
+    double = _function_item(lambda x: x * 2, name="double")
+    results = runtime.run([(double, {"x": 1}), (double, {"x": "2"})])
+    assert results == ["2", "4.0"]
+    assert runtime.function_stats()["double"].calls == 2
+
+
+def test_run_returns_errors_as_content(runtime):
+    def fail(x):
+        raise RuntimeError("broken")
+
+    results = runtime.run(
+        [(_function_item(fail), {"x": 1}), (_function_item(fail), {"y": 1})]
+    )
+    assert results[0] == "Error running function test_function: broken"
+    assert results[1].startswith("Error running function test_function: Invalid")
+    assert runtime.function_stats()["test_function"].errors == 2
+
+
+def test_run_reuses_persistent_threads(runtime):
+    names = runtime.run(
+        [(_function_item(lambda x: threading.current_thread().name), {"x": 1})] * 8
+    )
+    names += runtime.run(
+        [(_function_item(lambda x: threading.current_thread().name), {"x": 1})] * 8
+    )
+    assert all(name.startswith("chatmancy-function") for name in names)
+    assert len(set(names)) <= 4
+
+
+def test_run_times_out_hung_function(runtime):
+    release = threading.Event()
+    hung = _function_item(lambda x: release.wait(5), name="hung", timeout=0.05)
+    quick = _function_item(lambda x: x, name="quick")
+
+    start = time.monotonic()
+    results = runtime.run([(hung, {"x": 1}), (quick, {"x": 1})])
+    release.set()
+
+    assert time.monotonic() - start < 1
+    assert results == [
+        "Error running function hung: timed out after 0.05 seconds",
+        "1",
+    ]
+    assert runtime.function_stats()["hung"].timeouts == 1
+
+
+def test_run_awaits_async_methods(runtime):
+    async def double(x):
+        await asyncio.sleep(0)
+        return x * 2
+
+    assert runtime.run([(_function_item(double), {"x": 3})]) == ["6"]
+
+
+def test_arun_cancels_timed_out_async_methods(runtime):
+    cancelled = []
+
+    async def hang(x):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(x)
+            raise
+
+    runtime.configure(default_timeout=0.05)
+    results = asyncio.run(runtime.arun([(_function_item(hang), {"x": 1})]))
+
+    assert results == [
+        "Error running function test_function: timed out after 0.05 seconds"
+    ]
+    assert cancelled == [1]
+
+
+def test_arun_runs_calls_concurrently(runtime):
+    async def slow(x):
+        await asyncio.sleep(0.1)
+        return x
+
+    start = time.monotonic()
+    results = asyncio.run(
+        runtime.arun([(_function_item(slow), {"x": i}) for i in range(10)])
+    )
+    assert results == [str(i) for i in range(10)]
+    assert time.monotonic() - start < 0.5
+
+
+def test_run_in_process(runtime):
+    item = _function_item(lambda x: __import__("os").getpid(), run_in_process=True)
+    (pid,) = runtime.run([(item, {"x": 1})])
+    assert pid != str(__import__("os").getpid())
+
+
+def test_create_responses_uses_runtime(runtime):
+    item = _function_item(lambda x: x + 1)
+    message = FunctionRequestMessage(
+        requests=[
+            _FunctionRequest(name=item.name, args={"x": 1}, func_item=item, id="1")
+        ]
+    )
+
+    responses = message.create_responses(runtime=runtime)
+    assert [r.content for r in responses] == ["2"]
+    responses = asyncio.run(message.acreate_responses(runtime=runtime))
+    assert [r.content for r in responses] == ["2"]
+    assert runtime.function_stats()[item.name].calls == 2
@@ -0,0 +1,140 @@
+import json
+
+import pytest
+
+from chatmancy.function import FunctionItem, FunctionRequestMessage
+from chatmancy.function.function_message import _FunctionRequest
+from chatmancy.function.truncation import _sizes, truncate_response
+from chatmancy.message import count_tokens, token_cache_info
+
+LONG_TEXT = " ".join(f"word{i}" for i in range(400))
+
+
+def test_short_responses_are_unchanged():
+    content, token_count = truncate_response("short", 100)
+    assert content == "short"
+    assert token_count == count_tokens("short")
+
+
+@pytest.mark.parametrize("policy", ["head", "tail", "head_tail"])
+def test_text_truncation_fits_budget(policy):
+    content, token_count = truncate_response(LONG_TEXT, 50, policy)
+
+    assert token_count <= 50
+    assert token_count == count_tokens(content)
+    assert "tokens truncated" in content
+    if policy in ("head", "head_tail"):
+        assert content.startswith("word0")
+    if policy in ("tail", "head_tail"):
+        assert content.endswith("word399")
+
+
+def test_json_pruning_keeps_valid_json():
+    payload = json.dumps(
+        {
+            "name": "Joe's Italian",
+            "reviews": [{"text": LONG_TEXT[:200], "stars": i} for i in range(50)],
+            "menu": LONG_TEXT,
+        }
+    )
+
+    content, token_count = truncate_response(payload, 200, "json")
+
+    assert token_count <= 200
+    pruned = json.loads(content)
+    assert pruned["name"] == "Joe's Italian"
+    assert 0 < len(pruned["reviews"]) < 50
+
+
+def test_json_node_sizes_match_serialization():
+    value = {"a": [1, 2.5, {"b": "caf\u00e9", "c": None}], "d": {}, "e": []}
+    nodes = []
+
+    assert _sizes(value, nodes=nodes) == len(json.dumps(value))
+    assert len(nodes) == 8
+    for size, parent, key, node in nodes:
+        assert parent[key] is node
+        assert size == len(json.dumps(node))
+
+
+def test_json_pruning_steps_are_not_cached():
+    payload = json.dumps({"items": [LONG_TEXT[:100]] * 64})
+    before = token_cache_info().currsize
+
+    truncate_response(payload, 50, "json")
+
+    # Only the response and its final pruned form are cached
+    assert token_cache_info().currsize - before <= 2
+
+
+def test_invalid_json_falls_back_to_head():
+    content, token_count = truncate_response(LONG_TEXT, 50, "json")
+    assert token_count <= 50
+    assert content.startswith("word0")
+
+
+def test_summarizer_policy():
+    content, token_count = truncate_response(
+        LONG_TEXT, 20, lambda text, max_tokens: f"{len(text)} characters"
+    )
+    assert content == f"{len(LONG_TEXT)} characters"
+    assert token_count == count_tokens(content)
+
+
+def test_invalid_policy():
+    with pytest.raises(ValueError):
+        truncate_response(LONG_TEXT, 20, "middle")
+    with pytest.raises(ValueError):
+        FunctionItem(
+            method=lambda: "",
+            name="f",
+            description="f",
+            params={},
+            truncation="middle",
+            token_count=1,
+        )
+
+
+def test_responses_are_counted_and_truncated():
+    def request(i, func_item):
+        return _FunctionRequest(name=func_item.name, args={}, func_item=func_item, id=i)
+
+    long_item = FunctionItem(
+        method=lambda: LONG_TEXT,
+        name="long",
+        description="long",
+        params={},
+        max_response_tokens=60,
+        truncation="tail",
+        token_count=1,
+    )
+    short_item = FunctionItem(
+        method=lambda: "a short answer",
+        name="short",
+        description="short",
+        params={},
+        token_count=1,
+    )
+    message = FunctionRequestMessage(
+        requests=[request("1", long_item), request("2", short_item)], token_count=1
+    )
+
+    long, short = message.create_responses()
+
+    assert long.token_count <= 60
+    assert long.content.endswith("word399")
+    assert short.content == "a short answer"
+    assert short.token_count == count_tokens("a short answer")
+
+
+def test_truncation_callable_serializes():
+    item = FunctionItem(
+        method=lambda: "",
+        name="f",
+        description="f",
+        params={},
+        truncation=lambda text, max_tokens: text[:10],
+        token_count=1,
+    )
+    restored = FunctionItem.model_validate_json(item.model_dump_json())
+    assert restored.truncation("a" * 20, 5) == "a" * 10
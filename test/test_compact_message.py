@@ -0,0 +1,92 @@
+from array import array
+
+import pytest
+
+from chatmancy.function import FunctionRequestMessage, FunctionResponseMessage
+from chatmancy.function.function_message import _FunctionRequest
+from chatmancy.message import (
+    AgentMessage,
+    CompactMessageQueue,
+    Message,
+    MessageColumns,
+    MessageQueue,
+    UserMessage,
+    lazy_token_counts,
+)
+
+
+@pytest.fixture
+def messages():
+    return [
+        Message(sender="system", content="You are a bot.", token_count=5),
+        UserMessage("Hello", token_count=1),
+        AgentMessage("Hi!", token_count=2),
+        AgentMessage("Named", token_count=1, agent_name="poet"),
+        FunctionRequestMessage(
+            requests=[_FunctionRequest(name="add", args={"a": 1}, id="1")],
+            token_count=7,
+        ),
+        FunctionResponseMessage(
+            func_name="add", func_id="1", content="2", token_count=1
+        ),
+    ]
+
+
+def test_columns_round_trip(messages):
+    columns = MessageColumns(messages)
+    assert len(columns) == len(messages)
+    assert list(columns) == messages
+    for original, restored in zip(messages, columns):
+        assert type(restored) is type(original)
+    assert columns[-1] == messages[-1]
+    assert columns[1:3] == messages[1:3]
+
+    with pytest.raises(IndexError):
+        columns[len(messages)]
+
+
+def test_columns_storage(messages):
+    columns = MessageColumns(messages)
+    assert isinstance(columns.token_counts, array)
+    assert list(columns.token_counts) == [m.token_count for m in messages]
+    assert columns.senders[1] == MessageColumns(
+        [UserMessage("Other", token_count=1)]
+    ).senders[0]
+
+    # Only non-default subclass fields are stored per row
+    assert 2 not in columns.extras
+    assert columns.extras[3] == ("poet",)
+
+
+def test_compact_queue(messages):
+    queue = CompactMessageQueue(messages)
+    assert queue == MessageQueue(messages)
+    assert queue.token_count == sum(m.token_count for m in messages)
+    assert list(queue.get_last_n_tokens(8)) == messages[-2:]
+
+    snapshot = queue.copy()
+    queue.append(UserMessage("Bye", token_count=1))
+    assert isinstance(snapshot, CompactMessageQueue)
+    assert len(snapshot) == len(messages)
+    assert queue[-1] == UserMessage("Bye", token_count=1)
+    assert repr(queue) == f"CompactMessageQueue({len(messages) + 1} items)"
+
+
+def test_compact_queue_lazy_token_counts():
+    with lazy_token_counts():
+        queue = CompactMessageQueue([UserMessage("Hello, world!")])
+    assert "token_count" not in queue[0].__dict__
+    assert queue.token_count == 4
+    assert queue[0].__dict__["token_count"] == 4
+
+
+def test_columns_store_counts_of_materialized_lazy_messages():
+    with lazy_token_counts():
+        columns = MessageColumns([UserMessage("Hello, world!")])
+    message = columns[0]
+    assert "token_count" not in message.__dict__
+
+    token_count = message.token_count
+    assert columns[0].__dict__["token_count"] == token_count
+    assert columns.token_counts[0] == token_count
+    assert not columns.lazy_messages
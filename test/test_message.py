@@ -3,6 +3,7 @@ import pytest
 from collections import deque
 
 from chatmancy.message.message import Message, UserMessage, AgentMessage, MessageQueue
+from chatmancy.message.tokenizer import lazy_token_counts
 
 
 # MESSAGE
@@ -183,3 +184,198 @@ def test_message_queue_token_count():
 def test_message_queue_repr(messages):
     queue = MessageQueue(messages)
     assert repr(queue) == "MessageQueue(4 items)"
+
+
+def test_message_bulk_create():
+    records = [
+        {"sender": "user", "content": "Hello, world!"},
+        {"sender": "assistant", "content": "Hi there", "token_count": 10},
+        Message(sender="user", content="Existing", token_count=3),
+    ]
+    messages = Message.bulk_create(records)
+    assert len(messages) == 3
+    assert messages[0] == Message(sender="user", content="Hello, world!")
+    assert messages[1].token_count == 10
+    assert messages[2] is records[2]
+
+
+def test_message_bulk_create_subclass():
+    messages = UserMessage.bulk_create([{"content": "Hello, world!"}])
+    assert isinstance(messages[0], UserMessage)
+    assert messages[0].token_count == 4
+
+
+def test_message_queue_from_records():
+    queue = MessageQueue.from_records(
+        [{"content": "Hello, world!"}, {"content": "Great!"}],
+        message_cls=AgentMessage,
+    )
+    assert isinstance(queue, MessageQueue)
+    assert len(queue) == 2
+    assert all(isinstance(m, AgentMessage) for m in queue)
+    assert queue.token_count == sum(
+        AgentMessage(content=m.content).token_count for m in queue
+    )
+
+
+def _naive_last_n_tokens(queue, n):
+    result = []
+    total = 0
+    for message in reversed(queue):
+        if total + message.token_count > n:
+            break
+        total += message.token_count
+        result.append(message)
+    return result[::-1]
+
+
+def test_message_queue_token_index_updates():
+    queue = MessageQueue(
+        [Message(sender="user", content=str(i), token_count=i) for i in range(1, 5)]
+    )
+    assert queue.token_count == 10
+
+    queue.append(Message(sender="user", content="a", token_count=5))
+    queue.appendleft(Message(sender="user", content="b", token_count=7))
+    assert queue.token_count == 22
+    queue.pop()
+    queue.popleft()
+    assert queue.token_count == 10
+
+    queue.extendleft([Message(sender="user", content="c", token_count=2)])
+    queue += [Message(sender="user", content="d", token_count=3)]
+    assert queue.token_count == 15
+    del queue[1]
+    assert queue.token_count == 14
+    queue.clear()
+    assert queue.token_count == 0
+
+
+def test_message_queue_get_last_n_tokens_matches_scan():
+    queue = MessageQueue(
+        [
+            Message(sender="user", content=str(i), token_count=(i * 7) % 5)
+            for i in range(50)
+        ]
+    )
+    queue.appendleft(Message(sender="user", content="first", token_count=3))
+    queue.popleft()
+    queue.pop()
+    for n in [-1, 0, 1, 2, 5, 17, 40, 99, 1000]:
+        assert queue.get_last_n_tokens(n) == _naive_last_n_tokens(queue, n)
+
+
+def test_message_queue_front_operations_keep_index():
+    import random
+
+    rng = random.Random(0)
+    queue = MessageQueue()
+    assert queue.token_count == 0
+    for step in range(2000):
+        tokens = rng.randint(0, 9)
+        message = Message(sender="user", content=str(step), token_count=tokens)
+        operation = rng.random()
+        if operation < 0.3:
+            queue.appendleft(message)
+        elif operation < 0.6:
+            queue.append(message)
+        elif queue and operation < 0.8:
+            queue.popleft()
+        elif queue:
+            queue.pop()
+        if step % 100 == 0:
+            copied = queue.copy()
+            copied.extend(queue)
+            assert copied.token_count == 2 * queue.token_count
+        assert queue.token_count == sum(m.token_count for m in queue)
+        n = rng.randint(0, 40)
+        assert queue.get_last_n_tokens(n) == _naive_last_n_tokens(queue, n)
+
+
+def test_message_queue_popleft_does_not_shift_index():
+    queue = MessageQueue(
+        [Message(sender="user", content=str(i), token_count=1) for i in range(100)]
+    )
+    assert queue.token_count == 100
+    index = queue._token_index
+
+    for _ in range(50):
+        queue.popleft()
+
+    assert queue._token_index is index
+    assert len(index) == 101
+    assert queue.token_count == 50
+
+
+def test_message_queue_pickle():
+    import pickle
+
+    queue = MessageQueue(
+        [
+            Message(sender="user", content="Hello", token_count=2),
+            Message(sender="agent", content="Hi", token_count=1),
+        ]
+    )
+    assert queue.token_count == 3
+    loaded = pickle.loads(pickle.dumps(queue))
+    assert loaded == queue
+    assert loaded.token_count == 3
+
+
+def test_message_queue_trusted_paths_skip_validation(monkeypatch):
+    queue = MessageQueue(
+        [Message(sender="user", content=str(i), token_count=i) for i in range(5)]
+    )
+    assert queue.token_count == 10
+
+    def fail_validate(self, message):
+        raise AssertionError("Messages from a queue should not be re-validated")
+
+    monkeypatch.setattr(MessageQueue, "_validate", fail_validate)
+    copy_queue = queue.copy()
+    combined = queue + queue
+    trusted = MessageQueue._from_trusted(queue.get_last_n_tokens(7))
+
+    assert list(copy_queue) == list(queue)
+    assert combined.token_count == 20
+    assert len(combined) == 10
+    assert trusted.token_count == 7
+
+
+def test_message_queue_copy_keeps_index_independent():
+    queue = MessageQueue(
+        [Message(sender="user", content=str(i), token_count=i) for i in range(5)]
+    )
+    assert queue.token_count == 10
+    copy_queue = queue.copy()
+    copy_queue.append(Message(sender="user", content="new", token_count=5))
+    copy_queue._extend_trusted([Message(sender="user", content="x", token_count=1)])
+    assert copy_queue.token_count == 16
+    assert queue.token_count == 10
+
+
+def test_message_lazy_token_count():
+    with lazy_token_counts():
+        message = AgentMessage(content="Hello, world!")
+        explicit = AgentMessage(content="Hello, world!", token_count=10)
+    assert "token_count" not in message.__dict__
+    assert explicit.token_count == 10
+
+    assert message.token_count == 4
+    assert message.__dict__["token_count"] == 4
+
+
+def test_message_lazy_token_count_equality_and_dump():
+    with lazy_token_counts():
+        lazy = Message(sender="user", content="Hello, world!")
+        dumped = Message(sender="user", content="Hello, world!")
+    assert lazy == Message(sender="user", content="Hello, world!")
+    assert dumped.model_dump()["token_count"] == 4
+
+
+def test_message_bulk_create_lazy():
+    messages = Message.bulk_create(
+        [{"sender": "user", "content": "Hello, world!"}], lazy=True
+    )
+    assert "token_count" not in messages[0].__dict__
+    assert MessageQueue(messages).token_count == 4
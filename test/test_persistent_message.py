@@ -0,0 +1,165 @@
+import pickle
+
+import pytest
+
+from chatmancy.agent.history import HistoryManager
+from chatmancy.message import (
+    AgentMessage,
+    Message,
+    MessageQueue,
+    PersistentMessageQueue,
+    UserMessage,
+)
+
+
+def _message(i, token_count=1):
+    return Message(sender="user", content=f"Message {i}", token_count=token_count)
+
+
+@pytest.fixture
+def messages():
+    return [_message(i, token_count=i % 4) for i in range(10)]
+
+
+def test_init(messages):
+    queue = PersistentMessageQueue(messages)
+    assert len(queue) == 10
+    assert list(queue) == messages
+    assert queue[0] == messages[0]
+    assert queue[-1] == messages[-1]
+
+
+def test_init_validates():
+    queue = PersistentMessageQueue(
+        [{"sender": "user", "content": "Hi", "token_count": 1}]
+    )
+    assert isinstance(queue[0], Message)
+
+    with pytest.raises(TypeError):
+        PersistentMessageQueue([None])
+
+
+def test_copy_is_snapshot(messages):
+    queue = PersistentMessageQueue(messages)
+    snapshot = queue.copy()
+    assert snapshot._spans[0][0] is queue._spans[0][0]
+
+    queue.append(_message(10))
+    snapshot.append(_message(11))
+    assert len(queue) == 11
+    assert len(snapshot) == 11
+    assert queue[-1].content == "Message 10"
+    assert snapshot[-1].content == "Message 11"
+    assert list(queue)[:10] == messages
+
+
+def test_pop_and_popleft(messages):
+    queue = PersistentMessageQueue(messages)
+    snapshot = queue.copy()
+    assert queue.pop() == messages[-1]
+    assert queue.popleft() == messages[0]
+    assert list(queue) == messages[1:-1]
+    assert list(snapshot) == messages
+
+    queue.append(_message(99))
+    assert queue[-1].content == "Message 99"
+    assert list(snapshot) == messages
+
+    with pytest.raises(IndexError):
+        PersistentMessageQueue().pop()
+
+
+def test_appendleft(messages):
+    queue = PersistentMessageQueue(messages)
+    queue.appendleft(_message(-1))
+    assert len(queue) == 11
+    assert queue[0].content == "Message -1"
+
+
+def test_add_is_view(messages):
+    queue = PersistentMessageQueue(messages)
+    prefix = PersistentMessageQueue([_message("prefix")])
+    combined = prefix + queue
+    assert len(combined) == 11
+    assert combined._spans[1][0] is queue._spans[0][0]
+
+    combined += [_message("input")]
+    assert len(combined) == 12
+    assert len(queue) == 10
+
+    with_deque = queue + MessageQueue([_message("deque")])
+    assert with_deque[-1].content == "Message deque"
+
+
+def test_token_count(messages):
+    queue = PersistentMessageQueue(messages)
+    assert queue.token_count == sum(m.token_count for m in messages)
+    queue.append(_message(10, token_count=5))
+    queue.popleft()
+    assert queue.token_count == sum(m.token_count for m in messages[1:]) + 5
+
+
+def test_get_last_n_tokens_matches_message_queue(messages):
+    queue = PersistentMessageQueue(messages[:5]) + PersistentMessageQueue(messages[5:])
+    reference = MessageQueue(messages)
+    for n in [-1, 0, 1, 3, 6, 10, 100]:
+        result = queue.get_last_n_tokens(n)
+        assert isinstance(result, PersistentMessageQueue)
+        assert list(result) == reference.get_last_n_tokens(n)
+
+
+def test_get_last_n_tokens_exclude():
+    queue = PersistentMessageQueue(
+        [
+            UserMessage("Hello", token_count=2),
+            AgentMessage("Hi", token_count=1),
+            UserMessage("How are you?", token_count=5),
+            AgentMessage("I'm good", token_count=3),
+        ]
+    )
+    result = queue.get_last_n_tokens(8, exclude_types=(UserMessage,))
+    assert len(result) == 2
+    assert not any(isinstance(m, UserMessage) for m in result)
+
+
+def test_get_last_n_messages(messages):
+    queue = PersistentMessageQueue(messages)
+    assert list(queue.get_last_n_messages(3)) == messages[-3:]
+    assert list(queue.get_last_n_messages(30)) == messages
+
+
+def test_slicing(messages):
+    queue = PersistentMessageQueue(messages[:4]) + PersistentMessageQueue(messages[4:])
+    assert list(queue[2:7]) == messages[2:7]
+    assert list(queue[::2]) == messages[::2]
+    assert list(reversed(queue)) == messages[::-1]
+
+
+def test_eq_and_pickle(messages):
+    queue = PersistentMessageQueue(messages)
+    assert queue == MessageQueue(messages)
+    assert MessageQueue(messages) == queue
+    assert pickle.loads(pickle.dumps(queue)) == queue
+
+
+def test_repeated_forks_keep_spans_bounded():
+    queue = PersistentMessageQueue([_message(0)])
+    for i in range(1000):
+        snapshot = queue.copy()
+        snapshot.append(_message("fork"))
+        queue.append(_message(i))
+    assert len(queue) == 1001
+    assert len(queue._spans) <= 2 * 10 + 1
+
+
+def test_history_manager_returns_view(messages):
+    history = PersistentMessageQueue(messages)
+    manager = HistoryManager([UserMessage("Prefix", token_count=1)])
+    result = manager.create_history(
+        UserMessage("Hello", token_count=1), history, None, max_tokens=100
+    )
+    assert isinstance(result, PersistentMessageQueue)
+    assert list(result) == [UserMessage("Prefix", token_count=1)] + messages + [
+        UserMessage("Hello", token_count=1)
+    ]
+    assert len(history) == 10
@@ -0,0 +1,130 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from chatmancy.message.tokenizer import (
+    TokenCountCache,
+    TokenizerRegistry,
+    count_tokens,
+    count_tokens_batch,
+)
+
+
+def test_registry_caches_encoding():
+    registry = TokenizerRegistry()
+    assert registry.get_encoding("gpt-4") is registry.get_encoding("gpt-4")
+
+
+def test_registry_default_model():
+    registry = TokenizerRegistry(default_model="gpt-3.5-turbo")
+    assert registry.get_encoding() is registry.get_encoding("gpt-3.5-turbo")
+
+
+def test_registry_unknown_model_falls_back():
+    registry = TokenizerRegistry()
+    encoding = registry.get_encoding("my-fine-tuned-model")
+    assert encoding.name == "cl100k_base"
+
+
+def test_registry_shared_across_threads():
+    registry = TokenizerRegistry()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        encodings = list(pool.map(lambda _: registry.get_encoding("gpt-4"), range(32)))
+    assert all(e is encodings[0] for e in encodings)
+
+
+def test_count_tokens():
+    assert count_tokens("Hello, world!") == 4
+    assert count_tokens("Hello, world!", model="gpt-3.5-turbo") == 4
+
+
+def test_count_tokens_batch():
+    texts = ["Hello, world!", "", "How are you?"]
+    assert count_tokens_batch(texts) == [count_tokens(t) for t in texts]
+    assert count_tokens_batch([]) == []
+
+
+def test_count_tokens_special_token_text():
+    # Untrusted text may contain special tokens, which are counted as text
+    text = "Tool output <|endoftext|> more"
+    assert count_tokens(text) > 0
+    assert count_tokens_batch([text]) == [count_tokens(text)]
+
+
+# CACHE
+
+
+def test_cache_hits_and_misses():
+    cache = TokenCountCache(maxsize=2)
+    key = cache.make_key("cl100k_base", "Hello")
+    assert cache.get(key) is None
+    cache.set(key, 1)
+    assert cache.get(key) == 1
+    info = cache.cache_info()
+    assert (info.hits, info.misses, info.maxsize, info.currsize) == (1, 1, 2, 1)
+
+
+def test_cache_evicts_least_recently_used():
+    cache = TokenCountCache(maxsize=2)
+    a, b, c = (cache.make_key("enc", text) for text in ["a", "b", "c"])
+    cache.set(a, 1)
+    cache.set(b, 2)
+    cache.get(a)
+    cache.set(c, 3)
+    assert cache.get(b) is None
+    assert cache.get(a) == 1
+    assert cache.get(c) == 3
+
+
+def test_cache_key_includes_encoding():
+    cache = TokenCountCache()
+    assert cache.make_key("enc_a", "text") != cache.make_key("enc_b", "text")
+
+
+def test_cache_disabled():
+    cache = TokenCountCache(enabled=False)
+    key = cache.make_key("enc", "text")
+    cache.set(key, 1)
+    assert cache.get(key) is None
+    assert cache.cache_info().currsize == 0
+
+
+def test_cache_resize_and_clear():
+    cache = TokenCountCache(maxsize=3)
+    for i in range(3):
+        cache.set(cache.make_key("enc", str(i)), i)
+    cache.resize(1)
+    assert cache.cache_info().currsize == 1
+    cache.clear()
+    assert cache.cache_info() == (0, 0, 1, 0)
+
+    with pytest.raises(ValueError):
+        cache.resize(-1)
+
+
+def test_registry_uses_cache():
+    registry = TokenizerRegistry(cache=TokenCountCache(maxsize=10))
+    first = registry.count_tokens("Hello, world!", cache=True)
+    second = registry.count_tokens("Hello, world!", cache=True)
+    assert first == second
+    assert registry.cache.cache_info().hits == 1
+
+    registry.count_tokens_batch(["Hello, world!", "New text"], cache=True)
+    info = registry.cache.cache_info()
+    assert info.hits == 2
+    assert info.currsize == 2
+
+
+def test_registry_caches_long_texts_by_default():
+    registry = TokenizerRegistry(cache=TokenCountCache(maxsize=10, min_length=20))
+    short, long = "A unique message", "A long, repeated system prompt"
+
+    registry.count_tokens(short)
+    registry.count_tokens_batch([short, long])
+    registry.count_tokens(long)
+    assert registry.cache.cache_info().currsize == 1
+    assert registry.cache.cache_info().hits == 1
+
+    registry.count_tokens(long, cache=False)
+    registry.count_tokens_batch([short], cache=False)
+    assert registry.cache.cache_info()[:2] == (1, 1)